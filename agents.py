@@ -4,16 +4,45 @@ from loguru import logger
 from utils import load_config, generate_hypo_list
 from node_engine import (
     RunDataTranslationAgent,
-    RunAccuracyAgent,
     SummarizeResult,
-    RunFluencyAgent,
-    RunNaturalnessAgent,
-    # RunCSRatioAgent,
-    #RunSocialCulturalAgent,
     RunRefinerAgent,
+    RunPreValidator,
+    RunCandidateAgent,
     AcceptanceAgent,
+    configure_output,
+    configure_batching,
+    configure_candidates,
+    get_candidate_count,
+    output_sink,
 )
 from node_models import AgentRunningState
+from llm_client import aclose_clients
+from scheduler import Scheduler
+from llm_cache import configure_llm_cache
+from checkpointer import SqliteCheckpointSaver
+from run_manifest import (
+    RunManifest,
+    NODE_STATUS,
+    DEFAULT_RUN_STATE_PATH,
+    scenario_key,
+    hypo_text,
+)
+from evaluators import (
+    Evaluator,
+    load_evaluators,
+    evaluators_key,
+    evaluation_nodes,
+    configure_reevaluation,
+)
+from dedup import plan_dedup
+from prevalidator import configure_prevalidation, prevalidation_enabled
+from instrumentation import configure_tracing, get_tracer, traced
+from prompt import configure_prompts
+from diagnostics import configure_diagnostics
+from batching import close_batchers
+from resilience import configure_resilience, get_policy, with_deadline, DEFAULT_DRAIN_TIMEOUT
+from functools import partial
+import time
 import random
 from tqdm import tqdm
 import jsonlines as jsl
@@ -23,8 +52,9 @@ from datetime import datetime
 #agents are adapted from switchlingua
 code_switch_lang='vi'
 logger.add(f"logs/code_switching_agent_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
-config: dict = load_config(f"./config/config_{code_switch_lang}.yaml")
+CONFIG_PATH = f"./config/config_{code_switch_lang}.yaml"
 MAX_REFINER_ITERATIONS = 1
+RUN_TIMEOUT = 7200
 start=1200
 end=1240
 
@@ -36,96 +66,326 @@ def meet_criteria(state: AgentRunningState):
         return "AcceptanceAgent"
 
 
+def prevalidation_route(state: AgentRunningState, nodes: list):
+    # clear failures go straight back to the refiner instead of the evaluator fan-out
+    if state["prevalidation"]["passed"] or state["refine_count"] >= MAX_REFINER_ITERATIONS:
+        return [node.node for node in nodes]
+    return "RefinerAgent"
+
+
+def after_refine(state: AgentRunningState, nodes: list):
+    # nothing left to score (reevaluation mode "none"): summarize with the kept results
+    if all(node.done(state) for node in nodes):
+        return "SummarizeResult"
+    if prevalidation_enabled():
+        return "PreValidator"
+    # every node runs so the join fires; kept results make their node a no-op
+    return [node.node for node in nodes]
+
+
+def route_entry(state: AgentRunningState, nodes: list):
+    """
+    Enter the graph at the first stage whose result is missing, so states that
+    arrive already translated or scored (offline batch ingest) skip those calls.
+    """
+    if not state.get("data_translation_result"):
+        return "CandidateAgent" if get_candidate_count() > 1 else "DataTranslationAgent"
+    if all(node.done(state) for node in nodes):
+        return "SummarizeResult"
+    if prevalidation_enabled():
+        return "PreValidator"
+    return [node.node for node in nodes]
+
+
+# compiled graphs, one per distinct evaluator set + checkpointer
+_compiled_graphs: dict = {}
+
+
+def construct_graph_with_data_generation(
+    evaluators: list[Evaluator], checkpointer=None, evaluation_mode="separate"
+):
+    workflow = StateGraph(AgentRunningState)
+    policy = get_policy()
+
+    def wrap(name, node):
+        # node_deadline bounds every node; with tracing on, each call records time, tokens and cost
+        if policy is not None and policy.node_deadline:
+            node = with_deadline(name, node, policy.node_deadline)
+        return traced(name, node) if get_tracer() is not None else node
+
+    workflow.add_node("DataTranslationAgent", wrap("DataTranslationAgent", RunDataTranslationAgent))
+    # evaluator nodes (accuracy, fluency, naturalness, cs ratio, ...) come from config;
+    # in fused mode the first three share a single FusedEvaluationAgent call
+    nodes = evaluation_nodes(evaluators, evaluation_mode)
+    for evaluator in nodes:
+        workflow.add_node(evaluator.node, wrap(evaluator.node, evaluator))
+    workflow.add_node(
+        "SummarizeResult", wrap("SummarizeResult", partial(SummarizeResult, evaluators=evaluators))
+    )
+    workflow.add_node(
+        "RefinerAgent", wrap("RefinerAgent", partial(RunRefinerAgent, evaluators=evaluators))
+    )
+    workflow.add_node("AcceptanceAgent", wrap("AcceptanceAgent", AcceptanceAgent))
+    # workflow.add_node("NewsGenerationAgent", RunUseToolsAgent)
+    workflow.add_conditional_edges(START, partial(route_entry, nodes=nodes))
+    if get_candidate_count() > 1:
+        # best-of-k: translates and scores in one node; refinements still use the evaluator nodes
+        workflow.add_node(
+            "CandidateAgent",
+            wrap("CandidateAgent", partial(RunCandidateAgent, evaluators=evaluators, nodes=nodes)),
+        )
+        workflow.add_edge("CandidateAgent", "SummarizeResult")
+    # workflow.add_edge(START, "NewsGenerationAgent")
+    if prevalidation_enabled():
+        workflow.add_node("PreValidator", wrap("PreValidator", RunPreValidator))
+        workflow.add_edge("DataTranslationAgent", "PreValidator")
+        workflow.add_conditional_edges("PreValidator", partial(prevalidation_route, nodes=nodes))
+    else:
+        for evaluator in nodes:
+            workflow.add_edge("DataTranslationAgent", evaluator.node)
+    workflow.add_edge([e.node for e in nodes], "SummarizeResult")
+    workflow.add_conditional_edges("SummarizeResult", meet_criteria)
+    workflow.add_conditional_edges("RefinerAgent", partial(after_refine, nodes=nodes))
+    workflow.add_edge("AcceptanceAgent", END)
+    graph = workflow.compile(checkpointer=checkpointer)
+    # workflow.add_edge("NewsGenerationAgent", END)
+    return graph
+
+
+def get_graph(evaluators: list[Evaluator], checkpointer=None, evaluation_mode="separate"):
+    """Compile the graph once per configuration and reuse it for every scenario."""
+    key = (
+        evaluators_key(evaluators, evaluation_mode), id(checkpointer), id(get_tracer()),
+        prevalidation_enabled(), get_candidate_count(), id(get_policy()),
+    )
+    if key not in _compiled_graphs:
+        _compiled_graphs[key] = construct_graph_with_data_generation(
+            evaluators, checkpointer, evaluation_mode
+        )
+    return _compiled_graphs[key]
+
+
 class CodeSwitchingAgent:
-    def __init__(self, scenario_k):
+    def __init__(self, scenario_k, graph, checkpointer=None, manifest=None):
         self.state = AgentRunningState()
         self.state["refine_count"] = 0
         for key in scenario_k.keys():
             self.state[key] = scenario_k[key]
-        self.workflow_with_data_generation: StateGraph = (
-            self._construct_graph_with_data_generation()
-        )
-
-    
-    def _construct_graph_with_data_generation(self) -> StateGraph:
-        workflow = StateGraph(AgentRunningState)
-        workflow.add_node("DataTranslationAgent", RunDataTranslationAgent)
-        workflow.add_node("TranslationAdequacyAgent", RunAccuracyAgent)
-        workflow.add_node("FluencyAgent", RunFluencyAgent)
-        workflow.add_node("NaturalnessAgent", RunNaturalnessAgent)
-        # workflow.add_node("CSRatioAgent", RunCSRatioAgent)
-        #workflow.add_node("SocialCulturalAgent", RunSocialCulturalAgent)
-        workflow.add_node("SummarizeResult", SummarizeResult)
-        workflow.add_node("RefinerAgent", RunRefinerAgent)
-        workflow.add_node("AcceptanceAgent", AcceptanceAgent)
-        # workflow.add_node("NewsGenerationAgent", RunUseToolsAgent)
-        workflow.add_edge(START, "DataTranslationAgent")
-        # workflow.add_edge(START, "NewsGenerationAgent")
-        workflow.add_edge("DataTranslationAgent", "TranslationAdequacyAgent")
-        workflow.add_edge("DataTranslationAgent", "FluencyAgent")
-        workflow.add_edge("DataTranslationAgent", "NaturalnessAgent")
-        # workflow.add_edge("DataTranslationAgent", "CSRatioAgent")
-        #workflow.add_edge("DataTranslationAgent", "SocialCulturalAgent")
-        workflow.add_edge(
-            ["TranslationAdequacyAgent","FluencyAgent", "NaturalnessAgent"],
-            "SummarizeResult",
-        )
-        workflow.add_conditional_edges("SummarizeResult", meet_criteria)
-        workflow.add_edge("RefinerAgent", "SummarizeResult")
-        workflow.add_edge("AcceptanceAgent", END)
-        graph = workflow.compile()
-        # workflow.add_edge("NewsGenerationAgent", END)
-        return graph
+        self.checkpointer = checkpointer
+        self.manifest = manifest
+        self.workflow_with_data_generation = graph
 
     async def run(self):
         # logger.info(f"🤖 Running scenario: {self.scenario_k}")
+        graph = self.workflow_with_data_generation
+        run_config = {"recursion_limit": 1e10}
+        inputs = self.state
+        if self.checkpointer is not None:
+            run_config["configurable"] = {"thread_id": scenario_key(self.state)}
+            snapshot = await graph.aget_state(run_config)
+            if snapshot.next:
+                # interrupted mid-graph: continue from the last checkpoint
+                logger.info(f"♻️ Resuming {hypo_text(self.state)!r} at {snapshot.next}")
+                inputs = None
+            elif snapshot.values:
+                # finished but never reached the output files: re-submit, no LLM calls
+                await output_sink.submit(snapshot.values)
+                return snapshot.values
+        tracer = get_tracer()
+        started = time.perf_counter()
+        final_state = None
         try:
-            return await self.workflow_with_data_generation.ainvoke(
-                self.state, {"recursion_limit": 1e10}
-            )
+            async for mode, chunk in graph.astream(
+                inputs, run_config, stream_mode=["updates", "values"]
+            ):
+                if mode == "values":
+                    final_state = chunk
+                elif self.manifest is not None:
+                    for node in chunk:
+                        if node in NODE_STATUS:
+                            await self.manifest.amark([self.state], NODE_STATUS[node])
+            if tracer is not None:
+                tracer.scenario(final_state or self.state, time.perf_counter() - started, "accepted")
+            return final_state
         except asyncio.TimeoutError:
-            logger.warning(f"⏱️ Scenario timed out after 10 seconds: {self.scenario_k}")
+            # a node or call deadline (see resilience) ran out
+            logger.warning(f"⏱️ Scenario timed out: {hypo_text(self.state)!r}")
+            if tracer is not None:
+                tracer.scenario(final_state or self.state, time.perf_counter() - started, "timeout")
             return ""
+        except Exception as e:
+            if tracer is not None:
+                tracer.scenario(final_state or self.state, time.perf_counter() - started, "error", repr(e))
+            raise
 
 
-async def arun(hypo):
-    agent_instance = CodeSwitchingAgent(hypo)
+async def arun(hypo, graph, checkpointer=None, manifest=None, on_finished=None) -> dict:
+    """Run one scenario; returns {"state": final state ("" on timeout), "seconds": graph wall time}."""
+    agent_instance = CodeSwitchingAgent(hypo, graph, checkpointer=checkpointer, manifest=manifest)
     print(f"🔍 Running scenario: {hypo}")
-    await agent_instance.run()
+    started = time.perf_counter()
+    try:
+        final_state = await agent_instance.run()
+    except Exception as e:
+        if on_finished is not None:
+            on_finished(hypo, e)
+        raise
+    if on_finished is not None:
+        # a timed-out graph returns "" and produced no record either
+        on_finished(hypo, None if final_state else TimeoutError("scenario timed out"))
+    return {"state": final_state, "seconds": time.perf_counter() - started}
 
 
-async def main(config):
+def build_scenarios(config) -> list[AgentRunningState]:
     first_lang = config["pre_execute"]["first_language"]
     second_lang = config["pre_execute"]["second_language"]
     cs_ratio = config["pre_execute"]["cs_ratio"]
-    scenarios: list[AgentRunningState] = [
+    return [
     AgentRunningState(hypothesis=hypo,first_language=first_lang, second_language=second_lang,cs_ratio=cs_ratio)
     for hypo in generate_hypo_list()]
 
+
+async def main(config, first=None, last=None):
+    scenarios = build_scenarios(config)
+    return await run_scenarios(config, scenarios[start if first is None else first:end if last is None else last])
+
+
+async def run_scenarios(
+    config, scenarios: list[AgentRunningState], on_finished=None, on_result=None, max_buffered=None,
+    run_timeout=RUN_TIMEOUT,
+):
+    """
+    Run scenarios through the graph with the shared scheduler, caches and output sink.
+    `scenarios` may also be an async iterable (job_queue.LeasedJobs), consumed as
+    slots free up; the accepted-output skip and dedup are then left to the job
+    store. `on_finished(state, error)` is called after every graph run (error is
+    a TimeoutError when the graph timed out); `await on_result(result)` with
+    every arun result as it completes, and while it blocks at most
+    `max_buffered` further results are held (see Scheduler.run). After
+    `run_timeout` seconds admission stops; None runs until the input is exhausted.
+    """
+    streaming = hasattr(scenarios, "__aiter__")
     # make a for loop, each loop run 10 scenarios
     results_count = 0
     #for i in range(0, 1, 40): #og 0, 8000, 40
-    tasks = [arun(scenario) for scenario in scenarios[start:end]]
+    scheduler = Scheduler.from_config(config)
+    llm_cache = configure_llm_cache(config.get("llm_cache"))
+    tracer = configure_tracing(config.get("tracing"))
+    configure_output(config.get("output"))
+    configure_batching(config.get("batching"))
+    configure_prevalidation(config.get("prevalidation"))
+    configure_reevaluation(config.get("reevaluation"))
+    configure_candidates(config.get("candidates"))
+    configure_prompts(config.get("prompts"))
+    policy = configure_resilience(config.get("resilience"))
+    output_sink.start()
+    diagnostics = configure_diagnostics(config.get("diagnostics"))
+    if diagnostics is not None:
+        diagnostics.start()
+
+    # skip hypotheses already accepted by earlier runs; resume unfinished graphs
+    pending = scenarios
+    resume_config = config.get("resume") or {}
+    checkpointer = manifest = None
+    if resume_config.get("enabled", True) and not streaming:
+        pending = output_sink.pending(scenarios)
+        logger.info(f"⏭️ Skipping {len(scenarios) - len(pending)} already accepted hypotheses")
+    if not streaming:
+        # one graph per group of (near-)identical hypotheses; the sink copies the result to the rest
+        pending, output_sink.fan_out = plan_dedup(pending, config.get("dedup"))
+    if resume_config.get("enabled", True):
+        run_state_path = resume_config.get("path", DEFAULT_RUN_STATE_PATH)
+        manifest = RunManifest(run_state_path)
+        checkpointer = SqliteCheckpointSaver(run_state_path)
+        if not streaming:
+            manifest.register(pending)
 
-    # 使用 asyncio.as_completed 來逐個等待任務完成
+        def on_written(batch):
+            manifest.mark(batch, "accepted")
+            for state in batch:
+                checkpointer.delete_thread(scenario_key(state))
+
+        output_sink.on_written.append(on_written)
+    # scenarios are admitted from a queue, at most max_in_flight at a time,
+    # and every LLM call waits on the shared RPM/TPM budget
+    graph = get_graph(
+        load_evaluators(config), checkpointer, config.get("evaluation_mode", "separate")
+    )
+    worker = partial(
+        arun, graph=graph, checkpointer=checkpointer, manifest=manifest, on_finished=on_finished
+    )
+    # at run_timeout admission stops and in-flight scenarios get drain_timeout to finish;
+    # whatever is still running then is cancelled (its checkpoints stay for the next run)
+    drain_timeout = (config.get("resilience") or {}).get("drain_timeout", DEFAULT_DRAIN_TIMEOUT)
+    stop = asyncio.Event()
+    stop_handle = None
+    if run_timeout is not None:
+        stop_handle = asyncio.get_running_loop().call_later(run_timeout, stop.set)
+    # a batch the sink cannot write stops admission; close() below re-raises its error
+    def stop_on_failed_write(error):
+        stop.set()
+
+    output_sink.on_failed.append(stop_on_failed_write)
     try:
-        for task in asyncio.as_completed(tasks, timeout=7200):
-            result = await task
-            print(result)
-            results_count += 1
-    except asyncio.TimeoutError:
-        logger.warning(f"⏱️ Scenario timed out after 2400 seconds: {i}")
-        print(f"🔍 Scenario timed out after 2400 seconds: {i}")
+        async with asyncio.timeout(None if run_timeout is None else run_timeout + drain_timeout):
+            async for result in scheduler.run(pending, worker, stop=stop, max_buffered=max_buffered):
+                print(result)
+                results_count += 1
+                if on_result is not None:
+                    await on_result(result)
+        if stop.is_set() and output_sink.error is None:
+            logger.warning(f"⏱️ Run deadline of {run_timeout} seconds reached, drained: {results_count} finished")
+    except TimeoutError:
+        logger.warning(
+            f"⏱️ Run timed out after {run_timeout + drain_timeout} seconds, in-flight scenarios cancelled: "
+            f"{results_count} finished"
+        )
+        print(f"🔍 Run timed out after {run_timeout + drain_timeout} seconds: {results_count} finished")
     finally:
+        if stop_handle is not None:
+            stop_handle.cancel()
         # log the number of results finished
         if results_count % 10 == 0:
             logger.info(f"🔍 Number of results finished: {results_count}")
             print(f"🔍 Number of results finished: {results_count}")
+        try:
+            await close_batchers()
+            await output_sink.close()
+        finally:
+            output_sink.fan_out = {}
+            output_sink.on_failed.remove(stop_on_failed_write)
+            if manifest is not None:
+                logger.info(f"📒 Run manifest: {manifest.counts()}")
+                output_sink.on_written.clear()
+                manifest.close()
+                checkpointer.close()
+            if llm_cache is not None:
+                logger.info(f"🗄️ LLM cache stats: {llm_cache.stats()}")
+            if policy is not None:
+                logger.info(f"🛡️ Call policy stats: {policy.stats()}")
+            if tracer is not None:
+                tracer.close()
+            if diagnostics is not None:
+                await diagnostics.stop()
+            await aclose_clients()
     return results_count
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--start", type=int, default=start)
+    parser.add_argument("--end", type=int, default=end)
+    parser.add_argument("--plan", action="store_true",
+                        help="estimate requests, tokens, cost and wall time without calling the LLM")
+    args = parser.parse_args()
+    config: dict = load_config(args.config)
+    if args.plan:
+        from planner import report
+        report(config, build_scenarios(config)[args.start:args.end])
+        raise SystemExit
     try:
-        asyncio.run(main(config))
+        asyncio.run(main(config, args.start, args.end))
     except Exception as e:
         logger.error(f"🚨 Error: {e}")
     # config: dict = load_config()
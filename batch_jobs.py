@@ -0,0 +1,280 @@
+"""
+Offline batch-job mode: emit prompts as OpenAI batch-request JSONL, ingest the responses.
+
+    # 1. translation requests for every pending hypothesis in start..end
+    python batch_jobs.py emit --config config/config_zh.yaml --start 0 --end 400 --out batch/translate.jsonl
+    # 2. submit batch/translate.jsonl to the batch API (or fill it locally for testing)
+    python batch_jobs.py fill-local --requests batch/translate.jsonl --out batch/translate.out.jsonl
+    # 3a. ingest translations and emit the evaluation requests for them ...
+    python batch_jobs.py ingest --requests batch/translate.jsonl --responses batch/translate.out.jsonl \\
+        --emit-evaluate batch/evaluate.jsonl
+    # 3b. ... or ingest and run the rest of the graph live (evaluate -> summarize -> refine -> accept)
+    python batch_jobs.py ingest --requests batch/evaluate.jsonl --responses batch/evaluate.out.jsonl
+
+    # emit -> fill-local -> ingest end to end on a small slice, pre-validation on (a quick self-check)
+    python batch_jobs.py roundtrip --config config/config_zh.yaml --start 0 --end 20
+
+Every request file has a `<name>.states.jsonl` sidecar holding the scenario states it
+was rendered from; ingest merges responses into those states by custom_id
+(`{stage}:{scenario_key}:{node}`) and enters the graph at the first missing stage.
+Requests without a usable response are simply run live.
+"""
+import argparse
+import asyncio
+import json
+import os
+import jsonlines
+from loguru import logger
+from langchain_core.messages import convert_to_openai_messages
+from langchain_core.utils.function_calling import convert_to_openai_function
+from prompt import DATA_TRANSLATION_PROMPT, configure_prompts, resolve_prompt
+from node_models import TranslationResponse
+from evaluators import load_evaluators, evaluation_nodes
+from llm_client import MODEL, TEMPERATURE
+from run_manifest import scenario_key
+from node_engine import output_sink
+from utils import load_config
+from prevalidator import configure_prevalidation, prevalidate
+import agents
+
+ENDPOINT = "/v1/chat/completions"
+TRANSLATE = "translate"
+EVALUATE = "evaluate"
+
+
+def states_path(requests_file) -> str:
+    root, _ = os.path.splitext(requests_file)
+    return f"{root}.states.jsonl"
+
+
+def response_format(schema) -> dict:
+    """Same json_schema response format with_structured_output sends for `schema`."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": schema.__name__,
+            "schema": convert_to_openai_function(schema)["parameters"],
+        },
+    }
+
+
+def batch_request(custom_id, prompt_template, schema, state, model=MODEL, temperature=TEMPERATURE) -> dict:
+    messages = resolve_prompt(prompt_template).invoke(state).to_messages()
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {
+            "model": model,
+            "temperature": temperature,
+            "messages": convert_to_openai_messages(messages),
+            "response_format": response_format(schema),
+        },
+    }
+
+
+def write_requests(requests_file, requests, states):
+    os.makedirs(os.path.dirname(requests_file) or ".", exist_ok=True)
+    with jsonlines.open(requests_file, "w") as writer:
+        writer.write_all(requests)
+    with jsonlines.open(states_path(requests_file), "w") as writer:
+        writer.write_all(states)
+    logger.info(f"📤 Wrote {len(requests)} requests for {len(states)} scenarios to {requests_file}")
+
+
+def translation_requests(states):
+    return [
+        batch_request(f"{TRANSLATE}:{scenario_key(state)}:DataTranslationAgent",
+                      DATA_TRANSLATION_PROMPT, TranslationResponse, state)
+        for state in states
+    ]
+
+
+def evaluation_requests(states, nodes):
+    return [
+        batch_request(f"{EVALUATE}:{scenario_key(state)}:{node.node}", node.prompt, node.schema, state)
+        for state in states
+        for node in nodes
+        if not node.done(state)
+    ]
+
+
+def pending_scenarios(config, start, end):
+    """Scenarios in start..end that are not accepted yet (same skip rule as agents.run_scenarios)."""
+    scenarios = agents.build_scenarios(config)[start:end]
+    return output_sink.pending(scenarios)
+
+
+def parse_response(line, schema):
+    """Parsed content of one batch output line, or None if the call failed or does not fit the schema."""
+    if line.get("error"):
+        return None
+    response = line.get("response") or {}
+    if response.get("status_code") != 200:
+        return None
+    try:
+        content = json.loads(response["body"]["choices"][0]["message"]["content"])
+    except (KeyError, IndexError, TypeError, json.JSONDecodeError):
+        return None
+    if not isinstance(content, dict) or not schema.__required_keys__ <= content.keys():
+        return None
+    return content
+
+
+def ingest_responses(requests_file, responses_file, nodes):
+    """Sidecar states with every usable response merged in."""
+    with jsonlines.open(states_path(requests_file), "r") as reader:
+        states = {scenario_key(state): state for state in reader}
+    schemas = {"DataTranslationAgent": TranslationResponse}
+    updates = {"DataTranslationAgent": lambda response: {"data_translation_result": response}}
+    for node in nodes:
+        schemas[node.node] = node.schema
+        updates[node.node] = node.to_update
+    merged = failed = 0
+    with jsonlines.open(responses_file, "r") as reader:
+        for line in reader:
+            _, key, node = line["custom_id"].split(":", 2)
+            if key not in states or node not in schemas:
+                logger.warning(f"⚠️ Unknown custom_id {line['custom_id']!r}, skipped")
+                continue
+            content = parse_response(line, schemas[node])
+            if content is None:
+                failed += 1
+                continue
+            states[key].update(updates[node](content))
+            merged += 1
+    logger.info(f"📥 Merged {merged} responses, {failed} failed (those run live)")
+    return list(states.values())
+
+
+def fill_local(requests_file, responses_file, fake_config=None):
+    """
+    Local stand-in for the batch API: answers every request the way the live
+    fake backend would (code-switched translations, seeded evaluator scores).
+    """
+    # testing only; emit and ingest must not depend on the fake backend
+    from fake_llm import from_config
+
+    backend = from_config(fake_config)
+    with jsonlines.open(requests_file, "r") as reader, jsonlines.open(responses_file, "w") as writer:
+        for i, request in enumerate(reader):
+            body = request["body"]
+            content = backend.content(body)
+            writer.write({
+                "id": f"batch_req_{i}",
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": f"local_{i}",
+                    "body": {
+                        "object": "chat.completion",
+                        "model": body["model"],
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)},
+                            "finish_reason": "stop",
+                        }],
+                    },
+                },
+                "error": None,
+            })
+    logger.info(f"🧪 Filled {responses_file} from {requests_file}")
+
+
+def emit_evaluation(config, states, nodes, evaluate_file) -> list:
+    """Write evaluation requests for the translated states; returns the states that got requests."""
+    translated = [s for s in states if s.get("data_translation_result")]
+    to_evaluate = translated
+    if configure_prevalidation(config.get("prevalidation")):
+        # pre-validation failures stay in the sidecar and go to the refiner on ingest
+        for state in translated:
+            state.update(prevalidate(state))
+        to_evaluate = [s for s in translated if s["prevalidation"]["passed"]]
+    write_requests(evaluate_file, evaluation_requests(to_evaluate, nodes), translated)
+    if len(translated) < len(states):
+        logger.warning(f"⚠️ {len(states) - len(translated)} scenarios had no translation and were left out")
+    return to_evaluate
+
+
+def roundtrip(config, start, end, workdir):
+    """
+    emit -> fill-local -> ingest --emit-evaluate -> fill-local -> ingest on
+    start..end, with pre-validation on. Raises RuntimeError when a stage loses
+    scenarios it should have carried forward.
+    """
+    config = {**config, "prevalidation": {**(config.get("prevalidation") or {}), "enabled": True}}
+    nodes = evaluation_stage(config)
+    translate_file = os.path.join(workdir, "translate.jsonl")
+    translated_file = os.path.join(workdir, "translate.out.jsonl")
+    evaluate_file = os.path.join(workdir, "evaluate.jsonl")
+    evaluated_file = os.path.join(workdir, "evaluate.out.jsonl")
+    states = pending_scenarios(config, start, end)
+    if not states:
+        raise RuntimeError(f"No pending scenarios in {start}..{end}")
+    write_requests(translate_file, translation_requests(states), states)
+    fill_local(translate_file, translated_file, config.get("fake_llm"))
+    translated = ingest_responses(translate_file, translated_file, nodes)
+    if missing := sum(1 for s in translated if not s.get("data_translation_result")):
+        raise RuntimeError(f"{missing} of {len(translated)} translations did not survive ingest")
+    to_evaluate = emit_evaluation(config, translated, nodes, evaluate_file)
+    if not to_evaluate:
+        raise RuntimeError(f"Pre-validation rejected all {len(translated)} translations")
+    fill_local(evaluate_file, evaluated_file, config.get("fake_llm"))
+    evaluated = ingest_responses(evaluate_file, evaluated_file, nodes)
+    passed = {scenario_key(s) for s in to_evaluate}
+    if unscored := sum(1 for s in evaluated if scenario_key(s) in passed and not all(n.done(s) for n in nodes)):
+        raise RuntimeError(f"{unscored} of {len(passed)} evaluated scenarios are missing scores")
+    logger.info(
+        f"✅ Round trip: {len(states)} scenarios, {len(to_evaluate)} passed pre-validation "
+        f"and were scored by {len(nodes)} evaluation nodes"
+    )
+
+
+def evaluation_stage(config):
+    return evaluation_nodes(load_evaluators(config), config.get("evaluation_mode", "separate"))
+
+
+async def main(args):
+    config = load_config(args.config)
+    if args.command == "fill-local":
+        fill_local(args.requests, args.out, config.get("fake_llm"))
+        return
+    configure_prompts(config.get("prompts"))
+    if args.command == "roundtrip":
+        roundtrip(config, args.start, args.end, args.dir)
+        return
+    nodes = evaluation_stage(config)
+    if args.command == "emit":
+        states = pending_scenarios(config, args.start, args.end)
+        write_requests(args.out, translation_requests(states), states)
+        return
+    states = ingest_responses(args.requests, args.responses, nodes)
+    if args.emit_evaluate:
+        emit_evaluation(config, states, nodes, args.emit_evaluate)
+        return
+    await agents.run_scenarios(config, states)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    emit = commands.add_parser("emit", help="render pending translation prompts for start..end")
+    emit.add_argument("--config", default=agents.CONFIG_PATH)
+    emit.add_argument("--start", type=int, default=agents.start)
+    emit.add_argument("--end", type=int, default=agents.end)
+    emit.add_argument("--out", required=True)
+    ingest = commands.add_parser("ingest", help="merge batch responses and continue the graph")
+    ingest.add_argument("--config", default=agents.CONFIG_PATH)
+    ingest.add_argument("--requests", required=True, help="request file the responses answer (its sidecar is read)")
+    ingest.add_argument("--responses", required=True, help="batch output JSONL")
+    ingest.add_argument("--emit-evaluate", metavar="OUT", help="write evaluation requests instead of running the graph")
+    fill = commands.add_parser("fill-local", help="answer a request file locally (testing stand-in)")
+    fill.add_argument("--requests", required=True)
+    fill.add_argument("--config", default=agents.CONFIG_PATH, help="its `fake_llm` section shapes the answers")
+    fill.add_argument("--out", required=True)
+    check = commands.add_parser("roundtrip", help="emit, fill locally and ingest start..end with pre-validation on")
+    check.add_argument("--config", default=agents.CONFIG_PATH)
+    check.add_argument("--start", type=int, default=0)
+    check.add_argument("--end", type=int, default=20)
+    check.add_argument("--dir", default="batch/roundtrip", help="where the request and response files go")
+    asyncio.run(main(parser.parse_args()))
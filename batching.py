@@ -0,0 +1,132 @@
+import asyncio
+from loguru import logger
+
+DEFAULT_MAX_WAIT = 0.5
+
+
+class MicroBatcher:
+    """
+    Packs single-item requests from concurrent graphs into one LLM call.
+
+    Each graph awaits `submit(state)` as if it made its own call. Items with the
+    same `group_key` (prompt variables shared by the whole batch, e.g. the
+    language pair) are collected until `batch_size` is reached or `max_wait`
+    seconds pass, then `handler(states)` runs once for all of them. The handler
+    returns one result per state, or None for items that failed validation;
+    those are retried through `fallback(state)` as ordinary single-item calls.
+
+    Attributes:
+        name (str): Used in logs.
+        batch_size (int): Items per call.
+        max_wait (float): Seconds the first item of a batch may wait for company.
+    """
+    def __init__(self, name, handler, fallback, batch_size, group_key=None, max_wait=DEFAULT_MAX_WAIT):
+        self.name = name
+        self.handler = handler
+        self.fallback = fallback
+        self.batch_size = batch_size
+        self.group_key = group_key or (lambda state: None)
+        self.max_wait = max_wait
+        self._pending: dict = {}
+        self._timers: dict = {}
+        # the loop only keeps weak references to tasks; a collected batch would never resolve its futures
+        self._tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.fallbacks = 0
+
+    async def submit(self, state):
+        key = self.group_key(state)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(key, []).append((state, future))
+        if len(self._pending[key]) >= self.batch_size:
+            self._dispatch(key)
+        elif key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                self.max_wait, self._dispatch, key
+            )
+        return await future
+
+    def _dispatch(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        items = self._pending.pop(key, [])
+        if items:
+            task = asyncio.create_task(self._run(items))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """Drop items still waiting for company and wait for the batches already sent."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers = {}
+        for items in self._pending.values():
+            for _, future in items:
+                future.cancel()
+        self._pending = {}
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, items):
+        states = [state for state, _ in items]
+        try:
+            results = await self.handler(states)
+            self.batches += 1
+        except Exception as e:
+            logger.warning(f"⚠️ {self.name} batch of {len(items)} failed, falling back: {e}")
+            results = [None] * len(items)
+        await asyncio.gather(*(
+            self._resolve(state, future, result)
+            for (state, future), result in zip(items, results)
+        ))
+
+    async def _resolve(self, state, future, result):
+        if future.done():
+            return
+        try:
+            if result is None:
+                self.fallbacks += 1
+                result = await self.fallback(state)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        # the caller may have been cancelled while the fallback ran
+        if not future.done():
+            future.set_result(result)
+
+
+_batchers: dict[str, MicroBatcher] = {}
+
+
+def set_batcher(name, batcher: MicroBatcher | None):
+    if batcher is None:
+        _batchers.pop(name, None)
+    else:
+        _batchers[name] = batcher
+
+
+def get_batcher(name) -> MicroBatcher | None:
+    return _batchers.get(name)
+
+
+async def close_batchers():
+    for batcher in list(_batchers.values()):
+        await batcher.close()
+
+
+def index_results(items, count, validate):
+    """
+    Map a list-shaped response back to input positions (1-based `index`).
+    Returns `count` entries; missing or invalid items are None (a repeated index keeps its first entry).
+    """
+    results = [None] * count
+    seen = set()
+    for item in items or []:
+        index = item.get("index") if isinstance(item, dict) else None
+        if not isinstance(index, int) or not 1 <= index <= count or index in seen:
+            continue
+        seen.add(index)
+        if validate(item):
+            results[index - 1] = item
+    return results
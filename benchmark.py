@@ -0,0 +1,230 @@
+"""
+End-to-end throughput benchmark of the graph against the local fake LLM backend.
+
+    python benchmark.py --config config/config_zh.yaml --sizes 1000 10000 --out bench.json
+    python benchmark.py --sizes 1000 --baseline bench.json   # exits 1 on a regression
+
+Runs agents.run_scenarios over synthetic hypotheses with every call answered by
+fake_llm.FakeLLMBackend (settings from the `fake_llm` config section) and reports
+scenarios per second, p50/p95/p99 latency per node, prompt tokens per node
+(static prefix, dynamic tail, provider cache hits), peak RSS and event-loop lag.
+--prompt-variant compares the standard and compact prompt sets.
+No API credit is used, and nothing is written to data_output or to the trace
+that planner.py reads as run history.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from loguru import logger
+import agents
+import fake_llm
+from llm_client import configure_transport, collect_usage
+from node_engine import output_sink
+from node_models import AgentRunningState
+from utils import load_config
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_TOLERANCE = 0.1
+LAG_INTERVAL = 0.05
+
+
+def percentiles(values) -> dict:
+    """Nearest-rank p50/p95/p99 (zeros for an empty list)."""
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a `sleep(interval)` wakes up. Anything
+    blocking the loop (sync I/O, heavy CPU in a node) shows up here.
+    """
+    def __init__(self, interval=LAG_INTERVAL):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def report(self) -> dict:
+        return {**percentiles(self.samples), "max": max(self.samples, default=0.0)}
+
+
+def synthetic_scenarios(config, size) -> list[AgentRunningState]:
+    pre_execute = config["pre_execute"]
+    return [
+        AgentRunningState(
+            hypothesis={"hypo": f"Benchmark hypothesis {i}: the committee met again on a quiet afternoon."},
+            first_language=pre_execute["first_language"],
+            second_language=pre_execute["second_language"],
+            cs_ratio=pre_execute["cs_ratio"],
+        )
+        for i in range(size)
+    ]
+
+
+def benchmark_config(config) -> dict:
+    """Run config for a benchmark: no cache, no resume, no tracing, scheduler from the `benchmark` section."""
+    bench = config.get("benchmark") or {}
+    return {
+        **config,
+        "scheduler": bench.get("scheduler") or {"max_in_flight": 256},
+        "llm_cache": {"mode": "off"},
+        "resume": {"enabled": False},
+        # fake-backend latencies and refine rates must not end up in the planner's history
+        "tracing": {"enabled": False},
+    }
+
+
+def node_report(usage) -> dict:
+    nodes = {}
+    for call in usage:
+        nodes.setdefault(call["agent"], []).append(call)
+    return {
+        name: {
+            "calls": len(calls),
+            "latency": percentiles([c["latency"] for c in calls]),
+            "queue_wait": percentiles([c["queue_wait"] for c in calls]),
+            "input_tokens": sum(c.get("input_tokens", 0) for c in calls),
+            "output_tokens": sum(c.get("output_tokens", 0) for c in calls),
+            "static_tokens": sum(c.get("static_tokens", 0) for c in calls),
+            "cached_tokens": sum(c.get("cached_tokens", 0) for c in calls),
+        }
+        for name, calls in sorted(nodes.items())
+    }
+
+
+async def run_size(config, size):
+    backend = fake_llm.from_config(config.get("fake_llm"))
+    configure_transport(backend)
+    scenarios = synthetic_scenarios(config, size)
+    output_dir = output_sink.output_dir
+    monitor = LoopLagMonitor()
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull:
+        output_sink.output_dir = tmp
+        try:
+            with collect_usage() as usage, redirect_stdout(devnull):
+                monitor.start()
+                started = time.perf_counter()
+                finished = await agents.run_scenarios(benchmark_config(config), scenarios)
+                elapsed = time.perf_counter() - started
+                await monitor.stop()
+        finally:
+            output_sink.output_dir = output_dir
+            configure_transport(None)
+    return {
+        "size": size,
+        "finished": finished,
+        "seconds": elapsed,
+        "scenarios_per_second": finished / elapsed if elapsed else 0.0,
+        "llm_calls": backend.calls,
+        "llm_errors": backend.errors,
+        "input_tokens": sum(call.get("input_tokens", 0) for call in usage),
+        "cached_tokens": backend.cached_tokens,
+        "refined": sum(1 for call in usage if call["agent"] == "RefinerAgent"),
+        "nodes": node_report(usage),
+        "loop_lag": monitor.report(),
+        # ru_maxrss is in KiB on Linux; peak of the whole process so far
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def print_report(result):
+    print(f"size {result['size']}: {result['finished']} finished in {result['seconds']:.1f}s "
+          f"= {result['scenarios_per_second']:.1f} scenarios/s, "
+          f"{result['llm_calls']} calls ({result['llm_errors']} errors), {result['refined']} refined, "
+          f"{result['input_tokens']} input tokens ({result['cached_tokens']} cached), "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB")
+    lag = result["loop_lag"]
+    print(f"  loop lag  p50 {lag['p50'] * 1000:.1f}ms  p95 {lag['p95'] * 1000:.1f}ms  "
+          f"p99 {lag['p99'] * 1000:.1f}ms  max {lag['max'] * 1000:.1f}ms")
+    print(f"  {'node':<28}{'calls':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'wait p95':>10}")
+    for name, node in result["nodes"].items():
+        latency = node["latency"]
+        print(f"  {name:<28}{node['calls']:>8}{latency['p50']:>9.3f}{latency['p95']:>9.3f}"
+              f"{latency['p99']:>9.3f}{node['queue_wait']['p95']:>10.3f}")
+    # static = the prompt's cacheable prefix (counted locally), cached = what the backend served from cache
+    print(f"  {'node':<28}{'input':>10}{'static':>10}{'dynamic':>10}{'cached':>10}{'hit rate':>10}")
+    for name, node in result["nodes"].items():
+        dynamic = max(0, node["input_tokens"] - node["static_tokens"])
+        hit_rate = node["cached_tokens"] / node["input_tokens"] if node["input_tokens"] else 0.0
+        print(f"  {name:<28}{node['input_tokens']:>10}{node['static_tokens']:>10}{dynamic:>10}"
+              f"{node['cached_tokens']:>10}{hit_rate:>10.1%}")
+
+
+def regressions(results, baseline, tolerance) -> list[str]:
+    """Sizes whose throughput dropped more than `tolerance` below the baseline run."""
+    previous = {r["size"]: r for r in baseline.get("results", [])}
+    found = []
+    for result in results:
+        before = previous.get(result["size"])
+        if before is None:
+            continue
+        floor = before["scenarios_per_second"] * (1 - tolerance)
+        if result["scenarios_per_second"] < floor:
+            found.append(
+                f"size {result['size']}: {result['scenarios_per_second']:.1f} scenarios/s "
+                f"< {floor:.1f} (baseline {before['scenarios_per_second']:.1f})"
+            )
+    return found
+
+
+async def main(args):
+    config = load_config(args.config)
+    if args.prompt_variant:
+        config = {**config, "prompts": {**(config.get("prompts") or {}), "variant": args.prompt_variant}}
+    sizes = args.sizes or (config.get("benchmark") or {}).get("sizes") or DEFAULT_SIZES
+    results = []
+    for size in sizes:
+        logger.info(f"⏱️ Benchmarking {size} scenarios")
+        result = await run_size(config, size)
+        print_report(result)
+        results.append(result)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"config": args.config, "fake_llm": config.get("fake_llm"), "results": results}, f, indent=2)
+        print(f"Saved benchmark to {args.out}")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=agents.CONFIG_PATH)
+    parser.add_argument("--sizes", type=int, nargs="+", help="scenario counts (default from config, else 1000 10000)")
+    parser.add_argument("--prompt-variant", choices=["standard", "compact"],
+                        help="prompt set to benchmark (default from the `prompts` section)")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--baseline", help="earlier --out file to compare throughput against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed throughput drop vs the baseline (fraction)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,273 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+from typing import Any, Iterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    LangGraph checkpointer backed by a local SQLite file.
+
+    langgraph-checkpoint only ships the in-memory saver, so this is the same
+    storage layout as MemorySaver (checkpoints + pending writes per thread),
+    persisted so an interrupted graph can resume after a restart.
+
+    Attributes:
+        path (str): SQLite database file.
+    """
+    def __init__(self, path, *, serde=None):
+        super().__init__(serde=serde)
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS checkpoints (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                parent_id TEXT,
+                checkpoint_type TEXT,
+                checkpoint BLOB,
+                metadata_type TEXT,
+                metadata BLOB,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS writes (
+                thread_id TEXT NOT NULL,
+                checkpoint_ns TEXT NOT NULL,
+                checkpoint_id TEXT NOT NULL,
+                task_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                channel TEXT NOT NULL,
+                value_type TEXT,
+                value BLOB,
+                task_path TEXT,
+                PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+            )"""
+        )
+        self._conn.commit()
+
+    def _writes(self, thread_id, checkpoint_ns, checkpoint_id):
+        return self._conn.execute(
+            """SELECT task_id, channel, value_type, value, task_path, idx FROM writes
+               WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?""",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+    def _to_tuple(self, thread_id, checkpoint_ns, row) -> CheckpointTuple:
+        checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata = row
+        writes = self._writes(thread_id, checkpoint_ns, checkpoint_id)
+        sends = []
+        if parent_id:
+            sends = sorted(
+                (w for w in self._writes(thread_id, checkpoint_ns, parent_id) if w[1] == TASKS),
+                key=lambda w: (w[4], w[0], w[5]),
+            )
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **self.serde.loads_typed((checkpoint_type, checkpoint)),
+                "pending_sends": [self.serde.loads_typed((w[2], w[3])) for w in sends],
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value, _, _ in writes
+            ],
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": parent_id,
+                }
+            }
+            if parent_id
+            else None,
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"""SELECT {columns} FROM checkpoints
+                        WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?""",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    f"""SELECT {columns} FROM checkpoints
+                        WHERE thread_id = ? AND checkpoint_ns = ?
+                        ORDER BY checkpoint_id DESC LIMIT 1""",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            return self._to_tuple(thread_id, checkpoint_ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = """SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, checkpoint_type,
+                          checkpoint, metadata_type, metadata FROM checkpoints"""
+        clauses, params = [], []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *row in rows:
+                item = self._to_tuple(thread_id, checkpoint_ns, row)
+                if filter and not all(item.metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                results.append(item)
+                if limit is not None and len(results) >= limit:
+                    break
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        c = checkpoint.copy()
+        c.pop("pending_sends")  # type: ignore[misc]
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        checkpoint_type, checkpoint_blob = self.serde.dumps_typed(c)
+        metadata_type, metadata_blob = self.serde.dumps_typed(metadata)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),  # parent
+                    checkpoint_type,
+                    checkpoint_blob,
+                    metadata_type,
+                    metadata_blob,
+                ),
+            )
+            self._conn.commit()
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, value_blob = self.serde.dumps_typed(value)
+            rows.append((
+                thread_id, checkpoint_ns, checkpoint_id, task_id,
+                WRITES_IDX_MAP.get(channel, idx), channel, value_type, value_blob, task_path,
+            ))
+        with self._lock:
+            # special writes (negative idx) are replaced, regular ones are kept once
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] < 0],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row for row in rows if row[4] >= 0],
+            )
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    # the async API runs the sync methods (which take _lock) on a worker thread,
+    # so serialization and SQLite commits never block the event loop
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path="") -> None:
+        return await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
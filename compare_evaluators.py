@@ -0,0 +1,181 @@
+"""
+Compare fused (one call) and separate (three calls) evaluation on a fixed sample.
+
+    python compare_evaluators.py --config config/config_zh.yaml --sample 50 --out compare.json
+
+Reads accepted records (hypothesis + code-switched text) from data_output/{lang}.jsonl (or .records),
+scores every record both ways and reports score agreement plus token and latency savings.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from loguru import logger
+from evaluators import load_evaluators, FusedEvaluator
+from llm_client import collect_usage, aclose_clients
+from scheduler import configure_rate_limiter
+from utils import load_config, weighting_scheme
+from record_store import read_records
+
+# same acceptance threshold as agents.meet_criteria
+ACCEPT_SCORE = 8
+STATE_KEYS = ("hypothesis", "first_language", "second_language", "cs_ratio", "data_translation_result")
+
+
+def load_sample(path, sample, seed):
+    records = [
+        {k: obj[k] for k in STATE_KEYS if k in obj}
+        for obj in read_records(path)
+        if obj.get("data_translation_result")
+    ]
+    random.Random(seed).shuffle(records)
+    return records[:sample]
+
+
+async def timed(coro_factory):
+    with collect_usage() as usage:
+        started = time.perf_counter()
+        results = await coro_factory()
+        elapsed = time.perf_counter() - started
+    return results, elapsed, usage
+
+
+async def score_separate(state, evaluators):
+    async def run():
+        updates = await asyncio.gather(*(e(state) for e in evaluators))
+        merged = {}
+        for update in updates:
+            merged.update(update)
+        return merged
+    return await timed(run)
+
+
+async def score_fused(state, evaluators):
+    fused = FusedEvaluator()
+    others = [e for e in evaluators if e.name not in FusedEvaluator.covers]
+
+    async def run():
+        updates = await asyncio.gather(fused(state), *(e(state) for e in others))
+        merged = {}
+        for update in updates:
+            merged.update(update)
+        return merged
+    return await timed(run)
+
+
+def summarize_mode(rows, mode):
+    latencies = [r[mode]["latency"] for r in rows]
+    usage = [u for r in rows for u in r[mode]["usage"]]
+    n = len(rows)
+    return {
+        "calls_per_item": len(usage) / n,
+        "input_tokens_per_item": sum(u.get("input_tokens", 0) for u in usage) / n,
+        "output_tokens_per_item": sum(u.get("output_tokens", 0) for u in usage) / n,
+        "latency_mean": statistics.fmean(latencies),
+        "latency_p50": statistics.median(latencies),
+    }
+
+
+def agreement(rows, evaluators):
+    report = {}
+    for e in evaluators:
+        separate = [r["separate"]["scores"][e.name] for r in rows]
+        fused = [r["fused"]["scores"][e.name] for r in rows]
+        try:
+            correlation = statistics.correlation(separate, fused)
+        except statistics.StatisticsError:
+            correlation = None
+        report[e.name] = {
+            "mean_abs_diff": statistics.fmean(abs(a - b) for a, b in zip(separate, fused)),
+            "pearson_r": correlation,
+        }
+    report["weighted_score"] = {
+        "mean_abs_diff": statistics.fmean(
+            abs(r["separate"]["score"] - r["fused"]["score"]) for r in rows
+        ),
+    }
+    report["accept_decision_agreement"] = statistics.fmean(
+        (r["separate"]["score"] >= ACCEPT_SCORE) == (r["fused"]["score"] >= ACCEPT_SCORE)
+        for r in rows
+    )
+    return report
+
+
+async def compare(records, evaluators, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(state):
+        async with semaphore:
+            row = {"hypothesis": state.get("hypothesis")}
+            for mode, scorer in (("separate", score_separate), ("fused", score_fused)):
+                results, latency, usage = await scorer(state, evaluators)
+                scored = {**state, **results}
+                row[mode] = {
+                    "scores": {e.name: e.score(scored) for e in evaluators},
+                    "score": weighting_scheme(scored, evaluators),
+                    "latency": latency,
+                    "usage": usage,
+                }
+            return row
+
+    rows = []
+    for row in asyncio.as_completed([one(state) for state in records]):
+        try:
+            rows.append(await row)
+        except Exception as e:
+            logger.error(f"🚨 Comparison failed for one record: {e}")
+    return rows
+
+
+async def main(args):
+    config = load_config(args.config)
+    configure_rate_limiter(config.get("scheduler"))
+    evaluators = load_evaluators(config)
+    second_lang = config["pre_execute"]["second_language"]
+    records = load_sample(args.input or f"data_output/{second_lang}.jsonl", args.sample, args.seed)
+    try:
+        rows = await compare(records, evaluators, args.concurrency)
+    finally:
+        await aclose_clients()
+    if not rows:
+        print("No records scored.")
+        return None
+
+    separate = summarize_mode(rows, "separate")
+    fused = summarize_mode(rows, "fused")
+    report = {
+        "items": len(rows),
+        "separate": separate,
+        "fused": fused,
+        "savings": {
+            key: 1 - fused[key] / separate[key] if separate[key] else 0.0
+            for key in separate
+        },
+        "agreement": agreement(rows, evaluators),
+    }
+
+    print(f"items: {report['items']}")
+    print(f"{'':<24}{'separate':>12}{'fused':>12}{'saving':>10}")
+    for key in separate:
+        print(f"{key:<24}{separate[key]:>12.2f}{fused[key]:>12.2f}{report['savings'][key]:>10.1%}")
+    print("agreement (fused vs separate):")
+    for name, values in report["agreement"].items():
+        print(f"  {name}: {values}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({**report, "rows": rows}, f, ensure_ascii=False, indent=2, default=str)
+        print(f"Saved report to {args.out}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default="./config/config_zh.yaml")
+    parser.add_argument("--input", help="accepted records JSONL or record store (default data_output/{lang}.jsonl)")
+    parser.add_argument("--sample", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--out", help="write the full report as JSON")
+    asyncio.run(main(parser.parse_args()))
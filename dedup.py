@@ -0,0 +1,152 @@
+import hashlib
+import random
+import re
+import unicodedata
+import numpy as np
+from loguru import logger
+from run_manifest import hypo_text, scenario_key
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 16
+DEFAULT_SHINGLE_SIZE = 4
+# 32-bit universal hashes (a * h + b) mod 2^32; products fit in uint64
+_MASK = np.uint64(0xFFFFFFFF)
+
+
+def normalize_hypo(text: str) -> str:
+    """NFKC, case-folded, punctuation dropped, whitespace collapsed."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def shingles(text: str, size=DEFAULT_SHINGLE_SIZE) -> set:
+    """Character `size`-grams of a normalized hypothesis (the whole text if shorter)."""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class MinHasher:
+    """
+    MinHash signatures with LSH banding for near-duplicate detection.
+
+    Two texts land in the same bucket of some band with high probability when
+    their shingle Jaccard similarity is high; candidates are then confirmed
+    by the fraction of matching signature slots.
+
+    Attributes:
+        num_perm (int): Signature length.
+        bands (int): LSH bands; num_perm must be divisible by it.
+    """
+    def __init__(self, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS, seed=0):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        rng = random.Random(seed)
+        self._a = np.array([rng.randrange(1, 1 << 32) for _ in range(num_perm)], dtype=np.uint64)
+        self._b = np.array([rng.randrange(0, 1 << 32) for _ in range(num_perm)], dtype=np.uint64)
+
+    def signature(self, items: set) -> tuple:
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=4).digest(), "big")
+             for item in items),
+            dtype=np.uint64,
+            count=len(items),
+        )
+        values = (np.outer(hashes, self._a) + self._b) & _MASK
+        return tuple(values.min(axis=0).tolist())
+
+    def band_keys(self, signature):
+        rows = self.num_perm // self.bands
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(left, right) -> float:
+        return sum(a == b for a, b in zip(left, right)) / len(left)
+
+
+def _job_key(state):
+    """Scenarios only collapse when everything but the hypothesis wording is the same."""
+    return (state.get("first_language"), state.get("second_language"), str(state.get("cs_ratio")))
+
+
+def group_scenarios(
+    scenarios, near_duplicates=False, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM,
+    bands=DEFAULT_BANDS, shingle_size=DEFAULT_SHINGLE_SIZE,
+) -> list[list]:
+    """
+    Group scenarios whose hypotheses are identical after normalize_hypo, and
+    optionally near-duplicates (estimated Jaccard >= threshold, same word
+    count). Each group keeps input order; its first scenario is the one that gets run.
+    """
+    parent = list(range(len(scenarios)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        i, j = find(i), find(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)
+
+    normalized = [normalize_hypo(hypo_text(state)) for state in scenarios]
+    exact = {}
+    for i, state in enumerate(scenarios):
+        key = (_job_key(state), normalized[i])
+        if key in exact:
+            union(exact[key], i)
+        else:
+            exact[key] = i
+
+    if near_duplicates:
+        hasher = MinHasher(num_perm, bands)
+        # one signature per distinct normalized text
+        signatures = {i: hasher.signature(shingles(normalized[i], shingle_size)) for i in exact.values()}
+        lengths = {i: len(normalized[i].split()) for i in signatures}
+        buckets = {}
+        for i, signature in signatures.items():
+            for band_key in hasher.band_keys(signature):
+                buckets.setdefault((_job_key(scenarios[i]), band_key), []).append(i)
+        for members in buckets.values():
+            for a, i in enumerate(members):
+                for j in members[a + 1:]:
+                    # NLI hypotheses come in minimal pairs ("told" / "never told"); an
+                    # inserted or dropped word changes the label, so word counts must match
+                    if (
+                        find(i) != find(j)
+                        and lengths[i] == lengths[j]
+                        and hasher.similarity(signatures[i], signatures[j]) >= threshold
+                    ):
+                        union(i, j)
+
+    groups = {}
+    for i in range(len(scenarios)):
+        groups.setdefault(find(i), []).append(scenarios[i])
+    return list(groups.values())
+
+
+def plan_dedup(scenarios, dedup_config: dict | None):
+    """
+    Apply the `dedup` config section. Returns (representatives, members) where
+    members maps a representative's scenario_key to the scenarios whose
+    accepted record is copied from it.
+    """
+    dedup_config = dedup_config or {}
+    if not dedup_config.get("enabled", False):
+        return scenarios, {}
+    groups = group_scenarios(
+        scenarios,
+        near_duplicates=dedup_config.get("near_duplicates", False),
+        threshold=dedup_config.get("threshold", DEFAULT_THRESHOLD),
+        num_perm=dedup_config.get("num_perm", DEFAULT_NUM_PERM),
+        bands=dedup_config.get("bands", DEFAULT_BANDS),
+        shingle_size=dedup_config.get("shingle_size", DEFAULT_SHINGLE_SIZE),
+    )
+    members = {scenario_key(group[0]): group[1:] for group in groups if len(group) > 1}
+    logger.info(f"🧬 Collapsed {len(scenarios)} hypotheses into {len(groups)} groups")
+    return [group[0] for group in groups], members
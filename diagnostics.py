@@ -0,0 +1,246 @@
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from loguru import logger
+
+# defaults of the `diagnostics` config section
+DEFAULT_LAG_INTERVAL = 0.05
+DEFAULT_BLOCK_THRESHOLD = 0.1
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_PROFILE_PATH = "logs/loop_profile.folded"
+DEFAULT_STACK_DEPTH = 128
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    # ";" separates frames in the folded format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _idle(frame) -> bool:
+    """The loop is parked in the selector, i.e. waiting for the network or a timer."""
+    return frame.f_code.co_filename.endswith("selectors.py")
+
+
+def _percentile(values, q) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopDiagnostics:
+    """
+    Event-loop lag, blocking-callback stacks and a CPU profile of the loop thread.
+
+    A probe task sleeps `lag_interval` seconds over and over; how late it wakes
+    up is the loop lag every other coroutine sees. A watchdog thread logs the
+    loop thread's stack whenever the probe has not run for `block_threshold`
+    seconds beyond its interval, i.e. while some callback still holds the loop.
+    With `profile` on, the loop thread's stack is sampled every `sample_interval`
+    seconds of CPU time: a SIGPROF interval timer when the loop runs in the main
+    thread, otherwise a sampler thread that only samples while the loop thread's
+    CPU clock advances (Linux; elsewhere it drops samples parked in the
+    selector). Either way network and timer waits do not show up. The sampler
+    thread can only look while the loop thread releases the GIL, so its samples
+    lean towards system calls; the timer has no such bias. Stacks are written in
+    the collapsed "frame;frame;frame count" format read by flamegraph.pl,
+    speedscope and inferno.
+
+    Attributes:
+        lag_interval (float): Seconds between lag probes.
+        block_threshold (float): Lag in seconds that counts as a blocked loop.
+        profile (bool): Whether the loop thread is sample-profiled.
+        sample_interval (float): Seconds between profile samples.
+        profile_path (str): Collapsed-stack output file.
+        stack_depth (int): Frames kept per logged or sampled stack.
+    """
+    def __init__(
+        self, lag_interval=DEFAULT_LAG_INTERVAL, block_threshold=DEFAULT_BLOCK_THRESHOLD,
+        profile=True, sample_interval=DEFAULT_SAMPLE_INTERVAL, profile_path=DEFAULT_PROFILE_PATH,
+        stack_depth=DEFAULT_STACK_DEPTH,
+    ):
+        self.lag_interval = lag_interval
+        self.block_threshold = block_threshold
+        self.profile = profile
+        self.sample_interval = sample_interval
+        self.profile_path = profile_path
+        self.stack_depth = stack_depth
+        self._lags: list[float] = []
+        self._blocks: list[float] = []
+        self._stacks = Counter()
+        self._samples = 0
+        self._cpu_clock = None
+        self._cpu_started = 0.0
+        self._started = 0.0
+        self._heartbeat = 0.0
+        self._thread_id = None
+        self._probe = None
+        self._threads: list[threading.Thread] = []
+        self._stop = threading.Event()
+        self._previous_handler = None
+
+    @classmethod
+    def from_config(cls, diagnostics_config: dict):
+        return cls(
+            lag_interval=diagnostics_config.get("lag_interval", DEFAULT_LAG_INTERVAL),
+            block_threshold=diagnostics_config.get("block_threshold", DEFAULT_BLOCK_THRESHOLD),
+            profile=diagnostics_config.get("profile", True),
+            sample_interval=diagnostics_config.get("sample_interval", DEFAULT_SAMPLE_INTERVAL),
+            profile_path=diagnostics_config.get("profile_path", DEFAULT_PROFILE_PATH),
+            stack_depth=diagnostics_config.get("stack_depth", DEFAULT_STACK_DEPTH),
+        )
+
+    def start(self):
+        """Start probing the running loop; call from inside it."""
+        self._thread_id = threading.get_ident()
+        try:
+            self._cpu_clock = time.pthread_getcpuclockid(self._thread_id)
+            self._cpu_started = time.clock_gettime(self._cpu_clock)
+        except (AttributeError, OSError):
+            self._cpu_clock = None
+        self._started = self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._probe = asyncio.get_running_loop().create_task(self._measure_lag())
+        targets = [self._watch]
+        if self.profile and threading.current_thread() is threading.main_thread() and hasattr(signal, "setitimer"):
+            # ITIMER_PROF counts process CPU time; the handler runs on the loop thread
+            self._previous_handler = signal.signal(signal.SIGPROF, self._on_sigprof)
+            signal.setitimer(signal.ITIMER_PROF, self.sample_interval, self.sample_interval)
+        elif self.profile:
+            targets.append(self._sample)
+        self._threads = [threading.Thread(target=target, name=f"loop-{target.__name__.strip('_')}", daemon=True)
+                         for target in targets]
+        for thread in self._threads:
+            thread.start()
+
+    async def _measure_lag(self):
+        while True:
+            expected = time.monotonic() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._lags.append(lag)
+            if lag >= self.block_threshold:
+                self._blocks.append(lag)
+            self._heartbeat = now
+
+    def _loop_frame(self):
+        return sys._current_frames().get(self._thread_id)
+
+    def _stack(self, frame) -> list:
+        names = []
+        while frame is not None and len(names) < self.stack_depth:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        if frame is not None:
+            # keep truncated stacks under one root so the flamegraph still merges them
+            names.append("[truncated]")
+        return names[::-1]
+
+    def _watch(self):
+        reported = None
+        while not self._stop.wait(self.block_threshold / 2):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.lag_interval
+            if stalled < self.block_threshold or reported == heartbeat:
+                continue
+            # one report per stall: the heartbeat moves again once the loop is free
+            reported = heartbeat
+            frame = self._loop_frame()
+            if frame is None:
+                continue
+            stack = "".join(traceback.format_stack(frame, limit=self.stack_depth))
+            logger.warning(f"🐢 Event loop blocked for {stalled:.3f}s so far in:\n{stack}")
+
+    def _record(self, frame):
+        self._stacks[";".join(self._stack(frame))] += 1
+        self._samples += 1
+
+    def _on_sigprof(self, signum, frame):
+        # other threads' CPU time fires the timer too, while the loop sits in the selector
+        if frame is not None and not _idle(frame):
+            self._record(frame)
+
+    def _sample(self):
+        cpu = self._cpu_started
+        while not self._stop.wait(self.sample_interval):
+            if self._cpu_clock is not None:
+                try:
+                    used = time.clock_gettime(self._cpu_clock)
+                except OSError:
+                    return
+                on_cpu, cpu = used > cpu, used
+                if not on_cpu:
+                    continue
+            frame = self._loop_frame()
+            if frame is None or (self._cpu_clock is None and _idle(frame)):
+                continue
+            self._record(frame)
+
+    def stats(self) -> dict:
+        wall = time.monotonic() - self._started
+        stats = {
+            "wall": wall,
+            "lag_p50": _percentile(self._lags, 0.5),
+            "lag_p99": _percentile(self._lags, 0.99),
+            "lag_max": max(self._lags, default=0.0),
+            "blocks": len(self._blocks),
+            "blocked_seconds": sum(self._blocks),
+            "samples": self._samples,
+        }
+        if self._cpu_clock is not None:
+            try:
+                stats["loop_cpu"] = time.clock_gettime(self._cpu_clock) - self._cpu_started
+            except OSError:
+                pass
+        return stats
+
+    def write_profile(self):
+        os.makedirs(os.path.dirname(self.profile_path) or ".", exist_ok=True)
+        with open(self.profile_path, "w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    async def stop(self) -> dict:
+        stats = self.stats()
+        self._stop.set()
+        if self._previous_handler is not None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler)
+            self._previous_handler = None
+        if self._probe is not None:
+            self._probe.cancel()
+            await asyncio.gather(self._probe, return_exceptions=True)
+        for thread in self._threads:
+            thread.join()
+        logger.info(
+            f"🩺 Event loop: lag p50 {stats['lag_p50'] * 1000:.1f}ms, p99 {stats['lag_p99'] * 1000:.1f}ms, "
+            f"max {stats['lag_max'] * 1000:.1f}ms; {stats['blocks']} blocks >= {self.block_threshold}s "
+            f"({stats['blocked_seconds']:.2f}s); loop CPU {stats.get('loop_cpu', float('nan')):.2f}s "
+            f"of {stats['wall']:.2f}s wall"
+        )
+        if self.profile:
+            self.write_profile()
+            logger.info(f"🔥 {self._samples} loop CPU samples written to {self.profile_path}")
+        return stats
+
+
+_diagnostics: LoopDiagnostics | None = None
+
+
+def configure_diagnostics(diagnostics_config: dict | None) -> LoopDiagnostics | None:
+    """Install the process-wide loop diagnostics from the `diagnostics` config section (off unless enabled)."""
+    global _diagnostics
+    diagnostics_config = diagnostics_config or {}
+    _diagnostics = LoopDiagnostics.from_config(diagnostics_config) if diagnostics_config.get("enabled", False) else None
+    return _diagnostics
+
+
+def get_diagnostics() -> LoopDiagnostics | None:
+    return _diagnostics
@@ -0,0 +1,263 @@
+import json
+from difflib import SequenceMatcher
+import prompt
+import node_models
+from llm_client import get_agent
+from batching import get_batcher, index_results
+from run_manifest import hypo_text
+
+# used when the config has no `evaluators` section; same set and weights as before
+DEFAULT_EVALUATORS = [
+    {
+        "name": "accuracy",
+        "node": "TranslationAdequacyAgent",
+        "prompt": "ACCURACY_PROMPT",
+        "schema": "AccuracyResponse",
+        "result_key": "accuracy_result",
+        "score_key": "accuracy_score",
+        "weight": 0.3,
+    },
+    {
+        "name": "fluency",
+        "node": "FluencyAgent",
+        "prompt": "FLUENCY_PROMPT",
+        "schema": "FluencyResponse",
+        "result_key": "fluency_result",
+        "score_key": "fluency_score",
+        "weight": 0.4,
+    },
+    {
+        "name": "naturalness",
+        "node": "NaturalnessAgent",
+        "prompt": "NATURALNESS_PROMPT",
+        "schema": "NaturalnessResponse",
+        "result_key": "naturalness_result",
+        "score_key": "naturalness_score",
+        "weight": 0.3,
+    },
+]
+
+# defaults of the `reevaluation` config section
+DEFAULT_REEVALUATION_MODE = "affected"
+DEFAULT_DIMENSION_THRESHOLD = 8
+DEFAULT_MAX_EDIT_RATIO = 0
+
+_reevaluation = {
+    "mode": DEFAULT_REEVALUATION_MODE,
+    "dimension_threshold": DEFAULT_DIMENSION_THRESHOLD,
+    "max_edit_ratio": DEFAULT_MAX_EDIT_RATIO,
+}
+
+
+def configure_reevaluation(reevaluation_config: dict | None):
+    """Apply the `reevaluation` config section (which results a refinement invalidates)."""
+    reevaluation_config = reevaluation_config or {}
+    mode = reevaluation_config.get("mode", DEFAULT_REEVALUATION_MODE)
+    if mode not in ("affected", "all", "none"):
+        raise ValueError(f"Unknown reevaluation mode {mode!r}, expected 'affected', 'all' or 'none'")
+    _reevaluation["mode"] = mode
+    _reevaluation["dimension_threshold"] = reevaluation_config.get(
+        "dimension_threshold", DEFAULT_DIMENSION_THRESHOLD
+    )
+    _reevaluation["max_edit_ratio"] = reevaluation_config.get("max_edit_ratio", DEFAULT_MAX_EDIT_RATIO)
+
+
+class Evaluator:
+    """
+    One scoring dimension of the graph, resolved from a config entry.
+
+    Attributes:
+        name (str): Dimension name (accuracy, fluency, ...).
+        node (str): Graph node name.
+        prompt: ChatPromptTemplate from prompt.py.
+        schema: Response TypedDict from node_models.py.
+        result_key (str): AgentRunningState key the response is stored under.
+        score_key (str): Field of the response holding the 0-10 score.
+        weight (float): Weight in weighting_scheme.
+    """
+    def __init__(self, name, node, prompt, schema, result_key, score_key, weight):
+        self.name = name
+        self.node = node
+        self.prompt = prompt
+        self.schema = schema
+        self.result_key = result_key
+        self.score_key = score_key
+        self.weight = weight
+
+    @classmethod
+    def from_config(cls, entry: dict):
+        try:
+            prompt_template = getattr(prompt, entry["prompt"])
+            schema = getattr(node_models, entry["schema"])
+        except AttributeError as e:
+            raise ValueError(f"Evaluator {entry.get('name')!r}: {e}") from e
+        return cls(
+            name=entry["name"],
+            node=entry["node"],
+            prompt=prompt_template,
+            schema=schema,
+            result_key=entry["result_key"],
+            score_key=entry["score_key"],
+            weight=float(entry.get("weight", 1.0)),
+        )
+
+    def key(self):
+        return (self.name, self.node, id(self.prompt), self.schema.__name__,
+                self.result_key, self.score_key, self.weight)
+
+    def score(self, state) -> float:
+        return state[self.result_key][self.score_key]
+
+    def done(self, state) -> bool:
+        return bool(state.get(self.result_key))
+
+    def to_update(self, response) -> dict:
+        return {self.result_key: response}
+
+    async def __call__(self, state):
+        if self.done(state):
+            # result already supplied (e.g. ingested from an offline batch job)
+            # or kept from before a refinement
+            return {}
+        agent = get_agent(self.node, self.prompt, self.schema)
+        response = await agent.ainvoke(state)
+        print(response)
+        return {**self.to_update(response), "evaluated_inputs": {self.result_key: _translated_text(state)}}
+
+
+class FusedEvaluator:
+    """
+    Scores accuracy, fluency and naturalness in one call (FUSED_EVALUATION_PROMPT)
+    and writes the same three state keys the separate evaluators would, so
+    SummarizeResult and weighting_scheme are unchanged.
+    """
+    node = "FusedEvaluationAgent"
+    prompt = prompt.FUSED_EVALUATION_PROMPT
+    schema = node_models.FusedEvaluationResponse
+    covers = ("accuracy", "fluency", "naturalness")
+    result_keys = ("accuracy_result", "fluency_result", "naturalness_result")
+
+    def key(self):
+        return (self.node, id(self.prompt))
+
+    def done(self, state) -> bool:
+        return all(state.get(key) for key in self.result_keys)
+
+    def to_update(self, response) -> dict:
+        return {key: response[key] for key in self.result_keys}
+
+    async def evaluate(self, state):
+        agent = get_agent(self.node, self.prompt, self.schema)
+        return await agent.ainvoke(state)
+
+    async def __call__(self, state):
+        if self.done(state):
+            return {}
+        batcher = get_batcher("evaluation")
+        if batcher is not None:
+            response = await batcher.submit(state)
+        else:
+            response = await self.evaluate(state)
+        print(response)
+        text = _translated_text(state)
+        return {**self.to_update(response), "evaluated_inputs": {key: text for key in self.result_keys}}
+
+
+def _translated_text(state):
+    result = state.get("data_translation_result")
+    if isinstance(result, dict):
+        return result.get("translated_sentence", "")
+    return str(result or "")
+
+
+def edit_ratio(before: str, after: str) -> float:
+    """Share of words changed between two texts (0 = identical, 1 = nothing in common)."""
+    return 1 - SequenceMatcher(None, before.split(), after.split(), autojunk=False).ratio()
+
+
+def invalidate_results(state, evaluators: list[Evaluator], refined) -> dict:
+    """
+    State update clearing the evaluator results a refinement makes stale.
+    In "affected" mode a result is kept only when the text it scored is
+    exactly `refined`; a positive max_edit_ratio also keeps results that
+    scored at least dimension_threshold on a text at most that far from
+    `refined`. "all" clears every result and "none" keeps them all.
+    """
+    mode = _reevaluation["mode"]
+    if mode == "none":
+        return {}
+    refined_text = refined.get("translated_sentence", "") if isinstance(refined, dict) else str(refined or "")
+    scored = state.get("evaluated_inputs") or {}
+    max_edit_ratio = _reevaluation["max_edit_ratio"]
+    update = {}
+    for evaluator in evaluators:
+        if not evaluator.done(state):
+            continue
+        # results ingested without a record scored the current translation
+        before = scored.get(evaluator.result_key, _translated_text(state))
+        if mode == "affected" and (
+            before == refined_text
+            or max_edit_ratio > 0
+            and evaluator.score(state) >= _reevaluation["dimension_threshold"]
+            and edit_ratio(before, refined_text) <= max_edit_ratio
+        ):
+            continue
+        update[evaluator.result_key] = None
+    return update
+
+
+def _valid_fused_item(item):
+    for key, score_key in zip(
+        FusedEvaluator.result_keys, ("accuracy_score", "fluency_score", "naturalness_score")
+    ):
+        score = (item.get(key) or {}).get(score_key)
+        if not isinstance(score, (int, float)) or not 0 <= score <= 10:
+            return False
+    return True
+
+
+async def evaluate_batch(states):
+    """One BATCH_EVALUATION_PROMPT call for several scenarios; None for items that failed validation."""
+    items = "\n".join(
+        f"{i}. Original: {hypo_text(state)}\n   Code-switched: {_translated_text(state)}"
+        for i, state in enumerate(states, start=1)
+    )
+    agent = get_agent(
+        "BatchEvaluationAgent", prompt.BATCH_EVALUATION_PROMPT, node_models.BatchEvaluationResponse
+    )
+    response = await agent.ainvoke({"items": items})
+    results = index_results(response.get("evaluations"), len(states), _valid_fused_item)
+    return [
+        {key: item[key] for key in FusedEvaluator.result_keys} if item else None
+        for item in results
+    ]
+
+
+def evaluation_nodes(evaluators: list[Evaluator], mode="separate") -> list:
+    """
+    Graph nodes that produce the evaluator results. In "fused" mode the
+    accuracy/fluency/naturalness evaluators share one FusedEvaluator call;
+    any other enabled evaluator keeps its own node.
+    """
+    if mode == "separate":
+        return list(evaluators)
+    if mode != "fused":
+        raise ValueError(f"Unknown evaluation_mode {mode!r}, expected 'separate' or 'fused'")
+    others = [e for e in evaluators if e.name not in FusedEvaluator.covers]
+    if len(others) == len(evaluators):
+        return others
+    return [FusedEvaluator()] + others
+
+
+def load_evaluators(config: dict) -> list[Evaluator]:
+    """Enabled evaluators from the `evaluators` config section, in config order."""
+    entries = config.get("evaluators") or DEFAULT_EVALUATORS
+    evaluators = [Evaluator.from_config(e) for e in entries if e.get("enabled", True)]
+    if not evaluators:
+        raise ValueError("At least one evaluator must be enabled")
+    return evaluators
+
+
+def evaluators_key(evaluators: list, mode="separate") -> str:
+    """Identity of an evaluator set; graphs are compiled once per key."""
+    return json.dumps([mode] + [e.key() for e in evaluators])
@@ -0,0 +1,217 @@
+"""
+Deterministic local stand-in for the chat-completions endpoint.
+
+Plug it in with `llm_client.configure_transport(FakeLLMBackend(...))` and every
+agent gets schema-valid structured output without network access or API credit.
+"""
+import ast
+import asyncio
+import hashlib
+import itertools
+import json
+import random
+import re
+import httpx
+
+# prompts render the hypothesis and translation dicts with repr(); pull the strings back out
+HYPO_PATTERN = re.compile(r"""'hypo': ('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")""")
+TRANSLATION_PATTERN = re.compile(r"""'translated_sentence': ('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")""")
+EMBEDDED_PATTERN = re.compile(r"Embedded Language \(secondary language\) is (\w+)")
+CANDIDATES_PATTERN = re.compile(r"producing (\d+) distinct candidate")
+VIETNAMESE_WORDS = ["nhà", "sách", "đẹp", "người", "bạn", "học", "trường", "nước", "được", "những", "chúng tôi", "hôm nay"]
+# provider prompt caching (OpenAI-style): prefixes of at least this many tokens, in blocks of CACHE_BLOCK
+DEFAULT_PROMPT_CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK = 128
+HAN_WORDS = ["学校", "朋友", "天气", "时间", "工作", "书", "很好", "我们", "城市", "问题", "公司", "电话"]
+
+
+def schema_example(schema, number=0, text=lambda name: f"[{name}]", name="", count=lambda name: 0):
+    """
+    Placeholder value matching a JSON schema; numbers get `number`, strings
+    `text(field name)` and arrays `count(field name)` items.
+    """
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            key: schema_example(value, number, text, key, count)
+            for key, value in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [schema_example(schema.get("items", {}), number, text, name, count) for _ in range(count(name))]
+    if kind in ("number", "integer"):
+        return number
+    if kind == "boolean":
+        return True
+    return text(name)
+
+
+def sample_latency(latency: dict, rng: random.Random) -> float:
+    """
+    Seconds for one call. `latency` is {"distribution": "constant", "value"},
+    {"distribution": "uniform", "low", "high"} or {"distribution": "lognormal", "median", "sigma"}.
+    """
+    distribution = latency.get("distribution", "lognormal")
+    if distribution == "constant":
+        return latency.get("value", 0.0)
+    if distribution == "uniform":
+        return rng.uniform(latency.get("low", 0.0), latency.get("high", 0.0))
+    if distribution == "lognormal":
+        return rng.lognormvariate(0, latency.get("sigma", 0.5)) * latency.get("median", 0.2)
+    raise ValueError(f"Unknown latency distribution {distribution!r}")
+
+
+class FakeLLMBackend(httpx.AsyncBaseTransport):
+    """
+    httpx transport answering POST /chat/completions like the OpenAI API would.
+
+    Responses follow the requested json_schema. Translations are the
+    hypothesis with its last `switch_fraction` of words replaced by
+    Vietnamese or Mandarin words (`invalid_fraction` of them are returned
+    unchanged, which the pre-validator rejects). A fraction `refine_fraction`
+    of translations gets evaluator scores from `low_scores`, the rest from
+    `high_scores`, so that share of items takes the refiner path. Everything
+    random is seeded from `seed` and the request content, so a run is
+    repeatable regardless of scheduling order. Like a provider prompt cache,
+    a leading system message seen before is reported as `cached_tokens` once
+    it reaches `prompt_cache_min_tokens`.
+
+    Attributes:
+        seed (int): Base seed.
+        latency (dict): Latency distribution (see sample_latency).
+        error_rate (float): Share of calls answered with HTTP 500 (retried by the client).
+        refine_fraction (float): Share of translations scored below the acceptance threshold.
+        switch_fraction (float): Share of hypothesis words replaced in a translation.
+        invalid_fraction (float): Share of translations returned without any switching.
+        prompt_cache_min_tokens (int): Shortest cacheable prefix, tokens.
+        low_scores (tuple): Score range for scenarios sent to the refiner.
+        high_scores (tuple): Score range for accepted scenarios.
+        calls (int): Requests served, errors included.
+        errors (int): Requests answered with an error.
+        cached_tokens (int): Prompt tokens reported as cache hits.
+    """
+    def __init__(
+        self, seed=0, latency=None, error_rate=0.0, refine_fraction=0.2,
+        low_scores=(3, 6), high_scores=(8, 10), switch_fraction=0.3, invalid_fraction=0.05,
+        prompt_cache_min_tokens=DEFAULT_PROMPT_CACHE_MIN_TOKENS,
+    ):
+        self.seed = seed
+        self.latency = latency or {"distribution": "lognormal", "median": 0.2, "sigma": 0.5}
+        self.error_rate = error_rate
+        self.refine_fraction = refine_fraction
+        self.low_scores = low_scores
+        self.high_scores = high_scores
+        self.switch_fraction = switch_fraction
+        self.invalid_fraction = invalid_fraction
+        self.prompt_cache_min_tokens = prompt_cache_min_tokens
+        self.calls = 0
+        self.errors = 0
+        self.cached_tokens = 0
+        self._attempts: dict[str, int] = {}
+        self._cached_prefixes: set[str] = set()
+
+    def _rng(self, *parts) -> random.Random:
+        digest = hashlib.sha1(json.dumps([self.seed, *parts]).encode("utf-8")).hexdigest()
+        return random.Random(int(digest[:16], 16))
+
+    def translate(self, hypothesis, language, rng) -> str:
+        """The hypothesis with its last `switch_fraction` of words swapped for embedded-language words."""
+        words = hypothesis.split()
+        if not words or rng.random() < self.invalid_fraction:
+            # no switching at all: caught by the pre-validator
+            return hypothesis
+        pool = HAN_WORDS if language in ("Mandarin", "Chinese", "Cantonese") else VIETNAMESE_WORDS
+        switched = max(1, round(len(words) * self.switch_fraction))
+        return " ".join(words[:-switched] + [rng.choice(pool) for _ in range(switched)])
+
+    def content(self, body) -> dict:
+        schema = body["response_format"]["json_schema"]
+        text = "\n".join(str(m.get("content", "")) for m in body["messages"])
+        digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        translation = TRANSLATION_PATTERN.search(text)
+        # evaluator calls for one translation share the scenario's score draw
+        scenario = (
+            hashlib.sha1(ast.literal_eval(translation.group(1)).encode("utf-8")).hexdigest()
+            if translation else digest
+        )
+        refine = self._rng("refine", scenario).random() < self.refine_fraction
+        low, high = self.low_scores if refine else self.high_scores
+        score = round(self._rng("score", scenario, schema["name"]).uniform(low, high), 1)
+
+        # candidate prompts ask for several translations; each gets its own draw
+        draws = itertools.count()
+        requested = CANDIDATES_PATTERN.search(text)
+
+        def text_for(name):
+            if name == "translated_sentence":
+                hypo = HYPO_PATTERN.search(text)
+                language = EMBEDDED_PATTERN.search(text)
+                return self.translate(
+                    ast.literal_eval(hypo.group(1)) if hypo else f"placeholder sentence {digest[:8]}",
+                    language.group(1) if language else "Vietnamese",
+                    self._rng("translate", digest, next(draws)),
+                )
+            return f"[{name}]"
+
+        def count_for(name):
+            return int(requested.group(1)) if name == "candidates" and requested else 0
+
+        return schema_example(schema["schema"], score, text_for, count=count_for)
+
+    def cached_prefix_tokens(self, messages) -> int:
+        """Prompt tokens served from the simulated cache: a repeated leading system message."""
+        if not messages or messages[0].get("role") != "system":
+            return 0
+        prefix = json.dumps(messages[0])
+        key = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+        tokens = len(prefix) // 4
+        if tokens < self.prompt_cache_min_tokens:
+            return 0
+        if key not in self._cached_prefixes:
+            self._cached_prefixes.add(key)
+            return 0
+        return tokens // CACHE_BLOCK * CACHE_BLOCK
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        key = hashlib.sha1(request.content).hexdigest()
+        attempt = self._attempts.get(key, 0)
+        self._attempts[key] = attempt + 1
+        self.calls += 1
+        rng = self._rng("call", key, attempt)
+        await asyncio.sleep(sample_latency(self.latency, rng))
+        if rng.random() < self.error_rate:
+            self.errors += 1
+            return httpx.Response(
+                500, json={"error": {"message": "fake backend error", "type": "server_error"}}
+            )
+        content = json.dumps(self.content(body), ensure_ascii=False)
+        prompt_tokens = len(json.dumps(body["messages"])) // 4
+        completion_tokens = len(content) // 4
+        cached_tokens = self.cached_prefix_tokens(body["messages"])
+        self.cached_tokens += cached_tokens
+        return httpx.Response(200, json={
+            "id": f"chatcmpl-fake-{key[:12]}-{attempt}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        })
+
+
+def from_config(fake_config: dict | None) -> FakeLLMBackend:
+    """Build the backend from a `fake_llm` config section."""
+    fake_config = dict(fake_config or {})
+    for key in ("low_scores", "high_scores"):
+        if key in fake_config:
+            fake_config[key] = tuple(fake_config[key])
+    return FakeLLMBackend(**fake_config)
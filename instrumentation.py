@@ -0,0 +1,218 @@
+import inspect
+import json
+import os
+import time
+from loguru import logger
+from llm_client import collect_usage
+from run_manifest import scenario_key, hypo_text
+
+DEFAULT_TRACE_PATH = "logs/trace.jsonl"
+DEFAULT_METRICS_PATH = "logs/metrics.prom"
+DEFAULT_SNAPSHOT_INTERVAL = 30.0
+# node wall-time histogram buckets, seconds
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Tracer:
+    """
+    Per-node and per-scenario measurements for every graph run.
+
+    Each node call becomes one "node" event (wall time, rate-limit queue wait,
+    LLM time, calls, HTTP retries, tokens incl. the static prompt prefix and
+    provider cache hits, cost estimate, status) and each
+    finished graph one "scenario" event (totals, refine_count, outcome). Events
+    go to a JSONL trace; running totals are exported as a Prometheus text
+    snapshot every `snapshot_interval` seconds and on close.
+
+    Attributes:
+        trace_path (str): JSONL trace file (appended).
+        metrics_path (str): Prometheus text file (replaced atomically).
+        snapshot_interval (float): Min seconds between metric snapshots.
+        prices (dict): {model: {"input": usd, "output": usd}} per 1M tokens.
+    """
+    def __init__(
+        self, trace_path=DEFAULT_TRACE_PATH, metrics_path=DEFAULT_METRICS_PATH,
+        snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL, prices=None,
+    ):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.snapshot_interval = snapshot_interval
+        self.prices = prices or {}
+        self._trace = None
+        self._last_snapshot = time.monotonic()
+        self._scenarios: dict[str, dict] = {}
+        # metric name -> {labels tuple: value}
+        self._counters: dict[str, dict] = {}
+        self._histogram: dict[str, list] = {}
+
+    def cost(self, usage) -> float:
+        total = 0.0
+        for call in usage:
+            price = self.prices.get(call.get("model")) or {}
+            total += call.get("input_tokens", 0) * price.get("input", 0.0) / 1e6
+            total += call.get("output_tokens", 0) * price.get("output", 0.0) / 1e6
+        return total
+
+    def _count(self, name, labels, value=1):
+        series = self._counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def _observe(self, node, seconds):
+        counts = self._histogram.setdefault(node, [0] * (len(BUCKETS) + 1) + [0.0])
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                counts[i] += 1
+        counts[len(BUCKETS)] += 1
+        counts[-1] += seconds
+
+    def _write(self, event):
+        if self._trace is None:
+            os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+            self._trace = open(self.trace_path, "a", encoding="utf-8")
+        self._trace.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+
+    def node(self, name, state, wall, usage, status, error=None):
+        key = scenario_key(state)
+        event = {
+            "type": "node",
+            "time": time.time(),
+            "scenario": key,
+            "node": name,
+            "wall": wall,
+            "queue_wait": sum(c.get("queue_wait", 0.0) for c in usage),
+            "llm_latency": sum(c.get("latency", 0.0) for c in usage),
+            "calls": len(usage),
+            "retries": sum(c.get("retries", 0) for c in usage),
+            "input_tokens": sum(c.get("input_tokens", 0) for c in usage),
+            "output_tokens": sum(c.get("output_tokens", 0) for c in usage),
+            "static_tokens": sum(c.get("static_tokens", 0) for c in usage),
+            "cached_tokens": sum(c.get("cached_tokens", 0) for c in usage),
+            "cost": self.cost(usage),
+            "status": status,
+        }
+        if error is not None:
+            event["error"] = error
+        self._write(event)
+
+        self._observe(name, wall)
+        self._count("node_calls_total", (("node", name), ("status", status)))
+        self._count("node_queue_wait_seconds_total", (("node", name),), event["queue_wait"])
+        self._count("llm_calls_total", (("node", name),), event["calls"])
+        self._count("llm_retries_total", (("node", name),), event["retries"])
+        self._count("llm_tokens_total", (("node", name), ("direction", "input")), event["input_tokens"])
+        self._count("llm_tokens_total", (("node", name), ("direction", "output")), event["output_tokens"])
+        self._count("llm_prompt_static_tokens_total", (("node", name),), event["static_tokens"])
+        self._count("llm_prompt_cached_tokens_total", (("node", name),), event["cached_tokens"])
+        self._count("llm_cost_usd_total", (("node", name),), event["cost"])
+
+        totals = self._scenarios.setdefault(key, {"nodes": 0, "calls": 0, "retries": 0, "input_tokens": 0,
+                                                  "output_tokens": 0, "cost": 0.0, "queue_wait": 0.0})
+        totals["nodes"] += 1
+        for field in ("calls", "retries", "input_tokens", "output_tokens", "cost", "queue_wait"):
+            totals[field] += event[field]
+
+    def scenario(self, state, wall, outcome, error=None):
+        """Record one finished (or failed) graph run; `state` is its final state when there is one."""
+        key = scenario_key(state)
+        totals = self._scenarios.pop(key, {})
+        refine_count = state.get("refine_count", 0) or 0
+        event = {
+            "type": "scenario",
+            "time": time.time(),
+            "scenario": key,
+            "hypothesis": hypo_text(state),
+            "wall": wall,
+            "outcome": outcome,
+            "score": state.get("score"),
+            "refine_count": refine_count,
+            **totals,
+        }
+        if error is not None:
+            event["error"] = error
+        self._write(event)
+        self._count("scenarios_total", (("outcome", outcome),))
+        self._count("scenario_seconds_total", (), wall)
+        self._count("refine_iterations_total", (), refine_count)
+        if time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def metrics_text(self) -> str:
+        """Prometheus text exposition of everything recorded so far."""
+        lines = [
+            "# HELP node_duration_seconds Wall time of one graph node call.",
+            "# TYPE node_duration_seconds histogram",
+        ]
+        for node, counts in sorted(self._histogram.items()):
+            for bound, count in zip(BUCKETS, counts):
+                lines.append(f'node_duration_seconds_bucket{{node="{node}",le="{bound}"}} {count}')
+            lines.append(f'node_duration_seconds_bucket{{node="{node}",le="+Inf"}} {counts[len(BUCKETS)]}')
+            lines.append(f'node_duration_seconds_sum{{node="{node}"}} {counts[-1]}')
+            lines.append(f'node_duration_seconds_count{{node="{node}"}} {counts[len(BUCKETS)]}')
+        for name, series in sorted(self._counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        self._last_snapshot = time.monotonic()
+        os.makedirs(os.path.dirname(self.metrics_path) or ".", exist_ok=True)
+        tmp_file = f"{self.metrics_path}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(self.metrics_text())
+        os.replace(tmp_file, self.metrics_path)
+        if self._trace is not None:
+            self._trace.flush()
+
+    def close(self):
+        self.snapshot()
+        if self._trace is not None:
+            self._trace.close()
+            self._trace = None
+        logger.info(f"📈 Trace written to {self.trace_path}, metrics to {self.metrics_path}")
+
+
+_tracer: Tracer | None = None
+
+
+def configure_tracing(tracing_config: dict | None) -> Tracer | None:
+    """Install the process-wide tracer from the `tracing` config section (off unless enabled)."""
+    global _tracer
+    tracing_config = tracing_config or {}
+    if not tracing_config.get("enabled", False):
+        _tracer = None
+        return None
+    _tracer = Tracer(
+        trace_path=tracing_config.get("trace_path", DEFAULT_TRACE_PATH),
+        metrics_path=tracing_config.get("metrics_path", DEFAULT_METRICS_PATH),
+        snapshot_interval=tracing_config.get("snapshot_interval", DEFAULT_SNAPSHOT_INTERVAL),
+        prices=tracing_config.get("prices"),
+    )
+    return _tracer
+
+
+def get_tracer() -> Tracer | None:
+    return _tracer
+
+
+def traced(name, node):
+    """Wrap a graph node (sync or async) so each call is recorded by the current tracer."""
+    async def wrapper(state):
+        tracer = get_tracer()
+        if tracer is None:
+            result = node(state)
+            return await result if inspect.isawaitable(result) else result
+        with collect_usage() as usage:
+            started = time.perf_counter()
+            try:
+                result = node(state)
+                if inspect.isawaitable(result):
+                    result = await result
+            except Exception as e:
+                tracer.node(name, state, time.perf_counter() - started, usage, "error", repr(e))
+                raise
+        tracer.node(name, state, time.perf_counter() - started, usage, "ok")
+        return result
+    wrapper.__name__ = name
+    return wrapper
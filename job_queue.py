@@ -0,0 +1,417 @@
+"""
+Durable job store with leases, for running one generation across several worker processes.
+
+    # 1. one job per (hypothesis, language, cs_ratio) in start..end, languages and ratios from pre_execute
+    python job_queue.py enqueue --config config/config_zh.yaml --start 0 --end 2000
+    python job_queue.py enqueue --start 0 --end 2000 --languages Mandarin Vietnamese --cs-ratios 70% 50%
+    # 2. start as many workers as the quota allows, on this or other machines sharing the store
+    python job_queue.py work --config config/config_zh.yaml
+    # 3. progress, then fold every worker's output into data_output without duplicates
+    python job_queue.py status
+    python job_queue.py merge --config config/config_zh.yaml
+
+Workers lease jobs in batches and renew their leases with a heartbeat while the
+graphs run; a job is done once its record is durably written. Leases of a
+crashed worker expire and the jobs are handed to whoever asks next, up to
+`max_attempts` leases per job. Each worker writes to its own directory under
+`workers_dir`, so concurrent workers never append to the same file. Like a
+sweep, every cs_ratio gets its own job and its own output files
+(data_output/{language}_{ratio}.*).
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from loguru import logger
+import agents
+from node_engine import output_sink, configure_output
+from run_manifest import scenario_key, hypo_text
+from record_store import RECORDS_SUFFIX, read_records
+from sweep import sweep_matrix, build_sweep, interleave, sweep_config
+from utils import load_config, generate_hypo_list
+
+DEFAULT_JOBS_PATH = "data_output/jobs.sqlite"
+DEFAULT_WORKERS_DIR = "data_output/workers"
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_HEARTBEAT_INTERVAL = 60.0
+DEFAULT_LEASE_BATCH = 32
+DEFAULT_POLL_INTERVAL = 5.0
+DEFAULT_MAX_ATTEMPTS = 3
+JOB_STATUSES = ("pending", "leased", "done", "failed")
+
+
+class JobQueue:
+    """
+    SQLite job table shared by every worker (WAL mode, so readers never block).
+
+    Attributes:
+        path (str): SQLite database file.
+        max_attempts (int): Leases per job before it is marked failed.
+    """
+    def __init__(self, path=DEFAULT_JOBS_PATH, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        # autocommit; leasing opens its own IMMEDIATE transaction
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                key TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                language TEXT,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_expires)")
+
+    def enqueue(self, states) -> int:
+        """Add one job per unseen scenario; returns how many were new."""
+        now = time.time()
+        rows = [
+            (scenario_key(s), json.dumps(dict(s), ensure_ascii=False), s.get("second_language"), now)
+            for s in states
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (key, state, language, status, updated) VALUES (?, ?, ?, 'pending', ?)",
+                rows,
+            )
+            return self._conn.total_changes - before
+
+    def lease(self, worker, limit, lease_seconds=DEFAULT_LEASE_SECONDS) -> list[dict]:
+        """Up to `limit` pending or expired jobs, leased to `worker` for `lease_seconds`."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # expired leases that used up their attempts are given up on
+                self._conn.execute(
+                    """UPDATE jobs SET status = 'failed', error = 'lease expired', updated = ?
+                       WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?""",
+                    (now, now, self.max_attempts),
+                )
+                rows = self._conn.execute(
+                    """SELECT key, state FROM jobs
+                       WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                       ORDER BY rowid LIMIT ?""",
+                    (now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    """UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?,
+                       attempts = attempts + 1, updated = ? WHERE key = ?""",
+                    [(worker, now + lease_seconds, now, key) for key, _ in rows],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [json.loads(state) for _, state in rows]
+
+    def heartbeat(self, worker, keys, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """Extend the leases `worker` still holds on `keys`."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                """UPDATE jobs SET lease_expires = ?, updated = ?
+                   WHERE key = ? AND worker = ? AND status = 'leased'""",
+                [(now + lease_seconds, now, key, worker) for key in keys],
+            )
+
+    def complete(self, keys):
+        """Mark jobs done, whoever holds them (a record exists either way)."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET status = 'done', error = NULL, updated = ? WHERE key = ? AND status != 'done'",
+                [(now, key) for key in keys],
+            )
+
+    def fail(self, worker, key, error):
+        """Give a failed job back (or mark it failed once it used up its attempts)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                   worker = NULL, lease_expires = NULL, error = ?, updated = ?
+                   WHERE key = ? AND worker = ? AND status = 'leased'""",
+                (self.max_attempts, error, now, key, worker),
+            )
+
+    def release(self, worker, unstarted=()) -> int:
+        """
+        Hand back every job `worker` still holds (clean shutdown). Jobs in
+        `unstarted` were leased but never run and get their attempt back; the
+        others keep it, so a job that never finishes still reaches max_attempts.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    """UPDATE jobs SET attempts = MAX(attempts - 1, 0)
+                       WHERE key = ? AND worker = ? AND status = 'leased'""",
+                    [(key, worker) for key in unstarted],
+                )
+                before = self._conn.total_changes
+                self._conn.execute(
+                    """UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                       error = CASE WHEN attempts >= ? THEN 'released after its last attempt' ELSE error END,
+                       worker = NULL, lease_expires = NULL, updated = ?
+                       WHERE worker = ? AND status = 'leased'""",
+                    (self.max_attempts, self.max_attempts, now, worker),
+                )
+                released = self._conn.total_changes - before
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return released
+
+    def others_active(self, worker) -> bool:
+        """Whether any job is pending, or leased by another worker (and may come back)."""
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT 1 FROM jobs WHERE status = 'pending'
+                   OR (status = 'leased' AND worker != ?) LIMIT 1""",
+                (worker,),
+            ).fetchone()
+        return row is not None
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: 0 for status in JOB_STATUSES} | dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LeasedJobs:
+    """
+    Async iterator over jobs leased from a JobQueue, for agents.run_scenarios.
+
+    Leases `lease_batch` jobs whenever its buffer runs dry and keeps every job
+    it handed out alive with a heartbeat until the record is written (`done`)
+    or the graph failed (`failed`). Ends once nothing is pending and no other
+    worker holds a lease that could still expire back into the queue.
+
+    Attributes:
+        queue (JobQueue): The shared job store.
+        worker (str): This worker's id.
+        lease_batch (int): Jobs leased per round trip.
+        lease_seconds (float): Lease length; renewed every heartbeat_interval.
+        poll_interval (float): Seconds between lease attempts while others hold all the work.
+    """
+    def __init__(
+        self, queue, worker, lease_batch=DEFAULT_LEASE_BATCH, lease_seconds=DEFAULT_LEASE_SECONDS,
+        heartbeat_interval=DEFAULT_HEARTBEAT_INTERVAL, poll_interval=DEFAULT_POLL_INTERVAL,
+    ):
+        self.queue = queue
+        self.worker = worker
+        self.lease_batch = lease_batch
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.poll_interval = poll_interval
+        self.active: set[str] = set()
+        self._buffer: list[dict] = []
+        self._heartbeat: asyncio.Task | None = None
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._heartbeat is None:
+            self._heartbeat = asyncio.create_task(self._beat())
+        while not self._buffer:
+            self._buffer = await asyncio.to_thread(
+                self.queue.lease, self.worker, self.lease_batch, self.lease_seconds
+            )
+            if self._buffer:
+                break
+            if not await asyncio.to_thread(self.queue.others_active, self.worker):
+                raise StopAsyncIteration
+            await asyncio.sleep(self.poll_interval)
+        state = self._buffer.pop(0)
+        self.active.add(scenario_key(state))
+        return state
+
+    async def _beat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            keys = list(self.active) + [scenario_key(s) for s in self._buffer]
+            if keys:
+                await asyncio.to_thread(self.queue.heartbeat, self.worker, keys, self.lease_seconds)
+
+    def done(self, batch):
+        """OutputSink.on_written callback: the records are durable, the jobs are done."""
+        keys = [scenario_key(state) for state in batch]
+        self.queue.complete(keys)
+        self.active.difference_update(keys)
+
+    def finished(self, state, error):
+        """run_scenarios on_finished callback; successful jobs stay active until written."""
+        if error is not None:
+            key = scenario_key(state)
+            self.queue.fail(self.worker, key, repr(error))
+            self.active.discard(key)
+
+    async def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        # only the jobs still buffered were never run
+        released = self.queue.release(self.worker, [scenario_key(s) for s in self._buffer])
+        self._buffer = []
+        if released:
+            logger.info(f"🔓 Released {released} unfinished jobs")
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def open_queue(config) -> JobQueue:
+    queue_config = config.get("job_queue") or {}
+    return JobQueue(
+        queue_config.get("path", DEFAULT_JOBS_PATH),
+        max_attempts=queue_config.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+    )
+
+
+def worker_config(config, worker_dir) -> dict:
+    """
+    Run config for one worker: its resume state lives in its own directory and,
+    as jobs are per cs_ratio, its outputs are partitioned by ratio.
+    """
+    resume_config = config.get("resume") or {}
+    return {
+        **sweep_config(config),
+        "resume": {**resume_config, "path": os.path.join(worker_dir, "run_state.sqlite")},
+    }
+
+
+async def run_worker(config, worker=None) -> dict:
+    """Lease and run jobs until the queue is drained; returns the job counts."""
+    queue_config = config.get("job_queue") or {}
+    worker = worker or default_worker_id()
+    worker_dir = os.path.join(queue_config.get("workers_dir", DEFAULT_WORKERS_DIR), worker)
+    queue = open_queue(config)
+    jobs = LeasedJobs(
+        queue,
+        worker,
+        lease_batch=queue_config.get("lease_batch", DEFAULT_LEASE_BATCH),
+        lease_seconds=queue_config.get("lease_seconds", DEFAULT_LEASE_SECONDS),
+        heartbeat_interval=queue_config.get("heartbeat_interval", DEFAULT_HEARTBEAT_INTERVAL),
+        poll_interval=queue_config.get("poll_interval", DEFAULT_POLL_INTERVAL),
+    )
+    logger.info(f"👷 Worker {worker} writing to {worker_dir}")
+    output_dir = output_sink.output_dir
+    output_sink.output_dir = worker_dir
+    output_sink.on_written.append(jobs.done)
+    try:
+        await agents.run_scenarios(worker_config(config, worker_dir), jobs, on_finished=jobs.finished)
+    finally:
+        if jobs.done in output_sink.on_written:
+            output_sink.on_written.remove(jobs.done)
+        output_sink.output_dir = output_dir
+        await jobs.close()
+        counts = queue.counts()
+        queue.close()
+    logger.info(f"📒 Jobs: {counts}")
+    return counts
+
+
+async def merge_outputs(config) -> int:
+    """
+    Append worker records not yet in data_output (by scenario_key) through the
+    output sink, so the record, dataset and TSV files are updated as for a normal run.
+    """
+    queue_config = config.get("job_queue") or {}
+    workers_dir = queue_config.get("workers_dir", DEFAULT_WORKERS_DIR)
+    configure_output(sweep_config(config).get("output"))
+    seen = {}
+    merged = 0
+    worker_files = [
+        path for suffix in (".jsonl", RECORDS_SUFFIX)
+        for path in glob.glob(os.path.join(workers_dir, "*", f"*{suffix}"))
+    ]
+    for records_file in sorted(worker_files):
+        partition = os.path.splitext(os.path.basename(records_file))[0]
+        if partition not in seen:
+            seen[partition] = {scenario_key(obj) for obj in read_records(output_sink.records_path(partition))}
+        for record in read_records(records_file):
+            key = scenario_key(record)
+            if key in seen[partition] or not hypo_text(record):
+                continue
+            seen[partition].add(key)
+            await output_sink.submit(record)
+            merged += 1
+    await output_sink.close()
+    return merged
+
+
+def job_scenarios(config, start, end, languages=None, cs_ratios=None) -> list:
+    """One scenario per hypothesis in start..end x language x cs_ratio (default: the `pre_execute` ones)."""
+    pre_execute = config["pre_execute"]
+    slices = sweep_matrix(
+        config, languages or [pre_execute["second_language"]], cs_ratios or pre_execute["cs_ratio"], [[start, end]]
+    )
+    return interleave(build_sweep(slices, generate_hypo_list()))
+
+
+def enqueue(config, start, end, languages=None, cs_ratios=None) -> int:
+    config = sweep_config(config)
+    configure_output(config.get("output"))
+    scenarios = output_sink.pending(job_scenarios(config, start, end, languages, cs_ratios))
+    queue = open_queue(config)
+    try:
+        return queue.enqueue(scenarios)
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue_parser = commands.add_parser("enqueue", help="add jobs for a hypothesis range")
+    enqueue_parser.add_argument("--config", default=agents.CONFIG_PATH)
+    enqueue_parser.add_argument("--start", type=int, default=agents.start)
+    enqueue_parser.add_argument("--end", type=int, default=agents.end)
+    enqueue_parser.add_argument("--languages", nargs="+", help="second languages (default: pre_execute)")
+    enqueue_parser.add_argument("--cs-ratios", nargs="+", help='ratios, e.g. 70%% 50%% (default: pre_execute)')
+    work_parser = commands.add_parser("work", help="lease and run jobs until none are left")
+    work_parser.add_argument("--config", default=agents.CONFIG_PATH)
+    work_parser.add_argument("--worker-id", help="default: hostname-pid")
+    status_parser = commands.add_parser("status", help="job counts by status")
+    status_parser.add_argument("--config", default=agents.CONFIG_PATH)
+    merge_parser = commands.add_parser("merge", help="merge worker outputs into data_output")
+    merge_parser.add_argument("--config", default=agents.CONFIG_PATH)
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    if args.command == "enqueue":
+        print(f"Enqueued {enqueue(config, args.start, args.end, args.languages, args.cs_ratios)} new jobs")
+    elif args.command == "work":
+        print(asyncio.run(run_worker(config, args.worker_id)))
+    elif args.command == "status":
+        queue = open_queue(config)
+        print(queue.counts())
+        queue.close()
+    elif args.command == "merge":
+        print(f"Merged {asyncio.run(merge_outputs(config))} records into {output_sink.output_dir}")
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import get_type_hints
+from loguru import logger
+
+CACHE_MODES = ("off", "record", "replay")
+DEFAULT_CACHE_PATH = "cache/llm_cache.sqlite"
+# how many writes between eviction passes
+EVICT_EVERY = 500
+
+
+class LLMCacheMiss(KeyError):
+    """Raised in replay mode when a call has no cached response."""
+
+
+def schema_fingerprint(schema) -> str:
+    """Name plus field types, so editing a response TypedDict invalidates its entries."""
+    try:
+        fields = {k: repr(v) for k, v in get_type_hints(schema).items()}
+    except TypeError:
+        fields = {}
+    return json.dumps({"name": schema.__name__, "fields": fields}, sort_keys=True)
+
+
+def cache_key(messages, model, temperature, schema) -> str:
+    if hasattr(messages, "to_messages"):
+        messages = messages.to_messages()
+    payload = {
+        "messages": [[m.type, m.content] for m in messages],
+        "model": model,
+        "temperature": temperature,
+        "schema": schema_fingerprint(schema),
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Content-addressed SQLite store of structured LLM responses.
+
+    Modes:
+        record: serve hits, write every miss through after the network call.
+        replay: read-only; a miss raises LLMCacheMiss instead of calling out.
+
+    Attributes:
+        path (str): SQLite database file.
+        mode (str): One of CACHE_MODES.
+        max_entries (int | None): Keep at most this many rows (least recently used go first).
+        max_bytes (int | None): Keep the stored responses under this many bytes.
+        max_age (float | None): Drop entries not used for this many seconds.
+        hits, misses, writes, evictions (int): Counters since the cache was opened.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, mode="record", max_entries=None, max_bytes=None, max_age=None):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown llm_cache mode {mode!r}, expected one of {CACHE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                agent TEXT,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        self._conn.commit()
+        if mode == "record":
+            self.evict()
+
+    def _get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.mode == "record":
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+                self._conn.commit()
+        return json.loads(row[0])
+
+    def _put(self, key, agent, response):
+        raw = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, agent, raw, len(raw.encode("utf-8")), now, now),
+            )
+            self._conn.commit()
+        self.writes += 1
+        if self.writes % EVICT_EVERY == 0:
+            self.evict()
+
+    async def get(self, key):
+        if self.mode == "off":
+            return None
+        response = await asyncio.to_thread(self._get, key)
+        if response is None:
+            self.misses += 1
+            if self.mode == "replay":
+                raise LLMCacheMiss(f"no cached response for key {key} (replay mode)")
+        else:
+            self.hits += 1
+        return response
+
+    async def put(self, key, agent, response):
+        if self.mode != "record":
+            return
+        await asyncio.to_thread(self._put, key, agent, response)
+
+    def evict(self):
+        """Apply age, entry-count and size limits, least recently used first."""
+        removed = 0
+        with self._lock:
+            if self.max_age:
+                removed += self._conn.execute(
+                    "DELETE FROM responses WHERE last_access < ?", (time.time() - self.max_age,)
+                ).rowcount
+            if self.max_entries:
+                removed += self._conn.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )""",
+                    (self.max_entries,),
+                ).rowcount
+            if self.max_bytes:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_bytes:
+                    rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall()
+                    stale = []
+                    for key, size in rows:
+                        if total <= self.max_bytes:
+                            break
+                        stale.append((key,))
+                        total -= size
+                    self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                    removed += len(stale)
+            self._conn.commit()
+        self.evictions += removed
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_llm_cache: LLMCache | None = None
+
+
+def configure_llm_cache(cache_config: dict | None) -> LLMCache | None:
+    """Open the process-wide cache from the `llm_cache` config section."""
+    global _llm_cache
+    cache_config = cache_config or {}
+    if _llm_cache is not None:
+        _llm_cache.close()
+        _llm_cache = None
+    # YAML reads a bare `off` as False
+    mode = cache_config.get("mode") or "off"
+    if mode == "off":
+        return None
+    max_age_days = cache_config.get("max_age_days")
+    max_size_mb = cache_config.get("max_size_mb")
+    _llm_cache = LLMCache(
+        path=cache_config.get("path", DEFAULT_CACHE_PATH),
+        mode=mode,
+        max_entries=cache_config.get("max_entries"),
+        max_bytes=int(max_size_mb * 1024 * 1024) if max_size_mb else None,
+        max_age=max_age_days * 86400 if max_age_days else None,
+    )
+    logger.info(f"🗄️ LLM cache '{_llm_cache.path}' opened in {mode} mode")
+    return _llm_cache
+
+
+def get_llm_cache() -> LLMCache | None:
+    return _llm_cache
@@ -0,0 +1,182 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import dotenv
+import httpx
+from langchain_openai import ChatOpenAI
+from scheduler import PRIORITY_IN_FLIGHT, get_rate_limiter, completion_tokens_estimate
+from token_counter import count_message_tokens, prompt_prefix_tokens
+from llm_cache import get_llm_cache, cache_key
+from resilience import get_policy
+from prompt import resolve_prompt
+
+
+dotenv.load_dotenv()
+
+API_KEY = os.getenv("API_KEY")
+MODEL = os.getenv("MODEL")
+TEMPERATURE = 1
+
+# one keep-alive pool for the whole process, sized for hundreds of in-flight calls
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 256))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 128))
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+
+_http_async_client: httpx.AsyncClient | None = None
+# optional httpx transport every call goes through (e.g. fake_llm.FakeLLMBackend)
+_transport: httpx.AsyncBaseTransport | None = None
+_agents: dict[tuple, "StructuredAgent"] = {}
+# per-task lists that network calls append their token usage to (see collect_usage);
+# nested blocks each get every record
+_usage_collectors: ContextVar[tuple] = ContextVar("usage_collectors", default=())
+# HTTP status of every attempt of the current call, filled by the client's response hook
+_http_attempts: ContextVar[list | None] = ContextVar("http_attempts", default=None)
+
+
+@contextmanager
+def collect_usage():
+    """
+    Collect token usage of every LLM call made inside the block (including
+    tasks it spawns). Yields a list of {"agent", "model", "latency", "queue_wait", "retries", "input_tokens",
+    "output_tokens", "static_tokens", "cached_tokens", ...}; `static_tokens` is the prompt's cacheable
+    prefix (see token_counter.static_prefix), `cached_tokens` what the provider reported as served from its cache.
+    """
+    usage = []
+    token = _usage_collectors.set(_usage_collectors.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _usage_collectors.reset(token)
+
+
+async def _record_attempt(response: httpx.Response):
+    attempts = _http_attempts.get()
+    if attempts is not None:
+        attempts.append(response.status_code)
+
+
+def configure_transport(transport: httpx.AsyncBaseTransport | None):
+    """Send every LLM call through `transport` (None restores the network); call before agents are built."""
+    global _transport
+    _transport = transport
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """Return the process-wide async httpx client, creating it on first use."""
+    global _http_async_client
+    if _http_async_client is None or _http_async_client.is_closed:
+        _http_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            transport=_transport,
+            event_hooks={"response": [_record_attempt]},
+        )
+    return _http_async_client
+
+
+class StructuredAgent:
+    """
+    A prompt plus a structured-output chat model, built once and reused.
+
+    Attributes:
+        name (str): Agent name, used for logging.
+        prompt: The ChatPromptTemplate rendered from the running state.
+        schema: The TypedDict the model response is parsed into.
+        llm: The structured-output ChatOpenAI runnable.
+        priority (int): Rate-limiter priority of this agent's calls (see scheduler).
+    """
+    def __init__(
+        self, name, prompt, schema, model=MODEL, temperature=TEMPERATURE,
+        priority=PRIORITY_IN_FLIGHT,
+    ):
+        self.name = name
+        self.priority = priority
+        self.prompt = prompt
+        self.schema = schema
+        self.model = model
+        self.temperature = temperature
+        # with a call policy installed, its retries replace the SDK's own
+        retries = {"max_retries": 0} if get_policy() is not None else {}
+        self.llm = ChatOpenAI(
+            model=model,
+            temperature=temperature,
+            api_key=API_KEY,
+            http_async_client=get_http_async_client(),
+            **retries,
+        ).with_structured_output(schema, include_raw=True)
+
+    async def ainvoke(self, state):
+        messages = self.prompt.invoke(state)
+        llm_cache = get_llm_cache()
+        if llm_cache is not None:
+            key = cache_key(messages, self.model, self.temperature, self.schema)
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                return cached
+        queued = time.perf_counter()
+        rate_limiter = get_rate_limiter()
+        if rate_limiter is not None:
+            tokens = count_message_tokens(messages, self.model) + completion_tokens_estimate()
+            await rate_limiter.acquire(tokens, self.priority)
+        attempts = []
+        attempts_token = _http_attempts.set(attempts)
+        started = time.perf_counter()
+        policy = get_policy()
+        try:
+            if policy is None:
+                result = await self.llm.ainvoke(messages)
+            else:
+                result = await policy.call(self.name, lambda: self.llm.ainvoke(messages))
+        finally:
+            _http_attempts.reset(attempts_token)
+        latency = time.perf_counter() - started
+        if result["parsing_error"] is not None:
+            raise result["parsing_error"]
+        response = result["parsed"]
+        collectors = _usage_collectors.get()
+        if collectors:
+            usage = getattr(result["raw"], "usage_metadata", None) or {}
+            record = {
+                "agent": self.name,
+                "model": self.model,
+                "latency": latency,
+                "queue_wait": started - queued,
+                "retries": max(0, len(attempts) - 1),
+                "static_tokens": prompt_prefix_tokens(self.prompt, self.model),
+                "cached_tokens": (usage.get("input_token_details") or {}).get("cache_read", 0),
+                **usage,
+            }
+            for collector in collectors:
+                collector.append(record)
+        if llm_cache is not None and response is not None:
+            await llm_cache.put(key, self.name, response)
+        return response
+
+
+def get_agent(
+    name, prompt, schema, model=MODEL, temperature=TEMPERATURE, priority=PRIORITY_IN_FLIGHT,
+) -> StructuredAgent:
+    """Return the shared agent for this prompt/schema/model, building it only once."""
+    # the configured prompt variant (see prompt.configure_prompts)
+    prompt = resolve_prompt(prompt)
+    key = (name, id(prompt), schema.__name__, model, temperature, priority)
+    agent = _agents.get(key)
+    if agent is None:
+        agent = StructuredAgent(
+            name, prompt, schema, model=model, temperature=temperature, priority=priority
+        )
+        _agents[key] = agent
+    return agent
+
+
+async def aclose_clients():
+    """Close the shared connection pool; call once when the event loop is done."""
+    global _http_async_client
+    if _http_async_client is not None and not _http_async_client.is_closed:
+        await _http_async_client.aclose()
+    _http_async_client = None
+    _agents.clear()
@@ -1,10 +1,10 @@
 import os
-import dotenv
 import random
 import jsonlines
-from langchain_openai import ChatOpenAI
 from prompt import (
     DATA_TRANSLATION_PROMPT,
+    BATCH_TRANSLATION_PROMPT,
+    CANDIDATE_TRANSLATION_PROMPT,
     FLUENCY_PROMPT,
     ACCURACY_PROMPT,
     NATURALNESS_PROMPT,
@@ -15,6 +15,8 @@ from prompt import (
 from node_models import (
     AgentRunningState,
     TranslationResponse,
+    BatchTranslationResponse,
+    CandidateTranslationResponse,
     AccuracyResponse,
     FluencyResponse,
     NaturalnessResponse,
@@ -22,28 +24,122 @@ from node_models import (
     #SocialCulturalResponse,
 )
 from read_xnli_dataset import XNLIDataLoader
+from llm_client import get_agent
+from scheduler import PRIORITY_NEW, PRIORITY_REFINE
 from utils import weighting_scheme,save_jsonl_to_tsv, get_premise_label
+from output_sink import OutputSink, RECORD_FORMATS
+from batching import MicroBatcher, DEFAULT_MAX_WAIT, get_batcher, set_batcher, index_results
+from evaluators import FusedEvaluator, evaluate_batch, invalidate_results
+from run_manifest import hypo_text
+from prevalidator import prevalidate, prevalidation_enabled
 from copy import deepcopy
+import asyncio
 
 from typing import Dict, Any
 
 
-dotenv.load_dotenv()
-
-API_KEY = os.getenv("API_KEY")
-MODEL = os.getenv("MODEL")
 OUTPUT_DIR = "data_output"
-TEMPERATURE=1
+# translations requested per scenario in best-of-k mode (1 = single translation)
+_candidate_count = 1
 
 ##add in function for translating the xnli dataset
 
 loader = XNLIDataLoader(lang='en', test_path='xnli.test.tsv')
+output_sink = OutputSink(OUTPUT_DIR, loader)
+
+
+def configure_output(output_config: dict | None):
+    """Apply the `output` config section to the shared output sink."""
+    output_config = output_config or {}
+    output_sink.tsv_mode = output_config.get("tsv_mode", output_sink.tsv_mode)
+    output_sink.flush_interval = output_config.get("flush_interval", output_sink.flush_interval)
+    output_sink.batch_size = output_config.get("batch_size", output_sink.batch_size)
+    output_sink.fsync = output_config.get("fsync", output_sink.fsync)
+    output_sink.partition_by_ratio = output_config.get("partition_by_ratio", output_sink.partition_by_ratio)
+    output_sink.record_format = output_config.get("format", output_sink.record_format)
+    if output_sink.record_format not in RECORD_FORMATS:
+        raise ValueError(f"Unknown output format {output_sink.record_format!r}, expected one of {RECORD_FORMATS}")
+    output_sink.compression_level = output_config.get("compression_level", output_sink.compression_level)
+    return output_sink
+
+def configure_batching(batching_config: dict | None):
+    """
+    Install micro-batchers from the `batching` config section. A batch size of
+    1 (the default) keeps the one-call-per-scenario behaviour.
+    """
+    batching_config = batching_config or {}
+    max_wait = batching_config.get("max_wait", DEFAULT_MAX_WAIT)
+    translation_size = batching_config.get("translation_batch_size", 1)
+    evaluation_size = batching_config.get("evaluation_batch_size", 1)
+    set_batcher("translation", MicroBatcher(
+        "translation",
+        translate_batch,
+        translate_single,
+        translation_size,
+        group_key=lambda state: (state.get("first_language"), state.get("second_language")),
+        max_wait=max_wait,
+    ) if translation_size > 1 else None)
+    set_batcher("evaluation", MicroBatcher(
+        "evaluation",
+        evaluate_batch,
+        FusedEvaluator().evaluate,
+        evaluation_size,
+        max_wait=max_wait,
+    ) if evaluation_size > 1 else None)
+
+
+def configure_candidates(candidates_config: dict | None) -> int:
+    """Apply the `candidates` config section; returns k."""
+    global _candidate_count
+    k = int((candidates_config or {}).get("k", 1))
+    if k < 1:
+        raise ValueError(f"candidates.k must be at least 1, got {k}")
+    _candidate_count = k
+    return k
+
 
-def RunDataTranslationAgent(state: AgentRunningState):
-    DataTranslationAgent = DATA_TRANSLATION_PROMPT | ChatOpenAI(
-        model=MODEL, temperature=TEMPERATURE, api_key=API_KEY
-    ).with_structured_output(TranslationResponse)
-    response = DataTranslationAgent.invoke(state)
+def get_candidate_count() -> int:
+    return _candidate_count
+
+
+async def translate_single(state):
+    DataTranslationAgent = get_agent(
+        "DataTranslationAgent", DATA_TRANSLATION_PROMPT, TranslationResponse,
+        priority=PRIORITY_NEW,
+    )
+    return await DataTranslationAgent.ainvoke(state)
+
+
+async def translate_batch(states):
+    """One BATCH_TRANSLATION_PROMPT call for several hypotheses; None for items that failed validation."""
+    hypotheses = "\n".join(f"{i}. {hypo_text(state)}" for i, state in enumerate(states, start=1))
+    BatchTranslationAgent = get_agent(
+        "BatchTranslationAgent", BATCH_TRANSLATION_PROMPT, BatchTranslationResponse,
+        priority=PRIORITY_NEW,
+    )
+    response = await BatchTranslationAgent.ainvoke({
+        "first_language": states[0].get("first_language"),
+        "second_language": states[0].get("second_language"),
+        "hypotheses": hypotheses,
+    })
+    results = index_results(
+        response.get("translations"),
+        len(states),
+        lambda item: isinstance(item.get("translated_sentence"), str)
+        and item["translated_sentence"].strip() != "",
+    )
+    return [
+        {"translated_sentence": item["translated_sentence"]} if item else None
+        for item in results
+    ]
+
+
+async def RunDataTranslationAgent(state: AgentRunningState):
+    batcher = get_batcher("translation")
+    if batcher is not None:
+        response = await batcher.submit(state)
+    else:
+        response = await translate_single(state)
     # retry = 4
     # if not response.get():
     #     while retry > 0:
@@ -55,52 +151,129 @@ def RunDataTranslationAgent(state: AgentRunningState):
     state["data_translation_result"] = response
     return {"data_translation_result": response}
 
-def RunAccuracyAgent(state: AgentRunningState):
-    AccuracyAgent = ACCURACY_PROMPT | ChatOpenAI(
-        model=MODEL, temperature=TEMPERATURE, api_key=API_KEY
-    ).with_structured_output(AccuracyResponse)
-    response = AccuracyAgent.invoke(state)
+async def generate_candidates(state, k) -> list[str]:
+    """k translations from one CANDIDATE_TRANSLATION_PROMPT call, blank and repeated ones dropped."""
+    CandidateAgent = get_agent(
+        "CandidateTranslationAgent", CANDIDATE_TRANSLATION_PROMPT, CandidateTranslationResponse,
+        priority=PRIORITY_NEW,
+    )
+    response = await CandidateAgent.ainvoke({**state, "k": k})
+    texts = []
+    for item in response.get("candidates") or []:
+        text = item.get("translated_sentence") if isinstance(item, dict) else None
+        if isinstance(text, str) and text.strip() and text.strip() not in texts:
+            texts.append(text.strip())
+    return texts[:k]
+
+
+async def score_candidate(candidate, nodes):
+    """Fill in every evaluator result of a candidate state, nodes running concurrently."""
+    updates = await asyncio.gather(*(node(candidate) for node in nodes))
+    for update in updates:
+        for key, value in update.items():
+            if key == "evaluated_inputs":
+                candidate[key] = {**(candidate.get(key) or {}), **value}
+            else:
+                candidate[key] = value
+    return candidate
+
+
+async def RunCandidateAgent(state: AgentRunningState, evaluators=None, nodes=None):
+    """
+    Best-of-k translation: k candidates from one call, scored concurrently by
+    all evaluator nodes, the highest weighting_scheme score goes forward.
+    Candidates failing pre-validation are only scored when none passes.
+    """
+    texts = await generate_candidates(state, _candidate_count)
+    if not texts:
+        # nothing usable came back: fall back to the single-translation prompt
+        texts = [(await translate_single(state))["translated_sentence"]]
+    candidates = [{**state, "data_translation_result": {"translated_sentence": text}} for text in texts]
+    if prevalidation_enabled():
+        for candidate in candidates:
+            candidate.update(prevalidate(candidate))
+        candidates = [c for c in candidates if c["prevalidation"]["passed"]] or candidates
+    scored = await asyncio.gather(*(score_candidate(candidate, nodes) for candidate in candidates))
+    scores = [weighting_scheme(candidate, evaluators) for candidate in scored]
+    best = max(range(len(scored)), key=lambda i: (scores[i], -i))
+    print(f"best of {len(scored)} candidates: {scores[best]:.2f} (scores {[round(x, 2) for x in scores]})")
+    update = {
+        key: scored[best][key]
+        for key in ["data_translation_result", "evaluated_inputs", "prevalidation", "cs_ratio_result"]
+        + [e.result_key for e in evaluators]
+        if key in scored[best]
+    }
+    update["candidates"] = [
+        {
+            "translated_sentence": candidate["data_translation_result"]["translated_sentence"],
+            "score": score,
+            "prevalidation_passed": (candidate.get("prevalidation") or {}).get("passed", True),
+        }
+        for candidate, score in zip(scored, scores)
+    ]
+    return update
+
+
+async def RunAccuracyAgent(state: AgentRunningState):
+    AccuracyAgent = get_agent("AccuracyAgent", ACCURACY_PROMPT, AccuracyResponse)
+    response = await AccuracyAgent.ainvoke(state)
     print(response)
     return {"accuracy_result": response}
 
 
-def RunFluencyAgent(state: AgentRunningState):
-    FluencyAgent = FLUENCY_PROMPT | ChatOpenAI(
-        model=MODEL, temperature=TEMPERATURE, api_key=API_KEY
-    ).with_structured_output(FluencyResponse)
-    response = FluencyAgent.invoke(state)
+async def RunFluencyAgent(state: AgentRunningState):
+    FluencyAgent = get_agent("FluencyAgent", FLUENCY_PROMPT, FluencyResponse)
+    response = await FluencyAgent.ainvoke(state)
     print(response)
     return {"fluency_result": response}
 
 
-def RunNaturalnessAgent(state: AgentRunningState):
-    NaturalnessAgent = NATURALNESS_PROMPT | ChatOpenAI(
-        model=MODEL, temperature=TEMPERATURE, api_key=API_KEY
-    ).with_structured_output(NaturalnessResponse)
-    response = NaturalnessAgent.invoke(state)
+async def RunNaturalnessAgent(state: AgentRunningState):
+    NaturalnessAgent = get_agent(
+        "NaturalnessAgent", NATURALNESS_PROMPT, NaturalnessResponse
+    )
+    response = await NaturalnessAgent.ainvoke(state)
     print(response)
     return {"naturalness_result": response}
 
 
-# def RunCSRatioAgent(state: AgentRunningState):
-#     CSRatioAgent = CS_RATIO_PROMPT | ChatOpenAI(
-#         model=MODEL, temperature=TEMPERATURE, api_key=API_KEY
-#     ).with_structured_output(CSRatioResponse)
-#     response = CSRatioAgent.invoke(state)
+# async def RunCSRatioAgent(state: AgentRunningState):
+#     CSRatioAgent = get_agent("CSRatioAgent", CS_RATIO_PROMPT, CSRatioResponse)
+#     response = await CSRatioAgent.ainvoke(state)
 #     print(response)
 #     return {"cs_ratio_result": response}
 
 
-#def RunSocialCulturalAgent(state: AgentRunningState):
-    SocialCulturalAgent = SOCIAL_CULTURAL_PROMPT | ChatOpenAI(
-        model=MODEL, temperature=TEMPERATURE, api_key=API_KEY
-    ).with_structured_output(SocialCulturalResponse)
-    response = SocialCulturalAgent.invoke(state)
-    print(response)
-    return {"social_cultural_result": response}
+# async def RunSocialCulturalAgent(state: AgentRunningState):
+#     SocialCulturalAgent = get_agent(
+#         "SocialCulturalAgent", SOCIAL_CULTURAL_PROMPT, SocialCulturalResponse
+#     )
+#     response = await SocialCulturalAgent.ainvoke(state)
+#     print(response)
+#     return {"social_cultural_result": response}
+
+
+def RunPreValidator(state: AgentRunningState):
+    # local checks (empty / unchanged output, CS ratio, word count) before any evaluator call;
+    # also fills cs_ratio_result, so the CS ratio needs no LLM call
+    result = prevalidate(state)
+    if not result["prevalidation"]["passed"]:
+        print(f"pre-validation failed: {result['prevalidation']['failures']}")
+    return result
 
 
-def SummarizeResult(state: AgentRunningState):
+def SummarizeResult(state: AgentRunningState, evaluators=None):
+    if evaluators:
+        results = "\n".join(
+            f"    {e.name.replace('_', ' ').title()} Result: {state[e.result_key]}"
+            for e in evaluators
+        )
+        summary = f"""
+    data_translation_result: {state["data_translation_result"]}
+{results}
+    """
+        return {"score": weighting_scheme(state, evaluators), "summary": summary}
+
     summary = f"""
     data_translation_result: {state["data_translation_result"]}
     Accuracy Result: {state["accuracy_result"]}
@@ -114,41 +287,26 @@ def SummarizeResult(state: AgentRunningState):
 
     return {"score": weighting_scheme(state), "summary": summary}
 
-def AcceptanceAgent(state: AgentRunningState):
-    language = state["second_language"]
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    jsonl_file = f"{OUTPUT_DIR}/{language}.jsonl"
-    json_dataset_file = f"{OUTPUT_DIR}/{language}_dataset.json"
-    tsv_file = f"{OUTPUT_DIR}/cs_{language}_test.tsv"
-
-    # Extract hypothesis text (STRING)
-    hypo_text = state.get("hypothesis", {}).get("hypo", "")
-    translated_sentence = state["data_translation_result"]["translated_sentence"]
+async def AcceptanceAgent(state: AgentRunningState):
+    # the sink's writer task owns data_output/{language}.jsonl, _dataset.json and the TSV
+    await output_sink.submit(state)
 
-    if os.path.exists(json_dataset_file):
-        with jsonlines.open(json_dataset_file, "r") as f:
-            existing_translations = list(f)
-    with jsonlines.open(jsonl_file, "a") as f:
-        f.write(state)
 
-    with jsonlines.open(json_dataset_file, "a") as f:
-        f.write(translated_sentence)
 
-    # ---------- Regenerate TSV ----------
-    save_jsonl_to_tsv(jsonl_file, tsv_file, loader)
+async def RunRefinerAgent(state: AgentRunningState, evaluators=None):
 
-
-
-def RunRefinerAgent(state: AgentRunningState):
-
-    RefinerAgent = REFINER_PROMPT | ChatOpenAI(
-        model=MODEL, temperature=TEMPERATURE, api_key=API_KEY
-    ).with_structured_output(TranslationResponse)
-    response = RefinerAgent.invoke(state)
-    state["data_translation_result"] = response
+    RefinerAgent = get_agent(
+        "RefinerAgent", REFINER_PROMPT, TranslationResponse, priority=PRIORITY_REFINE
+    )
+    response = await RefinerAgent.ainvoke(state)
     print(f'refiner agent called: {response}')
-    return {"refiner_result": response, "refine_count": 1}
+    update = {"data_translation_result": response, "refine_count": 1}
+    if evaluators:
+        # stale results are cleared so only those evaluators run again on the refined text
+        stale = invalidate_results(state, evaluators, response)
+        print(f"re-evaluating: {sorted(stale) or 'nothing'}")
+        update.update(stale)
+    return update
 
 # def RunMCPAgent(state: AgentRunningState) -> Dict[str, Any]:
 #     """
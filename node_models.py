@@ -1,9 +1,28 @@
 from typing import TypedDict, Optional, Annotated
 from operator import add
 
+
+def merge_dicts(left: dict | None, right: dict | None) -> dict:
+    return {**(left or {}), **(right or {})}
+
 class TranslationResponse(TypedDict):
     translated_sentence:str
 
+class BatchTranslationItem(TypedDict):
+    index: int
+    translated_sentence: str
+
+class BatchTranslationResponse(TypedDict):
+    translations: list[BatchTranslationItem]
+
+class CandidateTranslationResponse(TypedDict):
+    candidates: list[TranslationResponse]
+
+class CandidateResult(TypedDict):
+    translated_sentence: str
+    score: float
+    prevalidation_passed: bool
+
 class AccuracyResponse(TypedDict):
     accuracy_score:float
     errors: dict[str, str]
@@ -21,6 +40,23 @@ class NaturalnessResponse(TypedDict):
     summary: str
 
 
+class FusedEvaluationResponse(TypedDict):
+    accuracy_result: AccuracyResponse
+    fluency_result: FluencyResponse
+    naturalness_result: NaturalnessResponse
+
+
+class BatchEvaluationItem(TypedDict):
+    index: int
+    accuracy_result: AccuracyResponse
+    fluency_result: FluencyResponse
+    naturalness_result: NaturalnessResponse
+
+
+class BatchEvaluationResponse(TypedDict):
+    evaluations: list[BatchEvaluationItem]
+
+
 class CSRatioResponse(TypedDict):
     ratio_score: float
     computed_ratio: str
@@ -32,6 +68,17 @@ class SocialCulturalResponse(TypedDict):
     issues: str
     summary: str
 
+class PrevalidationResult(TypedDict):
+    passed: bool
+    failures: list[str]
+    matrix_share: float
+    length_ratio: float
+    matrix_words: int
+    embedded_words: float
+    added_words: int
+    source_words: int
+
+
 class AgentRunningState(TypedDict):
     hypothesis:str
     cs_ratio: str
@@ -39,12 +86,17 @@ class AgentRunningState(TypedDict):
     second_language: str
     response: str
     data_translation_result: str
+    prevalidation: PrevalidationResult
+    # best-of-k: every scored candidate, the chosen one is data_translation_result
+    candidates: list[CandidateResult]
 
     accuracy_result: AccuracyResponse
     fluency_result: FluencyResponse
     naturalness_result: NaturalnessResponse
-    # cs_ratio_result: CSRatioResponse
+    cs_ratio_result: CSRatioResponse
     social_cultural_result: SocialCulturalResponse
+    # result_key -> translated text that result scored (written by parallel evaluator nodes)
+    evaluated_inputs: Annotated[dict[str, str], merge_dicts]
 
     summary: str
     score: float
@@ -0,0 +1,250 @@
+import asyncio
+import os
+import time
+import jsonlines
+from loguru import logger
+from tsv_exporter import TSVExporter, build_hypo_index
+from run_manifest import scenario_key, hypo_text, load_accepted_hypos
+from record_store import RecordStore, DEFAULT_COMPRESSION_LEVEL
+
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_BATCH_SIZE = 64
+RECORD_FORMATS = ("jsonl", "records")
+
+
+def ratio_slug(cs_ratio) -> str:
+    """File-name form of a cs_ratio setting: "70%" -> "70pct", ["70%", "50%"] -> "70pct-50pct"."""
+    values = cs_ratio if isinstance(cs_ratio, (list, tuple)) else [cs_ratio]
+    return "-".join(str(v).strip().replace("%", "pct").replace(" ", "") for v in values)
+
+
+class OutputSink:
+    """
+    Single writer for everything AcceptanceAgent produces.
+
+    Nodes only put accepted states on a queue; one task drains it in batches,
+    appends to data_output/{language}.jsonl (or .records) and {language}_dataset.json,
+    upserts the TSV, and flushes + fsyncs every `flush_interval` seconds or
+    `batch_size` records. Appends from concurrent scenarios can no longer
+    interleave, and no file I/O runs on a node's hot path.
+
+    Attributes:
+        output_dir (str): Directory for all output files.
+        loader: XNLIDataLoader used to build the hypo -> (premise, label) index.
+        tsv_mode (str): "incremental" or "end_of_run" (see TSVExporter).
+        flush_interval (float): Max seconds between flushes.
+        batch_size (int): Max records written per batch.
+        fsync (bool): fsync the files after each flush.
+        on_written (list): Callbacks called with each batch once it is durable.
+        on_failed (list): Callbacks called with the error when a batch cannot be
+            written; the sink stops and close() re-raises the error.
+        fan_out (dict): scenario_key -> duplicate scenarios (see dedup.plan_dedup);
+            their records are copied from the accepted representative.
+        partition_by_ratio (bool): Write {language}_{cs_ratio} files instead of
+            {language} ones, so runs of several ratios do not share outputs.
+        record_format (str): "jsonl" (whole states) or "records" (normalized
+            records in a compressed, indexed RecordStore).
+        compression_level (int): zstd level of the record store.
+    """
+    def __init__(
+        self,
+        output_dir,
+        loader,
+        tsv_mode="incremental",
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        batch_size=DEFAULT_BATCH_SIZE,
+        fsync=True,
+        partition_by_ratio=False,
+        record_format="jsonl",
+        compression_level=DEFAULT_COMPRESSION_LEVEL,
+    ):
+        self.output_dir = output_dir
+        self.loader = loader
+        self.tsv_mode = tsv_mode
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.partition_by_ratio = partition_by_ratio
+        self.record_format = record_format
+        self.compression_level = compression_level
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self._index = None
+        self._files = {}
+        self._exporters = {}
+        self.written = 0
+        self.on_written = []
+        self.on_failed = []
+        self.error = None
+        self.fan_out = {}
+
+    def paths(self, language):
+        return {
+            "jsonl": f"{self.output_dir}/{language}.jsonl",
+            "records": f"{self.output_dir}/{language}.records",
+            "dataset": f"{self.output_dir}/{language}_dataset.json",
+            "tsv": f"{self.output_dir}/cs_{language}_test.tsv",
+        }
+
+    def partition(self, state) -> str:
+        """Output file stem of a state: its language, plus its cs_ratio when partition_by_ratio is set."""
+        language = state["second_language"]
+        if not self.partition_by_ratio:
+            return language
+        return f"{language}_{ratio_slug(state.get('cs_ratio'))}"
+
+    def records_path(self, language) -> str:
+        """The accepted-records file of a partition in the configured record_format."""
+        return self.paths(language)[self.record_format]
+
+    def accepted_hypos(self, language) -> set:
+        path = self.records_path(language)
+        if self.record_format == "jsonl" or not os.path.exists(path):
+            return load_accepted_hypos(path)
+        store = RecordStore(path)
+        try:
+            return store.hypos()
+        finally:
+            store.close()
+
+    def pending(self, scenarios) -> list:
+        """Scenarios whose hypothesis is not in their output file from an earlier run."""
+        accepted = {
+            partition: self.accepted_hypos(partition)
+            for partition in {self.partition(s) for s in scenarios}
+        }
+        return [s for s in scenarios if hypo_text(s) not in accepted[self.partition(s)]]
+
+    def start(self):
+        if self.error is not None:
+            raise RuntimeError("Output sink stopped after a failed write") from self.error
+        if self._index is None:
+            # a missing dataset fails here, before any LLM call is spent
+            self._index = build_hypo_index(self.loader)
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def submit(self, state):
+        self.start()
+        await self._queue.put(dict(state))
+
+    async def close(self):
+        """
+        Drain the queue, flush everything and, in end_of_run mode, export the TSVs.
+        Re-raises the error of a batch that could not be written.
+        """
+        if self._task is not None:
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+        await asyncio.to_thread(self._close_files)
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    async def _run(self):
+        closing = False
+        while not closing:
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                except Exception as e:
+                    # part of the batch may be on disk already; the TSV can be rebuilt with tsv_exporter
+                    logger.error(f"🚨 Failed to write {len(batch)} accepted records, stopping the sink: {e}")
+                    self.error = e
+                    for callback in self.on_failed:
+                        callback(e)
+                    return
+
+    def _open(self, language):
+        if language not in self._files:
+            os.makedirs(self.output_dir, exist_ok=True)
+            paths = self.paths(language)
+            records = (
+                RecordStore(paths["records"], self.compression_level) if self.record_format == "records"
+                else open(paths["jsonl"], "a", encoding="utf-8")
+            )
+            self._files[language] = (records, open(paths["dataset"], "a", encoding="utf-8"))
+        return self._files[language]
+
+    def _exporter(self, language):
+        if self._index is None:
+            self._index = build_hypo_index(self.loader)
+        if language not in self._exporters:
+            self._exporters[language] = TSVExporter(self.paths(language)["tsv"], index=self._index)
+        return self._exporters[language]
+
+    def _expand(self, batch):
+        """The batch plus one copy per collapsed duplicate, carrying the duplicate's own hypothesis."""
+        if not self.fan_out:
+            return batch
+        expanded = []
+        for state in batch:
+            expanded.append(state)
+            for member in self.fan_out.get(scenario_key(state), []):
+                expanded.append({
+                    **state,
+                    "hypothesis": member["hypothesis"],
+                    "duplicate_of": hypo_text(state),
+                })
+        return expanded
+
+    def _write_batch(self, batch):
+        batch = self._expand(batch)
+        partitions = {}
+        for state in batch:
+            partitions.setdefault(self.partition(state), []).append(state)
+        for language, states in partitions.items():
+            records, dataset_fh = self._open(language)
+            if self.record_format == "records":
+                # one compressed chunk per partition and batch
+                records.append(states)
+            else:
+                jsonlines.Writer(records).write_all(states)
+            jsonlines.Writer(dataset_fh).write_all(
+                state["data_translation_result"]["translated_sentence"] for state in states
+            )
+            if self.tsv_mode == "incremental":
+                for state in states:
+                    self._exporter(language).upsert(state)
+        for language in partitions:
+            for fh in self._files[language]:
+                fh.flush()
+                if self.fsync:
+                    os.fsync(fh.fileno())
+            if self.tsv_mode == "incremental":
+                self._exporter(language).flush()
+        self.written += len(batch)
+        for callback in self.on_written:
+            callback(batch)
+
+    def _close_files(self):
+        for fh_pair in self._files.values():
+            for fh in fh_pair:
+                fh.flush()
+                if self.fsync:
+                    os.fsync(fh.fileno())
+                fh.close()
+        languages = list(self._files)
+        self._files = {}
+        if self.tsv_mode == "end_of_run":
+            for language in languages:
+                self._exporters.pop(language, None)
+                self._exporter(language).materialize(self.records_path(language))
+        # exporters are bound to paths under output_dir; the next run reloads from disk
+        self._exporters = {}
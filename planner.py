@@ -0,0 +1,285 @@
+"""
+Dry-run planner: expected requests, tokens, cost and wall time of a run, without LLM calls.
+
+    python planner.py --config config/config_zh.yaml --start 1200 --end 5200
+    python agents.py --plan --start 1200 --end 5200
+    python sweep.py --plan --languages Mandarin Vietnamese --cs-ratios 70% 30%
+
+Selects the scenarios the run would execute (accepted hypotheses skipped,
+duplicates collapsed), renders the real prompts of every LLM node for a
+sample of them and counts the tokens with tiktoken. Calls per scenario
+follow the graph for the configured evaluation mode, batching and best-of-k;
+the refine rate, the share of evaluators re-run after a refinement, the
+completion tokens and the per-call latency come from earlier runs' traces
+(`tracing.trace_path`), with built-in defaults where the trace has nothing.
+Wall time is the slowest of the concurrency bound (max_in_flight) and the
+RPM / TPM budgets.
+"""
+import argparse
+import json
+import os
+import random
+from statistics import mean
+import prompt
+from evaluators import FusedEvaluator, load_evaluators, evaluation_nodes
+from instrumentation import DEFAULT_TRACE_PATH
+from llm_client import MODEL
+from node_engine import output_sink, configure_output
+from dedup import plan_dedup
+from run_manifest import hypo_text
+from scheduler import DEFAULT_MAX_IN_FLIGHT, DEFAULT_COMPLETION_TOKENS
+from token_counter import count_message_tokens, prompt_prefix_tokens
+
+DEFAULT_SAMPLE = 200
+# used when no trace has the number
+DEFAULT_REFINE_RATE = 0.2
+DEFAULT_CALL_LATENCY = 3.0
+# share of evaluators re-run after a refinement, by reevaluation mode
+REEVALUATION_SHARE = {"all": 1.0, "affected": 0.5, "none": 0.0}
+
+
+def load_history(trace_path) -> dict:
+    """Per-node call, token and latency totals plus the refine rate from a trace file."""
+    history = {"scenarios": 0, "refines": 0, "nodes": {}}
+    if not trace_path or not os.path.exists(trace_path):
+        return history
+    with open(trace_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if event.get("type") == "scenario" and event.get("outcome") == "accepted":
+                history["scenarios"] += 1
+                history["refines"] += event.get("refine_count") or 0
+            elif event.get("type") == "node" and event.get("calls"):
+                node = history["nodes"].setdefault(
+                    event["node"], {"calls": 0, "output_tokens": 0, "llm_latency": 0.0}
+                )
+                node["calls"] += event["calls"]
+                node["output_tokens"] += event.get("output_tokens", 0)
+                node["llm_latency"] += event.get("llm_latency", 0.0)
+    return history
+
+
+def refine_rate(history) -> float:
+    if not history["scenarios"]:
+        return DEFAULT_REFINE_RATE
+    return history["refines"] / history["scenarios"]
+
+
+def per_call(history, node, field, default):
+    stats = history["nodes"].get(node)
+    return stats[field] / stats["calls"] if stats and stats["calls"] else default
+
+
+def reevaluation_share(history, node, mode, rate) -> float:
+    """Share of refinements after which `node` runs again, measured when the trace allows."""
+    stats = history["nodes"].get(node)
+    if stats and history["scenarios"] and rate > 0:
+        extra = stats["calls"] / history["scenarios"] - 1
+        return min(1.0, max(0.0, extra / rate))
+    return REEVALUATION_SHARE.get(mode, 1.0)
+
+
+def select_scenarios(config, scenarios) -> dict:
+    """The scenarios a run would execute: accepted ones skipped, duplicates collapsed."""
+    configure_output(config.get("output"))
+    pending = scenarios
+    if (config.get("resume") or {}).get("enabled", True):
+        pending = output_sink.pending(scenarios)
+    representatives, _ = plan_dedup(pending, config.get("dedup"))
+    return {
+        "selected": len(scenarios),
+        "already_accepted": len(scenarios) - len(pending),
+        "duplicates": len(pending) - len(representatives),
+        "scenarios": representatives,
+    }
+
+
+def _translated(state) -> dict:
+    # translations are not known before the run; the hypothesis is the length proxy
+    return {**state, "data_translation_result": {"translated_sentence": hypo_text(state)}}
+
+
+def _tokens(template, states, variables=lambda state: state) -> tuple[float, int]:
+    """Mean rendered prompt tokens over `states` and the template's static prefix tokens."""
+    template = prompt.resolve_prompt(template)
+    counts = [count_message_tokens(template.invoke(variables(state)), MODEL) for state in states]
+    return mean(counts), prompt_prefix_tokens(template, MODEL)
+
+
+def plan_calls(config, sample, history) -> list[dict]:
+    """One entry per LLM node: calls per scenario and input tokens per call."""
+    batching = config.get("batching") or {}
+    mode = config.get("evaluation_mode", "separate")
+    k = (config.get("candidates") or {}).get("k", 1)
+    reevaluation = (config.get("reevaluation") or {}).get("mode", "affected")
+    rate = refine_rate(history)
+    nodes = evaluation_nodes(load_evaluators(config), mode)
+    translated = [_translated(state) for state in sample]
+    entries = []
+
+    def add(node, calls, tokens):
+        input_tokens, static_tokens = tokens
+        entries.append({
+            "node": node,
+            "calls_per_scenario": calls,
+            "input_tokens": input_tokens,
+            "static_tokens": static_tokens,
+        })
+
+    translation_batch = batching.get("translation_batch_size", 1)
+    if k > 1:
+        add("CandidateAgent", 1.0, _tokens(prompt.CANDIDATE_TRANSLATION_PROMPT, sample, lambda s: {**s, "k": k}))
+    elif translation_batch > 1:
+        groups = [sample[i:i + translation_batch] for i in range(0, len(sample), translation_batch)]
+        add("DataTranslationAgent", 1 / translation_batch, _tokens(
+            prompt.BATCH_TRANSLATION_PROMPT, groups,
+            lambda group: {
+                "first_language": group[0].get("first_language"),
+                "second_language": group[0].get("second_language"),
+                "hypotheses": "\n".join(f"{i}. {hypo_text(s)}" for i, s in enumerate(group, start=1)),
+            },
+        ))
+    else:
+        add("DataTranslationAgent", 1.0, _tokens(prompt.DATA_TRANSLATION_PROMPT, sample))
+
+    evaluation_batch = batching.get("evaluation_batch_size", 1)
+    for node in nodes:
+        # best-of-k scores every candidate on the first pass
+        first_pass = k if k > 1 else 1
+        calls = first_pass + rate * reevaluation_share(history, node.node, reevaluation, rate)
+        if isinstance(node, FusedEvaluator) and evaluation_batch > 1:
+            groups = [translated[i:i + evaluation_batch] for i in range(0, len(translated), evaluation_batch)]
+            add(node.node, calls / evaluation_batch, _tokens(
+                prompt.BATCH_EVALUATION_PROMPT, groups,
+                lambda group: {"items": "\n".join(
+                    f"{i}. Original: {hypo_text(s)}\n   Code-switched: {hypo_text(s)}"
+                    for i, s in enumerate(group, start=1)
+                )},
+            ))
+        else:
+            add(node.node, calls, _tokens(node.prompt, translated))
+
+    # the refiner sees the evaluators' answers pasted into its summary
+    summary_tokens = sum(
+        per_call(history, node.node, "output_tokens", DEFAULT_COMPLETION_TOKENS) for node in nodes
+    )
+    input_tokens, static_tokens = _tokens(prompt.REFINER_PROMPT, sample, lambda s: {**s, "summary": ""})
+    add("RefinerAgent", rate, (input_tokens + summary_tokens, static_tokens))
+    return entries
+
+
+def plan_run(config, scenarios, history=None, sample_size=DEFAULT_SAMPLE, seed=0) -> dict:
+    """Expected requests, tokens, cost and wall time of running `scenarios` under `config`."""
+    prompt.configure_prompts(config.get("prompts"))
+    if history is None:
+        history = load_history((config.get("tracing") or {}).get("trace_path", DEFAULT_TRACE_PATH))
+    selection = select_scenarios(config, scenarios)
+    to_run = selection.pop("scenarios")
+    count = len(to_run)
+    sample = random.Random(seed).sample(to_run, min(sample_size, count)) if count else []
+    scheduler = config.get("scheduler") or {}
+    completion_default = scheduler.get("completion_tokens_estimate", DEFAULT_COMPLETION_TOKENS)
+    price = ((config.get("tracing") or {}).get("prices") or {}).get(MODEL) or {}
+
+    nodes = []
+    for entry in plan_calls(config, sample, history) if sample else []:
+        requests = entry["calls_per_scenario"] * count
+        output_per_call = per_call(history, entry["node"], "output_tokens", completion_default)
+        input_tokens = requests * entry["input_tokens"]
+        output_tokens = requests * output_per_call
+        nodes.append({
+            "node": entry["node"],
+            "requests": requests,
+            "input_tokens": input_tokens,
+            "static_tokens": requests * entry["static_tokens"],
+            "output_tokens": output_tokens,
+            # the rate limiter reserves completion_tokens_estimate per call, not the actual output
+            "reserved_tokens": requests * (entry["input_tokens"] + completion_default),
+            "cost": (input_tokens * price.get("input", 0.0) + output_tokens * price.get("output", 0.0)) / 1e6,
+            "latency": per_call(history, entry["node"], "llm_latency", DEFAULT_CALL_LATENCY),
+        })
+
+    # critical path of one scenario: translation, then the slowest evaluator,
+    # and for refined scenarios the refiner plus the slowest evaluator again
+    latency = {n["node"]: n["latency"] for n in nodes}
+    evaluator_latency = max((n["latency"] for n in nodes if n["node"] not in
+                            ("DataTranslationAgent", "CandidateAgent", "RefinerAgent")), default=0.0)
+    translation_latency = latency.get("CandidateAgent", latency.get("DataTranslationAgent", 0.0))
+    rate = refine_rate(history)
+    scenario_seconds = translation_latency + evaluator_latency + rate * (
+        latency.get("RefinerAgent", 0.0) + evaluator_latency
+    )
+    requests = sum(n["requests"] for n in nodes)
+    reserved = sum(n["reserved_tokens"] for n in nodes)
+    bounds = {
+        "concurrency": count * scenario_seconds / scheduler.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT),
+        "requests_per_minute": 60 * requests / scheduler["requests_per_minute"]
+        if scheduler.get("requests_per_minute") else 0.0,
+        "tokens_per_minute": 60 * reserved / scheduler["tokens_per_minute"]
+        if scheduler.get("tokens_per_minute") else 0.0,
+    }
+    binding = max(bounds, key=bounds.get)
+    return {
+        **selection,
+        "to_run": count,
+        "model": MODEL,
+        "refine_rate": rate,
+        "history_scenarios": history["scenarios"],
+        "nodes": nodes,
+        "requests": requests,
+        "input_tokens": sum(n["input_tokens"] for n in nodes),
+        "static_tokens": sum(n["static_tokens"] for n in nodes),
+        "output_tokens": sum(n["output_tokens"] for n in nodes),
+        "cost": sum(n["cost"] for n in nodes),
+        "scenario_seconds": scenario_seconds,
+        "bounds": bounds,
+        "binding": binding,
+        "wall_seconds": bounds[binding],
+    }
+
+
+def print_plan(plan):
+    print(f"{plan['selected']} selected, {plan['already_accepted']} already accepted, "
+          f"{plan['duplicates']} duplicates -> {plan['to_run']} scenarios to run")
+    source = f"from {plan['history_scenarios']} traced scenarios" if plan["history_scenarios"] else "default"
+    print(f"model {plan['model']}, refine rate {plan['refine_rate']:.2f} ({source})")
+    print(f"  {'node':<28}{'requests':>10}{'input tok':>12}{'static':>12}{'output tok':>12}"
+          f"{'cost $':>10}{'s/call':>8}")
+    for node in plan["nodes"]:
+        print(f"  {node['node']:<28}{node['requests']:>10.0f}{node['input_tokens']:>12.0f}"
+              f"{node['static_tokens']:>12.0f}{node['output_tokens']:>12.0f}{node['cost']:>10.2f}"
+              f"{node['latency']:>8.2f}")
+    print(f"  {'total':<28}{plan['requests']:>10.0f}{plan['input_tokens']:>12.0f}"
+          f"{plan['static_tokens']:>12.0f}{plan['output_tokens']:>12.0f}{plan['cost']:>10.2f}")
+    bounds = ", ".join(f"{name} {seconds / 3600:.2f}h" for name, seconds in plan["bounds"].items())
+    print(f"wall time ~{plan['wall_seconds'] / 3600:.2f}h, bound by {plan['binding']} ({bounds}); "
+          f"{plan['scenario_seconds']:.1f}s per scenario")
+
+
+def report(config, scenarios, out=None, sample_size=DEFAULT_SAMPLE) -> dict:
+    """plan_run + print_plan, optionally saved as JSON; what every --plan flag calls."""
+    plan = plan_run(config, scenarios, sample_size=sample_size)
+    print_plan(plan)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(plan, f, indent=2)
+        print(f"Saved plan to {out}")
+    return plan
+
+
+if __name__ == "__main__":
+    import agents
+    from utils import load_config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=agents.CONFIG_PATH)
+    parser.add_argument("--start", type=int, default=agents.start)
+    parser.add_argument("--end", type=int, default=agents.end)
+    parser.add_argument("--sample", type=int, default=DEFAULT_SAMPLE, help="scenarios whose prompts are rendered")
+    parser.add_argument("--out", help="write the plan as JSON")
+    args = parser.parse_args()
+    config = load_config(args.config)
+    report(config, agents.build_scenarios(config)[args.start:args.end], args.out, args.sample)
@@ -0,0 +1,163 @@
+import re
+import unicodedata
+from collections import Counter
+from run_manifest import hypo_text
+
+# defaults of the `prevalidation` config section
+DEFAULT_RATIO_TOLERANCE = 0.4
+DEFAULT_MIN_MATRIX_SHARE = 0.2
+DEFAULT_LENGTH_TOLERANCE = 0.5
+# embedded-language units (Han characters, Vietnamese syllables) per English word
+DEFAULT_UNITS_PER_WORD = {"Mandarin": 1.5, "Chinese": 1.5, "Cantonese": 1.5, "Vietnamese": 1.3}
+HAN_LANGUAGES = {"Mandarin", "Chinese", "Cantonese"}
+
+_HAN = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+TOKEN_PATTERN = re.compile(
+    rf"[{_HAN}]|[^\W\d_{_HAN}]+(?:['’][^\W\d_{_HAN}]+)*|\d+(?:[.,]\d+)*"
+)
+HAN_PATTERN = re.compile(rf"[{_HAN}]")
+# letters only Vietnamese uses among Latin-script languages, plus its tone marks (after NFD)
+VIETNAMESE_LETTERS = set("ăâđêôơưĂÂĐÊÔƠƯ")
+VIETNAMESE_TONES = {"\u0300", "\u0301", "\u0303", "\u0309", "\u0323"}
+
+_settings = {
+    "enabled": True,
+    "ratio_tolerance": DEFAULT_RATIO_TOLERANCE,
+    "min_matrix_share": DEFAULT_MIN_MATRIX_SHARE,
+    "length_tolerance": DEFAULT_LENGTH_TOLERANCE,
+    "units_per_word": dict(DEFAULT_UNITS_PER_WORD),
+}
+
+
+def configure_prevalidation(prevalidation_config: dict | None) -> bool:
+    """Apply the `prevalidation` config section; returns whether the node is enabled."""
+    prevalidation_config = prevalidation_config or {}
+    _settings["enabled"] = prevalidation_config.get("enabled", True)
+    for key in ("ratio_tolerance", "min_matrix_share", "length_tolerance"):
+        if key in prevalidation_config:
+            _settings[key] = prevalidation_config[key]
+    _settings["units_per_word"] = {
+        **DEFAULT_UNITS_PER_WORD, **(prevalidation_config.get("units_per_word") or {})
+    }
+    return _settings["enabled"]
+
+
+def prevalidation_enabled() -> bool:
+    return _settings["enabled"]
+
+
+def tokenize(text: str) -> list[str]:
+    """Latin words and numbers as whole tokens, every Han character as its own token."""
+    return TOKEN_PATTERN.findall(unicodedata.normalize("NFC", text))
+
+
+def is_vietnamese(token: str) -> bool:
+    if any(ch in VIETNAMESE_LETTERS for ch in token):
+        return True
+    return any(ch in VIETNAMESE_TONES for ch in unicodedata.normalize("NFD", token))
+
+
+def parse_targets(cs_ratio) -> list[float]:
+    """Matrix-language shares from the cs_ratio setting ("70%" or ["70%", "50%", ...])."""
+    values = cs_ratio if isinstance(cs_ratio, (list, tuple)) else [cs_ratio]
+    targets = []
+    for value in values:
+        try:
+            number = float(str(value).strip().rstrip("%"))
+        except ValueError:
+            continue
+        targets.append(number / 100 if number > 1 else number)
+    return targets
+
+
+def split_languages(source: str, translation: str, second_language: str) -> dict:
+    """
+    Align translation tokens against the source hypothesis. Tokens found in the
+    source (case-insensitive, each used once) are matrix language; Han characters
+    and Vietnamese-marked words are embedded; any other unaligned word counts as
+    embedded for Latin-script languages and as an added matrix word otherwise.
+    """
+    available = Counter(token.casefold() for token in tokenize(source))
+    matrix = embedded_units = added = 0
+    for token in tokenize(translation):
+        key = token.casefold()
+        if HAN_PATTERN.fullmatch(token) or is_vietnamese(token):
+            embedded_units += 1
+        elif available[key] > 0:
+            available[key] -= 1
+            matrix += 1
+        elif second_language in HAN_LANGUAGES:
+            matrix += 1
+            added += 1
+        else:
+            embedded_units += 1
+    units_per_word = _settings["units_per_word"].get(second_language, 1.0)
+    return {
+        "matrix_words": matrix,
+        "embedded_words": embedded_units / units_per_word,
+        "added_words": added,
+        "source_words": sum(Counter(token.casefold() for token in tokenize(source)).values()),
+    }
+
+
+def _translated_text(state) -> str:
+    result = state.get("data_translation_result")
+    if isinstance(result, dict):
+        return result.get("translated_sentence") or ""
+    return str(result or "")
+
+
+def prevalidate(state) -> dict:
+    """
+    Cheap hard-constraint checks on a translation. Returns the state update:
+    `prevalidation` (passed, failures, measurements) and a locally computed
+    `cs_ratio_result`; on failure also a `summary` the refiner can act on.
+    """
+    source = hypo_text(state)
+    translation = _translated_text(state).strip()
+    failures = []
+    if not translation:
+        failures.append("empty output")
+        counts = {"matrix_words": 0, "embedded_words": 0.0, "added_words": 0,
+                  "source_words": len(tokenize(source))}
+    else:
+        counts = split_languages(source, translation, state.get("second_language"))
+        if tokenize(translation.casefold()) == tokenize(source.casefold()) or counts["embedded_words"] == 0:
+            failures.append(f"no code-switching: no {state.get('second_language')} words in the output")
+
+    total = counts["matrix_words"] + counts["embedded_words"]
+    matrix_share = counts["matrix_words"] / total if total else 0.0
+    targets = parse_targets(state.get("cs_ratio")) or [matrix_share]
+    distance = min(abs(matrix_share - target) for target in targets)
+    if translation and (distance > _settings["ratio_tolerance"] or matrix_share < _settings["min_matrix_share"]):
+        failures.append(
+            f"code-switching ratio {matrix_share:.0%} {state.get('first_language')} is far from the "
+            f"requested {', '.join(f'{t:.0%}' for t in targets)}"
+        )
+    length_ratio = total / counts["source_words"] if counts["source_words"] else 1.0
+    if translation and abs(length_ratio - 1) > _settings["length_tolerance"]:
+        change = "added" if length_ratio > 1 else "dropped"
+        failures.append(
+            f"words {change}: about {total:.0f} words for a {counts['source_words']}-word hypothesis"
+        )
+
+    update = {
+        "prevalidation": {
+            "passed": not failures,
+            "failures": failures,
+            "matrix_share": matrix_share,
+            "length_ratio": length_ratio,
+            **counts,
+        },
+        "cs_ratio_result": {
+            "ratio_score": round(max(0.0, 10 - 20 * distance), 1),
+            "computed_ratio": f"{matrix_share:.0%} : {1 - matrix_share:.0%}",
+            "notes": f"computed locally from token alignment; targets {', '.join(f'{t:.0%}' for t in targets)}",
+        },
+    }
+    if failures:
+        update["summary"] = (
+            f"\n    data_translation_result: {state.get('data_translation_result')}"
+            f"\n    Pre-validation failed: {'; '.join(failures)}\n    "
+        )
+    return update
@@ -7,261 +7,377 @@ from langchain_core.prompts import ChatPromptTemplate
 #               - Examples: English (main) + Japanese (tag),“It’s a good movie, deshou?"
 #               - Examples: Chinese (main) + English (tag),“好辛苦呀, oh my gosh!”
 #             - Include either of these code-switching type for your output based on what is suitable
-DATA_TRANSLATION_PROMPT = ChatPromptTemplate.from_messages(
-    [
-        (
-            "assistant",
-            """
-            You are a multilingual translation agent. You will be given an {first_language} sentence. Your task is to rewrite it by code-switching by translating words into {second_language}.
-            Input: {hypothesis}
-
-            
-            Follow these guidelines:
-
-            1. Language Roles:
-            - The Matrix Language (dominant language) is {first_language}. 
-            - The Embedded Language (secondary language) is {second_language}.
-
-            2. Intrasentential Code-Switching :
-              - Within a single sentence, embed a short phrase or clause in {second_language} (e.g., for an object, an adjective, or a common expression).
-              - Remember to maintain grammatical coherence; e.g., do not place a determiner in a position that violates the word order rules of the main language.
-              - This can be in the form of insertional code-switching: incorporation of specific lexical elements into a matrix language such as single words or short phrases
-              - **Focus on switching adjectives and nouns**
-                Examples: Chinese to English,“我老是去那家 coffee shop，因为那里真的很 peaceful，而且vibe也不错。”(Chinese sentence about the son, then an English statement.)
-                Examples: English to Spanish, Original Sentence: "The student read the book in the reference room.", New Sentence:El estudiante leyó el libro en el reference room.
-                Examples: English to Spanish, Original Sentence: "I met up with my buddies at the party.", New Sentence: "I met up with my compadres at the fiesta."
-            - This can also be in the form of more syntactically complex alternational codeswitches at grammatical clause boundaries 
-                Examples: English to Spanish, Original Sentence: "But my printer doesn’t work.", New Sentence: "Pero mi printer no funciona."
-                Examples: English to Spanish, Original Sentence: "You can’t do it because you can’t check it.", New Sentence: "No la puedes hacer because you can’t check it."
-             
-            3. Utilise Lexical Substitution
-            - If a direct translation of the verb creates unnatural grammar, try changing the word choice to a similar word or switch the whole verb phrase.
-           
-            4. Ensure your output follows these constraints:
-            - Do not add any additional words to the original {hypothesis}.
-            - Pronouns (subject/object), determiners, articles, and any other system morphemes MUST NOT appear in the Embedded Language unless the ENTIRE clause or phrase containing them is also switched into the Embedded Language.
-            - Switch must respect each language’s grammar constraints (like subject-verb-object ordering, morphological rules, etc.).
-            - The syntax remains correct in both languages. (Observe free morpheme constraint & equivalence constraint.)
-            - Make it sound natural to bilingual speakers (avoid unnatural mixing).
-            - The order of words must follow the Matrix Language rules.
-            - The final sentence must mean EXACTLY the same thing as the input sentence.
-            - The proportion of matrix_language should be at least `20%` of the sentence
-
-            5. Output must be the generated code-switched sentence in string format
-    
-           Think carefully and produce your code-switched text.
-            
-            ### INTERNAL (do NOT reveal):
-            1. Parse the {first_language} sentence input: {hypothesis} into a dependency tree.
-            2. Translate it into {second_language}.
-            3. Align tokens between the two sentences.
-            4. Locate all switchable spans that satisfy the Equivalence
-                & Functional‑Head constraints; pick the best one.
-            – Keep all intermediate notes private. 
-            ### END INTERNAL
-            """,
-        )
-    ]
+
+# Every template is laid out for provider prompt caching: a "system" message
+# with only static instructions (byte-identical for every scenario, so the
+# provider can serve it from its prompt cache), then a "human" message with the
+# per-scenario variables last. The translation, candidate and refiner prompts
+# open with the same guideline block, so they share one cached prefix.
+
+CODE_SWITCHING_GUIDELINES = """
+You are a multilingual code-switching agent. You rewrite sentences of the Matrix Language by code-switching: translating some of their words into the Embedded Language. The two languages are given at the end of the conversation.
+
+Follow these guidelines:
+
+1. Language Roles:
+- The Matrix Language is the dominant language of the output.
+- The Embedded Language is the secondary language that is switched in.
+
+2. Intrasentential Code-Switching:
+  - Within a single sentence, embed a short phrase or clause in the Embedded Language (e.g., for an object, an adjective, or a common expression).
+  - Remember to maintain grammatical coherence; e.g., do not place a determiner in a position that violates the word order rules of the main language.
+  - This can be in the form of insertional code-switching: incorporation of specific lexical elements into a matrix language such as single words or short phrases
+  - **Focus on switching adjectives and nouns**
+    Examples: Chinese to English,“我老是去那家 coffee shop，因为那里真的很 peaceful，而且vibe也不错。”(Chinese sentence about the son, then an English statement.)
+    Examples: English to Spanish, Original Sentence: "The student read the book in the reference room.", New Sentence:El estudiante leyó el libro en el reference room.
+    Examples: English to Spanish, Original Sentence: "I met up with my buddies at the party.", New Sentence: "I met up with my compadres at the fiesta."
+- This can also be in the form of more syntactically complex alternational codeswitches at grammatical clause boundaries
+    Examples: English to Spanish, Original Sentence: "But my printer doesn’t work.", New Sentence: "Pero mi printer no funciona."
+    Examples: English to Spanish, Original Sentence: "You can’t do it because you can’t check it.", New Sentence: "No la puedes hacer because you can’t check it."
+
+3. Utilise Lexical Substitution
+- If a direct translation of the verb creates unnatural grammar, try changing the word choice to a similar word or switch the whole verb phrase.
+
+4. Ensure your output follows these constraints:
+- Do not add any additional words to the original sentence.
+- Pronouns (subject/object), determiners, articles, and any other system morphemes MUST NOT appear in the Embedded Language unless the ENTIRE clause or phrase containing them is also switched into the Embedded Language.
+- Switch must respect each language’s grammar constraints (like subject-verb-object ordering, morphological rules, etc.).
+- The syntax remains correct in both languages. (Observe free morpheme constraint & equivalence constraint.)
+- Make it sound natural to bilingual speakers (avoid unnatural mixing).
+- The order of words must follow the Matrix Language rules.
+- The final sentence must mean EXACTLY the same thing as the input sentence.
+- The proportion of the Matrix Language should be at least `20%` of the sentence
+
+### INTERNAL (do NOT reveal):
+1. Parse the input sentence into a dependency tree.
+2. Translate it into the Embedded Language.
+3. Align tokens between the two sentences.
+4. Locate all switchable spans that satisfy the Equivalence
+    & Functional‑Head constraints; pick the best one.
+– Keep all intermediate notes private.
+### END INTERNAL
+"""
+
+COMPACT_CODE_SWITCHING_GUIDELINES = """
+You are a multilingual code-switching agent. Rewrite Matrix Language sentences by switching some words or phrases into the Embedded Language (both given at the end).
+
+Rules:
+- Prefer switching nouns, adjectives and short phrases; whole clauses may switch at clause boundaries.
+  Example (English to Spanish): "The student read the book in the reference room." -> "El estudiante leyó el libro en el reference room."
+- Keep the Matrix Language word order and grammar; obey the free morpheme and equivalence constraints.
+- Pronouns, determiners, articles and other system morphemes stay in the Matrix Language unless their whole phrase is switched.
+- Add no words; the meaning must stay EXACTLY the same.
+- It must sound natural to bilingual speakers; at least 20% of the sentence stays in the Matrix Language.
+"""
+
+# per-scenario part shared by the translation-style prompts; always the last message
+LANGUAGE_ROLES = """The Matrix Language (dominant language) is {first_language}.
+The Embedded Language (secondary language) is {second_language}."""
+
+
+def _cached_layout(static_text, dynamic_text):
+    """System message with the static instructions, human message with the variables."""
+    return ChatPromptTemplate.from_messages([("system", static_text), ("human", dynamic_text)])
+
+
+TRANSLATION_TASK = """
+Task: rewrite the single input sentence. Output must be the generated code-switched sentence in string format, as `translated_sentence`.
+Think carefully and produce your code-switched text.
+"""
+
+CANDIDATE_TASK = """
+Task: produce several distinct candidate rewrites of the single input sentence. Output one entry in `candidates` per candidate, each with one generated code-switched sentence as `translated_sentence`.
+Every candidate must follow all of the constraints above; vary which spans are switched so the candidates genuinely differ.
+Think carefully and produce your code-switched candidates.
+"""
+
+BATCH_TRANSLATION_TASK = """
+Task: you are given a numbered list of sentences. Rewrite EACH sentence independently.
+Output one entry in `translations` per input sentence: its `index` (the number in the list) and the generated code-switched sentence as `translated_sentence`.
+Never merge, skip or reorder sentences.
+Think carefully and produce your code-switched text.
+"""
+
+REFINER_TASK = """
+Task: you are **RefinerAgent**. Refine an existing code-switched text based on the comments from TranslationAccuracyAgent, FluencyAgent, NaturalnessAgent and SocioCulturalAgent (or the pre-validation checks), while maintaining the main purpose of producing a code-switched text:
+
+1. **Accuracy**:
+- Check for semantic errors between the original and code-switched text. Prioritise accuracy above all.
+
+2. **Fluency**:
+- Check for grammatical errors or unnatural mixing of word orders between the matrix and embedded languages.
+
+3. **Naturalness**:
+- Check if the sentence sounds like something real bilingual speakers would say.
+
+Output must be the refined code-switched sentence in string format, as `translated_sentence`.
+Think carefully and produce your code-switched text using the comments and guidelines provided.
+"""
+
+COMPACT_REFINER_TASK = """
+Task: you are **RefinerAgent**. Fix the code-switched text using the reviewer comments: accuracy first, then grammar (fluency), then naturalness. Output the refined sentence as `translated_sentence`.
+"""
+
+DATA_TRANSLATION_PROMPT = _cached_layout(
+    CODE_SWITCHING_GUIDELINES + TRANSLATION_TASK,
+    LANGUAGE_ROLES + "\nInput: {hypothesis}",
 )
 
+CANDIDATE_TRANSLATION_PROMPT = _cached_layout(
+    CODE_SWITCHING_GUIDELINES + CANDIDATE_TASK,
+    LANGUAGE_ROLES + "\nRewrite the input, producing {k} distinct candidate rewrites.\nInput: {hypothesis}",
+)
 
-ACCURACY_PROMPT = ChatPromptTemplate.from_messages(
-    [
-        (
-            #https://themqm.org/the-mqm-typology/
-            "assistant",
-            """
-            You are **TranslationAccuracyAgent**. Your task is to evaluate the meaning preservation between an original and code-switched text. Specifically:
-            1. **Check for semantic errors** between the original, {hypothesis} and code-switched text, {data_translation_result}.
-            - **Tense**: 
-            - **Situation Type**:
-            - **Aspect**:
-            2. **Consider factors from Multidimensional Quality Metrics *Lommel et al., 2014 (1998)*:
-            - **Addition**: Error occuring when the target content that does not accurately represent the source content.
-                - Examples: A source text states that a medicine should not be administered in doses greater than 200 mg, but the translation states that it should be administered in doses greater than 200 mg (i.e., negation has been omitted).
-            - **Overtranslation**: Error occuring in the target content that is inappropriately more specific than the source content.
-                - Examples: The source text refers to a boy, but is translated with a word that applies only to young boys rather than the more general term.
-            - **Undertranslation**: Error occuring in the target content that is inappropriately less specific than the source content.
-                - Examples: The source content uses words that refer to a specific type of military officer, but the target content refers to military officers in general.
-            - **Mistranslation**: Error occuring when the target content that does not accurately represent the source content.
-                - Examples: The source content uses words that refer to a specific type of military officer, but the target content refers to military officers in general.
-            - **Omission**: Error where content present in the source is missing in the target.
-                - Examples: A word present in the source is missing in the translation.
-
-            3. **Output**:
-            - An `accuracy_score` (0 to 10).
-            - A list of identified `errors` (if any), each with:
-                - `description`
-                - `error` (e.g., mention “Omission,” “Overtranslation,” or a known semantic rule)
-            - A short `summary` of overall adequacy.
-            given the code-switched text {data_translation_result}.
-            """,
-        )
-    ]
+BATCH_TRANSLATION_PROMPT = _cached_layout(
+    CODE_SWITCHING_GUIDELINES + BATCH_TRANSLATION_TASK,
+    LANGUAGE_ROLES + "\nInput sentences:\n{hypotheses}",
 )
 
-FLUENCY_PROMPT = ChatPromptTemplate.from_messages(
-    [
-        (
-            "assistant",
-            """
-            You are **FluencyAgent**. Your task is to evaluate the grammatical correctness and syntactic coherence of code-switched text. Specifically:
-
-            1. **Check for code-switching constraints** from *Poplack (1980)*:
-            - **Free Morpheme Constraint**: no switching between a bound morpheme (e.g., “-s” in English) and a free morpheme.
-            - **Equivalence Constraint**: switches should occur where the two languages’ syntactic structures align.
-
-            2. **Check for grammatical errors** or unnatural mixing of word orders between the matrix and embedded languages.
-
-            3. **Output**:
-            - A `fluency_score` (0 to 10).
-            - A list of identified `errors` (if any), each with:
-                - `description`
-                - `constraint_violated` (e.g., mention “Free Morpheme Constraint,” “Equivalence Constraint,” or a known grammar rule)
-            - A short `summary` of overall fluency.
-            given the code-switched text {data_translation_result}.
-            """,
-        )
-    ]
+REFINER_PROMPT = _cached_layout(
+    CODE_SWITCHING_GUIDELINES + REFINER_TASK,
+    LANGUAGE_ROLES + "\nOriginal input: {hypothesis}\nHere are the comments : {summary}",
+)
+
+
+ACCURACY_INSTRUCTIONS = """
+You are **TranslationAccuracyAgent**. Your task is to evaluate the meaning preservation between an original and code-switched text, both given at the end. Specifically:
+1. **Check for semantic errors** between the original and the code-switched text.
+- **Tense**:
+- **Situation Type**:
+- **Aspect**:
+2. **Consider factors from Multidimensional Quality Metrics *Lommel et al., 2014 (1998)*:
+- **Addition**: Error occuring when the target content that does not accurately represent the source content.
+    - Examples: A source text states that a medicine should not be administered in doses greater than 200 mg, but the translation states that it should be administered in doses greater than 200 mg (i.e., negation has been omitted).
+- **Overtranslation**: Error occuring in the target content that is inappropriately more specific than the source content.
+    - Examples: The source text refers to a boy, but is translated with a word that applies only to young boys rather than the more general term.
+- **Undertranslation**: Error occuring in the target content that is inappropriately less specific than the source content.
+    - Examples: The source content uses words that refer to a specific type of military officer, but the target content refers to military officers in general.
+- **Mistranslation**: Error occuring when the target content that does not accurately represent the source content.
+    - Examples: The source content uses words that refer to a specific type of military officer, but the target content refers to military officers in general.
+- **Omission**: Error where content present in the source is missing in the target.
+    - Examples: A word present in the source is missing in the translation.
+
+3. **Output**:
+- An `accuracy_score` (0 to 10).
+- A list of identified `errors` (if any), each with:
+    - `description`
+    - `error` (e.g., mention “Omission,” “Overtranslation,” or a known semantic rule)
+- A short `summary` of overall adequacy.
+"""
+
+FLUENCY_INSTRUCTIONS = """
+You are **FluencyAgent**. Your task is to evaluate the grammatical correctness and syntactic coherence of the code-switched text given at the end. Specifically:
+
+1. **Check for code-switching constraints** from *Poplack (1980)*:
+- **Free Morpheme Constraint**: no switching between a bound morpheme (e.g., “-s” in English) and a free morpheme.
+- **Equivalence Constraint**: switches should occur where the two languages’ syntactic structures align.
+
+2. **Check for grammatical errors** or unnatural mixing of word orders between the matrix and embedded languages.
+
+3. **Output**:
+- A `fluency_score` (0 to 10).
+- A list of identified `errors` (if any), each with:
+    - `description`
+    - `constraint_violated` (e.g., mention “Free Morpheme Constraint,” “Equivalence Constraint,” or a known grammar rule)
+- A short `summary` of overall fluency.
+"""
+
+NATURALNESS_INSTRUCTIONS = """
+You are **NaturalnessAgent**. Your job is to evaluate how natural and authentic the code-switched text given at the end is from a *bilingual speaker’s perspective*:
+
+1. **Check typical code-switching usage**:
+- **Intrasentential, and Tag Switching**.
+- Whether the sentence sounds like something real bilingual speakers would say.
+
+2. **Consider factors from *Auer (1998)*:
+- **Intra-sentential**: switching in the middle of a sentence.
+- **Tag switching**: short tags or phrases in the embedded language.
+
+3. **Output**:
+- A `naturalness_score` (0 to 10).
+- A list of `observations` about unnatural or awkward phrases, if any.
+- A `summary` describing how natural the code-switching is overall.
+"""
+
+THREE_DIMENSIONS = """
+A. **Accuracy** (`accuracy_result`): meaning preservation between the original and the code-switched text.
+- Check for semantic errors: **Tense**, **Situation Type**, **Aspect**.
+- Consider Multidimensional Quality Metrics *Lommel et al., 2014 (1998)*:
+  **Addition**, **Overtranslation**, **Undertranslation**, **Mistranslation**, **Omission**.
+- Output an `accuracy_score` (0 to 10), `errors` (each with `description` and `error`,
+  e.g. “Omission,” “Overtranslation”) and a short `summary` of overall adequacy.
+
+B. **Fluency** (`fluency_result`): grammatical correctness and syntactic coherence.
+- Check code-switching constraints from *Poplack (1980)*:
+  **Free Morpheme Constraint** (no switching between a bound morpheme and a free morpheme) and
+  **Equivalence Constraint** (switches occur where the two languages’ syntactic structures align).
+- Check for grammatical errors or unnatural mixing of word orders between the matrix and embedded languages.
+- Output a `fluency_score` (0 to 10), `errors` (each with `description` and `constraint_violated`)
+  and a short `summary` of overall fluency.
+
+C. **Naturalness** (`naturalness_result`): how natural the text is from a *bilingual speaker’s perspective*.
+- Check typical code-switching usage from *Auer (1998)*: **Intra-sentential** and **Tag switching**,
+  and whether the sentence sounds like something real bilingual speakers would say.
+- Output a `naturalness_score` (0 to 10), `observations` about unnatural or awkward phrases,
+  and a `summary` describing how natural the code-switching is overall.
+"""
+
+ORIGINAL_AND_TRANSLATION = "Original text: {hypothesis}\nCode-switched text: {data_translation_result}"
+TRANSLATION_ONLY = "Code-switched text: {data_translation_result}"
+
+#https://themqm.org/the-mqm-typology/
+ACCURACY_PROMPT = _cached_layout(ACCURACY_INSTRUCTIONS, ORIGINAL_AND_TRANSLATION)
+
+FLUENCY_PROMPT = _cached_layout(FLUENCY_INSTRUCTIONS, TRANSLATION_ONLY)
+
+NATURALNESS_PROMPT = _cached_layout(NATURALNESS_INSTRUCTIONS, TRANSLATION_ONLY)
+
+FUSED_EVALUATION_PROMPT = _cached_layout(
+    """
+You are **EvaluationAgent**. You evaluate one code-switched text (given at the end with its original) on three independent dimensions
+(accuracy, fluency, naturalness) and report each one separately, as three separate reviewers would.
+""" + THREE_DIMENSIONS + """
+Score each dimension on its own; do not let one dimension's problems lower another's score.
+""",
+    ORIGINAL_AND_TRANSLATION,
 )
 
-NATURALNESS_PROMPT = ChatPromptTemplate.from_messages(
-    [
-        (
-            "assistant",
-            """
-            You are **NaturalnessAgent**. Your job is to evaluate how natural and authentic the code-switched text is from a *bilingual speaker’s perspective*:
-
-            1. **Check typical code-switching usage**:
-            - **Intrasentential, and Tag Switching**.
-            - Whether the sentence sounds like something real bilingual speakers would say.
-
-            2. **Consider factors from *Auer (1998)*:
-            - **Intra-sentential**: switching in the middle of a sentence.
-            - **Tag switching**: short tags or phrases in the embedded language.
-
-            3. **Output**:
-            - A `naturalness_score` (0 to 10).
-            - A list of `observations` about unnatural or awkward phrases, if any.
-            - A `summary` describing how natural the code-switching is overall.           
-            given the code-switched text {data_translation_result}.
-            """,
-        )
-    ]
+BATCH_EVALUATION_PROMPT = _cached_layout(
+    """
+You are **EvaluationAgent**. You will be given a numbered list of (original, code-switched) text pairs.
+Evaluate EACH pair independently on three dimensions (accuracy, fluency, naturalness) and report each one separately,
+as three separate reviewers would.
+""" + THREE_DIMENSIONS + """
+Score each dimension on its own; do not let one pair or one dimension influence another.
+Output one entry in `evaluations` per pair, with its `index` (the number in the list).
+""",
+    "Pairs:\n{items}",
 )
 
+CS_RATIO_PROMPT = _cached_layout(
+    """
+You are **CSRatioAgent**. You evaluate the *Code-Switching Ratio* (CS-Ratio) in the text given at the end. Specifically:
 
-CS_RATIO_PROMPT = ChatPromptTemplate.from_messages(
-    [
-        (
-            "assistant",
-            """
-            You are **CSRatioAgent**. You evaluate the *Code-Switching Ratio* (CS-Ratio) in given text. Specifically:
+1. **Check the proportion** of matrix language vs. embedded language:
+- Count tokens/words for each language.
+- Compare to the desired ratio (e.g., 70% matrix, 30% embedded) if provided.
 
-            1. **Check the proportion** of matrix language vs. embedded language:
-            - Count tokens/words for each language.
-            - Compare to a desired ratio (e.g., 70% matrix, 30% embedded) if provided.
+2. **Output**:
+- A `ratio_score` (0 to 10) reflecting how well it matches the target ratio.
+- A `computed_ratio` or breakdown: e.g., "66% : 34%".
+- A `notes` field listing any ratio-related observations.
+""",
+    "Desired ratio: {cs_ratio}\n" + TRANSLATION_ONLY,
+)
+
+SOCIAL_CULTURAL_PROMPT = _cached_layout(
+    """
+You are **SocioCulturalAgent**. Your goal is to ensure that just the code-switched part in the embedded language (given at the end) respects *cultural norms* and uses *correct borrowed words* or expressions.
+
+1. **Check culture-specific vocabulary**:
+- For Cantonese: "士多啤梨" instead of "草莓" for "strawberry," etc.
+- For Spanish: Keep "taco" in Spanish, do not forcibly translate.
+- Avoid offensive or extremely unnatural usage in local contexts.
+
+2. **Output**:
+- A `socio_cultural_score` (0 to 10).
+- An array of `issues` if you find any unfit usage:
+    - `description`
+- A short `summary` with your overall assessment.
+""",
+    "Embedded language: {second_language}\n" + TRANSLATION_ONLY,
+)
 
-            2. **Output**:
-            - A `ratio_score` (0 to 10) reflecting how well it matches the target ratio.
-            - A `computed_ratio` or breakdown: e.g., "66% : 34%".
-            - A `notes` field listing any ratio-related observations.
 
-            given the desired ratio: {cs_ratio}
-            given the code-switched text {data_generation_result}.
-            """,
-        )
-    ]
+# shorter variants of the per-scenario prompts (`prompts: {variant: compact}`);
+# same variables and output schemas, far fewer instruction tokens
+COMPACT_DATA_TRANSLATION_PROMPT = _cached_layout(
+    COMPACT_CODE_SWITCHING_GUIDELINES + "\nTask: rewrite the input sentence; output it as `translated_sentence`.\n",
+    LANGUAGE_ROLES + "\nInput: {hypothesis}",
+)
+
+COMPACT_CANDIDATE_TRANSLATION_PROMPT = _cached_layout(
+    COMPACT_CODE_SWITCHING_GUIDELINES
+    + "\nTask: output distinct candidate rewrites of the input in `candidates`, each as `translated_sentence`; vary the switched spans.\n",
+    LANGUAGE_ROLES + "\nRewrite the input, producing {k} distinct candidate rewrites.\nInput: {hypothesis}",
 )
 
-# SOCIAL_CULTURAL_PROMPT = ChatPromptTemplate.from_messages(
-#     [
-#         (
-#             "assistant",
-#             """
-#             You are **SocioCulturalAgent**. Your goal is to ensure that just the code-switched text in {second_language} respects *cultural norms* and uses *correct borrowed words* or expressions.
-
-#             1. **Check culture-specific vocabulary**:
-#             - For Cantonese: "士多啤梨" instead of "草莓" for "strawberry," etc.
-#             - For Spanish: Keep "taco" in Spanish, do not forcibly translate.
-#             - Avoid offensive or extremely unnatural usage in local contexts.
-
-#             2. **Output**:
-#             - A `socio_cultural_score` (0 to 10).
-#             - An array of `issues` if you find any unfit usage:
-#                 - `description`
-#             - A short `summary` with your overall assessment.
-#             given the code-switched text {data_translation_result}.
-#             """,
-#         )
-#     ]
-# )
-
-
-REFINER_PROMPT = ChatPromptTemplate.from_messages(
-    [
-        (
-            "assistant",
-            """
-            You are **RefinerAgent**. Your task is to refine the code-switched text based on the comments from TranslationAccuracyAgent, FluencyAgent, NaturalnessAgent, and SocioCulturalAgent, while
-            maintaining the main purpose of producing a code-switched text:
-            
-            1. **Accuracy**:
-            - Check for semantic errors between the original and code-switched text. Prioritise accuracy above all.
-
-            2. **Fluency**:
-            - Check for grammatical errors or unnatural mixing of word orders between the matrix and embedded languages.
-            
-            3. **Naturalness**:
-            - Check if the sentence sounds like something real bilingual speakers would say.
-
-            Here are the comments : {summary}
-            
-
-            
-            Follow these guidelines:
-
-            1. Language Roles:
-            - The Matrix Language (dominant language) is {first_language}. 
-            - The Embedded Language (secondary language) is {second_language}.
-
-            2. Intrasentential Code-Switching :
-              - Within a single sentence, embed a short phrase or clause in {second_language} (e.g., for an object, an adjective, or a common expression).
-              - Remember to maintain grammatical coherence; e.g., do not place a determiner in a position that violates the word order rules of the main language.
-              - This can be in the form of insertional code-switching: incorporation of specific lexical elements into a matrix language such as single words or short phrases
-              - **Focus on switching adjectives and nouns**
-                Examples: Chinese to English,“我老是去那家 coffee shop，因为那里真的很 peaceful，而且vibe也不错。”(Chinese sentence about the son, then an English statement.)
-                Examples: English to Spanish, Original Sentence: "The student read the book in the reference room.", New Sentence:El estudiante leyó el libro en el reference room.
-                Examples: English to Spanish, Original Sentence: "I met up with my buddies at the party.", New Sentence: "I met up with my compadres at the fiesta."
-            - This can also be in the form of more syntactically complex alternational codeswitches at grammatical clause boundaries 
-                Examples: English to Spanish, Original Sentence: "But my printer doesn’t work.", New Sentence: "Pero mi printer no funciona."
-                Examples: English to Spanish, Original Sentence: "You can’t do it because you can’t check it.", New Sentence: "No la puedes hacer because you can’t check it."
-             
-            3. Utilise Lexical Substitution
-            - If a direct translation of the verb creates unnatural grammar, try changing the word choice to a similar word or switch the whole verb phrase.
-
-            4. Ensure your output follows these constraints:
-            - Do not add any additional words to the original {hypothesis}.
-            - Pronouns (subject/object), determiners, articles, and any other system morphemes MUST NOT appear in the Embedded Language unless the ENTIRE clause or phrase containing them is also switched into the Embedded Language.
-            - Switch must respect each language’s grammar constraints (like subject-verb-object ordering, morphological rules, etc.).
-            - The syntax remains correct in both languages. (Observe free morpheme constraint & equivalence constraint.)
-            - Make it sound natural to bilingual speakers (avoid unnatural mixing).
-            - The order of words must follow the Matrix Language rules.
-            - The final sentence must mean EXACTLY the same thing as the input sentence.
-
-            5. Output must be the generated code-switched sentence in string format
-    
-           Think carefully and produce your code-switched text using the comments and guidelines provided.
-            
-            ### INTERNAL (do NOT reveal):
-            1. Parse the {first_language} sentence input: {hypothesis} into a dependency tree.
-            2. Translate it into {second_language}.
-            3. Align tokens between the two sentences.
-            4. Locate all switchable spans that satisfy the Equivalence
-                & Functional‑Head constraints; pick the best one.
-            – Keep all intermediate notes private. 
-            ### END INTERNAL
-            """,
-        )
-    ]
+COMPACT_REFINER_PROMPT = _cached_layout(
+    COMPACT_CODE_SWITCHING_GUIDELINES + COMPACT_REFINER_TASK,
+    LANGUAGE_ROLES + "\nOriginal input: {hypothesis}\nHere are the comments : {summary}",
 )
+
+COMPACT_ACCURACY_PROMPT = _cached_layout(
+    """
+You are **TranslationAccuracyAgent**. Rate meaning preservation from the original to the code-switched text (0 to 10).
+Look for tense/aspect changes and MQM errors: Addition, Omission, Mistranslation, Overtranslation, Undertranslation.
+Output `accuracy_score`, `errors` (description -> error type) and a one-sentence `summary`.
+""",
+    ORIGINAL_AND_TRANSLATION,
+)
+
+COMPACT_FLUENCY_PROMPT = _cached_layout(
+    """
+You are **FluencyAgent**. Rate the grammaticality of the code-switched text (0 to 10), checking Poplack's
+Free Morpheme and Equivalence constraints and the word order of both languages.
+Output `fluency_score`, `errors` (description -> constraint violated) and a one-sentence `summary`.
+""",
+    TRANSLATION_ONLY,
+)
+
+COMPACT_NATURALNESS_PROMPT = _cached_layout(
+    """
+You are **NaturalnessAgent**. Rate how natural the code-switched text sounds to bilingual speakers (0 to 10),
+considering intra-sentential and tag switching (Auer, 1998).
+Output `naturalness_score`, `observations` (phrase -> issue) and a one-sentence `summary`.
+""",
+    TRANSLATION_ONLY,
+)
+
+COMPACT_FUSED_EVALUATION_PROMPT = _cached_layout(
+    """
+You are **EvaluationAgent**. Score the code-switched text on three independent dimensions, each 0 to 10:
+- `accuracy_result`: meaning preservation (MQM: Addition, Omission, Mistranslation, Over/Undertranslation); `accuracy_score`, `errors`, `summary`.
+- `fluency_result`: grammar and Poplack's constraints; `fluency_score`, `errors`, `summary`.
+- `naturalness_result`: how natural it sounds to bilinguals; `naturalness_score`, `observations`, `summary`.
+Score each dimension on its own.
+""",
+    ORIGINAL_AND_TRANSLATION,
+)
+
+PROMPT_VARIANTS = ("standard", "compact")
+_COMPACT = {
+    id(DATA_TRANSLATION_PROMPT): COMPACT_DATA_TRANSLATION_PROMPT,
+    id(CANDIDATE_TRANSLATION_PROMPT): COMPACT_CANDIDATE_TRANSLATION_PROMPT,
+    id(REFINER_PROMPT): COMPACT_REFINER_PROMPT,
+    id(ACCURACY_PROMPT): COMPACT_ACCURACY_PROMPT,
+    id(FLUENCY_PROMPT): COMPACT_FLUENCY_PROMPT,
+    id(NATURALNESS_PROMPT): COMPACT_NATURALNESS_PROMPT,
+    id(FUSED_EVALUATION_PROMPT): COMPACT_FUSED_EVALUATION_PROMPT,
+}
+_variant = "standard"
+
+
+def configure_prompts(prompts_config: dict | None) -> str:
+    """Apply the `prompts` config section; returns the selected variant."""
+    global _variant
+    variant = (prompts_config or {}).get("variant", "standard")
+    if variant not in PROMPT_VARIANTS:
+        raise ValueError(f"Unknown prompt variant {variant!r}, expected one of {PROMPT_VARIANTS}")
+    _variant = variant
+    return _variant
+
+
+def resolve_prompt(template):
+    """The template to send for `template` under the selected variant (itself when it has no variant)."""
+    if _variant == "compact":
+        return _COMPACT.get(id(template), template)
+    return template
+
+
+def prompt_templates() -> dict:
+    """Every template in this module by name, compact variants included."""
+    return {
+        name: value for name, value in globals().items()
+        if name.endswith("_PROMPT") and isinstance(value, ChatPromptTemplate)
+    }
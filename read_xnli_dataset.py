@@ -1,6 +1,14 @@
 import pandas as pd
 import csv
+import hashlib
 import json
+import os
+import msgpack
+import zstandard
+
+SNAPSHOT_DIR = "cache"
+SNAPSHOT_VERSION = 1
+COLUMNS = ("premise", "hypo", "label")
 
 class XNLIDataLoader():
     """
@@ -16,61 +24,130 @@ class XNLIDataLoader():
         max_length (int): Maximum sequence length for tokenization.
         LABEL2ID (dict): Mapping from textual labels to integer IDs.
         ID2LABEL (dict): Reverse mapping from integer IDs to textual labels.
-        data (pd.DataFrame): The loaded and preprocessed dataset.
+        data (pd.DataFrame): The loaded and preprocessed dataset, read on first access.
+        snapshot_path (str | None): Cached premise/hypo/label table for this file and
+            language; None disables the snapshot.
     """
     def __init__(
         self,
         lang="en",
         test_path="xnli.test.tsv",
         max_length=1024,
-        subset = 1.0  # 0~1
+        subset = 1.0,  # 0~1
+        snapshot_dir=SNAPSHOT_DIR,
     ):
         self.lang = lang
+        self.test_path = test_path
         self.max_length = max_length
+        self.subset = subset
         self.LABEL2ID = {"entailment": 0, "contradictory": 1, "neutral": 2}
         self.ID2LABEL = {v: k for k, v in self.LABEL2ID.items()}
+        self.snapshot_path = None
+        if snapshot_dir is not None:
+            name = os.path.splitext(os.path.basename(test_path))[0]
+            self.snapshot_path = os.path.join(snapshot_dir, f"{name}.{lang}.snapshot")
+        self._data = None
+
+    @property
+    def data(self) -> pd.DataFrame:
+        if self._data is None:
+            self._data = self._load()
+        return self._data
+
+    def _load(self):
+        columns = self.load_snapshot()
+        if columns is None:
+            columns = self.read_xnli_tsv(self.test_path)
+            self.save_snapshot(columns)
+        df = pd.DataFrame(columns, columns=list(COLUMNS))
 
-        path = test_path
-        df = self.read_xnli_tsv(path)
-        df = df[df['language']==lang].copy()
-        keep_cols = ['sentence1', 'sentence2', 'gold_label']
-        df = df[keep_cols].dropna()
-        df.rename(columns={'sentence1':'premise','sentence2':'hypo','gold_label':'label'}, inplace=True)
-        df['label'] = df['label'].replace({'contradiction': 'contradictory'})
-    
         original_num = len(df)
-        if subset < 1.0:
-            n = max(1, int(len(df) * subset))
+        if self.subset < 1.0:
+            n = max(1, int(len(df) * self.subset))
             df = df.iloc[:n].reset_index(drop=True)
         subset_num = len(df)
-
-        self.data = df.reset_index(drop=True)
-        print(f"Dataset initialized:  lang='{lang}', total={original_num}, subset={subset}, subset_count={subset_num}")
+        print(f"Dataset initialized:  lang='{self.lang}', total={original_num}, subset={self.subset}, subset_count={subset_num}")
+        return df.reset_index(drop=True)
 
     def read_xnli_tsv(self, path):
         """
-        Read an XNLI TSV file and return it as a pandas DataFrame.
+        Stream an XNLI TSV file, keeping only rows of `self.lang`.
 
         Args:
             path (str): Path to the TSV file.
-            split (str): One of "train", "dev", "test" indicating the dataset split.
 
         Returns:
-            pd.DataFrame: The dataset as a DataFrame with appropriate columns.
+            dict: {"premise": [...], "hypo": [...], "label": [...]} for the language,
+            with "contradiction" labels renamed to "contradictory".
         """
-
+        columns = {name: [] for name in COLUMNS}
         with open(path, "r", encoding="utf-8") as f:
             reader = csv.reader(f, delimiter="\t")
-            rows = list(reader)
-        header = rows[0]
-        expected_cols = len(header)
-        data = []
-        for i, row in enumerate(rows[1:], start=2):
-            if len(row) == expected_cols:
-                data.append(row)
-            else:
-                print(f"skip row {i}: {len(row)} cols → {row[:2]}")
-        return pd.DataFrame(data, columns=header)
+            header = next(reader)
+            expected_cols = len(header)
+            language = header.index("language")
+            premise = header.index("sentence1")
+            hypo = header.index("sentence2")
+            label = header.index("gold_label")
+            for i, row in enumerate(reader, start=2):
+                if len(row) != expected_cols:
+                    print(f"skip row {i}: {len(row)} cols → {row[:2]}")
+                    continue
+                if row[language] != self.lang:
+                    continue
+                columns["premise"].append(row[premise])
+                columns["hypo"].append(row[hypo])
+                columns["label"].append(
+                    "contradictory" if row[label] == "contradiction" else row[label]
+                )
+        return columns
+
+    def _source_fingerprint(self, with_hash=True):
+        stat = os.stat(self.test_path)
+        fingerprint = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        if with_hash:
+            with open(self.test_path, "rb") as f:
+                fingerprint["sha1"] = hashlib.file_digest(f, "sha1").hexdigest()
+        return fingerprint
+
+    def load_snapshot(self):
+        """
+        Columns from the snapshot if it still matches the source file, else None.
+        An unchanged mtime and size is trusted as is; otherwise the content hash decides
+        (a touched or copied file keeps its snapshot).
+        """
+        if self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                snapshot = msgpack.unpackb(zstandard.ZstdDecompressor().decompress(f.read()))
+            source = snapshot["source"]
+            if snapshot["version"] != SNAPSHOT_VERSION or snapshot["lang"] != self.lang:
+                return None
+            current = self._source_fingerprint(with_hash=False)
+            if (current["mtime_ns"], current["size"]) != (source["mtime_ns"], source["size"]):
+                if self._source_fingerprint()["sha1"] != source["sha1"]:
+                    return None
+                self.save_snapshot(snapshot["columns"])
+            return snapshot["columns"]
+        except Exception as e:
+            print(f"[WARN] ignoring unreadable snapshot {self.snapshot_path}: {e}")
+            return None
+
+    def save_snapshot(self, columns):
+        if self.snapshot_path is None:
+            return
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "lang": self.lang,
+            "source": self._source_fingerprint(),
+            "columns": columns,
+        }
+        os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+        tmp_file = f"{self.snapshot_path}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(zstandard.ZstdCompressor().compress(msgpack.packb(snapshot)))
+        os.replace(tmp_file, self.snapshot_path)
     def get_hypotheses_json(self):
         """
         Returns the data as a list of dictionaries containing only the 'hypo' key.
@@ -0,0 +1,361 @@
+"""
+Compact binary store for accepted records, with columnar and TSV export.
+
+    python record_store.py convert data_output/Vietnamese.jsonl             # -> data_output/Vietnamese.records
+    python record_store.py columns data_output/Vietnamese.records           # -> data_output/Vietnamese.cols
+    python record_store.py tsv data_output/Vietnamese.cols --out data_output/cs_Vietnamese_test.tsv
+    python record_store.py get data_output/Vietnamese.records "The cat sat on the mat."
+
+A `.records` file is what the output sink writes with `output: {format: records}`:
+normalized records (the state minus `summary` and other derived keys) packed
+with msgpack into zstd-compressed chunks, one chunk per sink batch, plus a
+`.records.idx` SQLite index from scenario_key / hypothesis to the chunk, so a
+single record is read by decompressing one chunk. A `.cols` file holds the
+same records column by column, in row groups; readers load only the columns
+they ask for (the TSV export needs two).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import struct
+import threading
+import jsonlines
+import msgpack
+import pandas as pd
+import zstandard
+from run_manifest import scenario_key, hypo_text
+
+RECORDS_SUFFIX = ".records"
+COLUMNS_SUFFIX = ".cols"
+DEFAULT_COMPRESSION_LEVEL = 3
+DEFAULT_ROW_GROUP_SIZE = 4096
+# state keys rebuilt from (or only meaningful during) the run; `summary` repeats every evaluator result
+DERIVED_KEYS = ("summary", "evaluated_inputs", "candidates")
+# chunk frame: compressed payload size, record count
+FRAME_HEADER = struct.Struct("<II")
+COLUMNS_MAGIC = b"CSCOLS1\n"
+FOOTER_SIZE = struct.Struct("<Q")
+
+
+def normalize(state) -> dict:
+    """The stored form of an accepted state: no derived keys, no empty values."""
+    return {key: value for key, value in state.items() if key not in DERIVED_KEYS and value is not None}
+
+
+def pack_chunk(records, compressor) -> bytes:
+    payload = compressor.compress(msgpack.packb(records, use_bin_type=True))
+    return FRAME_HEADER.pack(len(payload), len(records)) + payload
+
+
+def unpack_chunk(payload, decompressor) -> list:
+    return msgpack.unpackb(decompressor.decompress(payload), raw=False)
+
+
+class RecordStore:
+    """
+    Append-only file of zstd-compressed msgpack chunks with a SQLite index.
+
+    Each `append` writes one chunk as a frame (8-byte header, compressed
+    msgpack array of normalized records). `{path}.idx` maps every
+    scenario_key to (chunk offset, position) and keeps its hypothesis, so
+    `get` decompresses a single chunk; a later record for the same scenario
+    replaces the earlier one in the index. The store quacks like a binary
+    file for the output sink (flush, fileno, close). On open, chunks written
+    but not indexed (a crash between the two) are indexed and a torn trailing
+    chunk is cut off.
+
+    Attributes:
+        path (str): Data file.
+        level (int): zstd compression level.
+    """
+    def __init__(self, path, level=DEFAULT_COMPRESSION_LEVEL):
+        self.path = path
+        self.level = level
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._fh = open(path, "a+b")
+        self._conn = sqlite3.connect(f"{path}.idx", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS records "
+            "(key TEXT PRIMARY KEY, hypo TEXT, offset INTEGER, position INTEGER)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS records_hypo ON records (hypo)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.commit()
+        self._chunk_cache = (None, None)
+        self._end = self._recover()
+
+    def _indexed_end(self) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'end'").fetchone()
+        return row[0] if row else 0
+
+    def _index(self, offset, records, end):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO records (key, hypo, offset, position) VALUES (?, ?, ?, ?)",
+            [(scenario_key(r), hypo_text(r), offset, i) for i, r in enumerate(records)],
+        )
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('end', ?)", (end,))
+        self._conn.commit()
+
+    def _recover(self) -> int:
+        size = os.path.getsize(self.path)
+        end = self._indexed_end()
+        if end > size:
+            # the index outlived unsynced data: rebuild it from the file
+            self._conn.execute("DELETE FROM records")
+            end = 0
+        while end < size:
+            self._fh.seek(end)
+            header = self._fh.read(FRAME_HEADER.size)
+            length = FRAME_HEADER.unpack(header)[0] if len(header) == FRAME_HEADER.size else None
+            payload = self._fh.read(length) if length is not None else b""
+            if length is None or len(payload) < length:
+                self._fh.truncate(end)
+                break
+            next_end = end + FRAME_HEADER.size + length
+            self._index(end, unpack_chunk(payload, self._decompressor), next_end)
+            end = next_end
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('end', ?)", (end,))
+        self._conn.commit()
+        return end
+
+    def append(self, records) -> int:
+        """Write `records` as one chunk and index them; returns the chunk offset."""
+        records = [normalize(r) for r in records]
+        frame = pack_chunk(records, self._compressor)
+        with self._lock:
+            offset = self._end
+            self._fh.seek(offset)
+            self._fh.write(frame)
+            self._end = offset + len(frame)
+            self._index(offset, records, self._end)
+        return offset
+
+    def _chunk(self, offset) -> list:
+        cached_offset, records = self._chunk_cache
+        if cached_offset == offset:
+            return records
+        self._fh.flush()
+        self._fh.seek(offset)
+        length = FRAME_HEADER.unpack(self._fh.read(FRAME_HEADER.size))[0]
+        records = unpack_chunk(self._fh.read(length), self._decompressor)
+        self._chunk_cache = (offset, records)
+        return records
+
+    def get(self, hypothesis) -> dict | None:
+        """The latest record for a hypothesis text, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT offset, position FROM records WHERE hypo = ? ORDER BY offset DESC LIMIT 1",
+                (hypothesis,),
+            ).fetchone()
+            return self._chunk(row[0])[row[1]] if row else None
+
+    def get_key(self, key) -> dict | None:
+        """The record of a scenario_key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT offset, position FROM records WHERE key = ?", (key,)).fetchone()
+            return self._chunk(row[0])[row[1]] if row else None
+
+    def keys(self) -> set:
+        return {row[0] for row in self._conn.execute("SELECT key FROM records")}
+
+    def hypos(self) -> set:
+        return {row[0] for row in self._conn.execute("SELECT DISTINCT hypo FROM records") if row[0]}
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def __iter__(self):
+        """Every stored record in write order (superseded ones included), one chunk in memory at a time."""
+        with open(self.path, "rb") as fh:
+            while True:
+                header = fh.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    return
+                payload = fh.read(FRAME_HEADER.unpack(header)[0])
+                yield from unpack_chunk(payload, self._decompressor)
+
+    def flush(self):
+        self._fh.flush()
+
+    def fileno(self) -> int:
+        return self._fh.fileno()
+
+    def close(self):
+        self._fh.close()
+        self._conn.close()
+
+
+def read_records(path):
+    """Records of a `.jsonl` or `.records` file, streamed; nothing when the file does not exist."""
+    if not os.path.exists(path):
+        return
+    if path.endswith(RECORDS_SUFFIX):
+        store = RecordStore(path)
+        try:
+            yield from store
+        finally:
+            store.close()
+        return
+    with jsonlines.open(path, "r") as reader:
+        yield from reader.iter(skip_invalid=True)
+
+
+def convert_jsonl(jsonl_file, store_path=None, chunk_size=64, level=DEFAULT_COMPRESSION_LEVEL) -> int:
+    """Append every record of a JSONL output file to a record store; returns the count."""
+    store = RecordStore(store_path or os.path.splitext(jsonl_file)[0] + RECORDS_SUFFIX, level)
+    count = 0
+    chunk = []
+    try:
+        for record in read_records(jsonl_file):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                store.append(chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            store.append(chunk)
+            count += len(chunk)
+        store.flush()
+        os.fsync(store.fileno())
+    finally:
+        store.close()
+    return count
+
+
+def flatten(record) -> dict:
+    """One row per record: nested results become "{key}.{field}" columns."""
+    row = {}
+    for key, value in record.items():
+        if isinstance(value, dict):
+            for field, field_value in value.items():
+                row[f"{key}.{field}"] = field_value
+        else:
+            row[key] = value
+    return row
+
+
+def write_columns(records, path, row_group_size=DEFAULT_ROW_GROUP_SIZE, level=DEFAULT_COMPRESSION_LEVEL) -> int:
+    """
+    Write flattened records column by column. Every row group stores each of
+    its columns as one zstd-compressed msgpack array; a msgpack footer lists
+    the columns and chunk locations. Returns the number of rows.
+    """
+    compressor = zstandard.ZstdCompressor(level=level)
+    columns = []
+    row_groups = []
+    rows = 0
+    tmp_file = f"{path}.tmp"
+    with open(tmp_file, "wb") as fh:
+        fh.write(COLUMNS_MAGIC)
+
+        def write_group(group):
+            names = list(dict.fromkeys(name for row in group for name in row))
+            chunks = {}
+            for name in names:
+                data = compressor.compress(msgpack.packb([row.get(name) for row in group], use_bin_type=True))
+                chunks[name] = [fh.tell(), len(data)]
+                fh.write(data)
+            columns.extend(name for name in names if name not in columns)
+            row_groups.append({"rows": len(group), "chunks": chunks})
+
+        group = []
+        for record in records:
+            group.append(flatten(normalize(record)))
+            if len(group) >= row_group_size:
+                write_group(group)
+                rows += len(group)
+                group = []
+        if group:
+            write_group(group)
+            rows += len(group)
+        footer = msgpack.packb({"columns": columns, "row_groups": row_groups}, use_bin_type=True)
+        fh.write(footer)
+        fh.write(FOOTER_SIZE.pack(len(footer)))
+        fh.write(COLUMNS_MAGIC)
+    os.replace(tmp_file, path)
+    return rows
+
+
+def column_names(path) -> list[str]:
+    return _read_footer(path)["columns"]
+
+
+def _read_footer(path) -> dict:
+    with open(path, "rb") as fh:
+        fh.seek(-(FOOTER_SIZE.size + len(COLUMNS_MAGIC)), os.SEEK_END)
+        length = FOOTER_SIZE.unpack(fh.read(FOOTER_SIZE.size))[0]
+        if fh.read(len(COLUMNS_MAGIC)) != COLUMNS_MAGIC:
+            raise ValueError(f"{path} is not a columns file")
+        fh.seek(-(length + FOOTER_SIZE.size + len(COLUMNS_MAGIC)), os.SEEK_END)
+        return msgpack.unpackb(fh.read(length), raw=False)
+
+
+def read_columns(path, columns=None) -> dict[str, list]:
+    """{column: values} for the requested columns (all by default); only their chunks are read."""
+    footer = _read_footer(path)
+    columns = footer["columns"] if columns is None else list(columns)
+    decompressor = zstandard.ZstdDecompressor()
+    values = {name: [] for name in columns}
+    with open(path, "rb") as fh:
+        for group in footer["row_groups"]:
+            for name in columns:
+                location = group["chunks"].get(name)
+                if location is None:
+                    values[name].extend([None] * group["rows"])
+                    continue
+                fh.seek(location[0])
+                values[name].extend(msgpack.unpackb(decompressor.decompress(fh.read(location[1])), raw=False))
+    return values
+
+
+def to_dataframe(path, columns=None):
+    """A pandas DataFrame of the requested columns of a `.cols` file."""
+    return pd.DataFrame(read_columns(path, columns))
+
+
+def main(args):
+    if args.command == "convert":
+        out = args.out or os.path.splitext(args.path)[0] + RECORDS_SUFFIX
+        count = convert_jsonl(args.path, out, level=args.level)
+        print(f"Converted {count} records: {os.path.getsize(args.path)} -> {os.path.getsize(out)} bytes in {out}")
+    elif args.command == "columns":
+        out = args.out or os.path.splitext(args.path)[0] + COLUMNS_SUFFIX
+        rows = write_columns(read_records(args.path), out, level=args.level)
+        print(f"Wrote {rows} rows x {len(column_names(out))} columns to {out}")
+    elif args.command == "tsv":
+        from read_xnli_dataset import XNLIDataLoader
+        from tsv_exporter import TSVExporter
+        loader = XNLIDataLoader(lang="en", test_path="xnli.test.tsv")
+        TSVExporter(args.out, loader).materialize(args.path)
+    elif args.command == "get":
+        store = RecordStore(args.path)
+        try:
+            print(json.dumps(store.get(args.hypothesis), ensure_ascii=False, indent=2))
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="JSONL output file -> record store")
+    convert.add_argument("path")
+    columns = commands.add_parser("columns", help="JSONL or record store -> columns file")
+    columns.add_argument("path")
+    for command in (convert, columns):
+        command.add_argument("--out")
+        command.add_argument("--level", type=int, default=DEFAULT_COMPRESSION_LEVEL, help="zstd level")
+    tsv = commands.add_parser("tsv", help="export the XNLI TSV from a columns, record store or JSONL file")
+    tsv.add_argument("path")
+    tsv.add_argument("--out", required=True)
+    get = commands.add_parser("get", help="print the record of one hypothesis")
+    get.add_argument("path")
+    get.add_argument("hypothesis")
+    main(parser.parse_args())
@@ -0,0 +1,326 @@
+import asyncio
+import inspect
+import time
+from collections import deque
+import openai
+from loguru import logger
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+# defaults of the `resilience` config section
+DEFAULT_ATTEMPT_TIMEOUT = 60.0
+DEFAULT_CALL_DEADLINE = 180.0
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 30.0
+DEFAULT_HEDGE_QUANTILE = 0.95
+DEFAULT_HEDGE_MIN_SAMPLES = 50
+DEFAULT_HEDGE_MAX_FRACTION = 0.05
+DEFAULT_LATENCY_WINDOW = 500
+DEFAULT_FAILURE_RATE = 0.5
+DEFAULT_MIN_CALLS = 20
+DEFAULT_FAILURE_WINDOW = 30.0
+DEFAULT_COOLDOWN = 30.0
+DEFAULT_DRAIN_TIMEOUT = 60.0
+
+# failures worth another attempt; anything else (bad request, auth, parsing) is final
+RETRYABLE = (
+    TimeoutError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, RETRYABLE)
+
+
+class CircuitBreaker:
+    """
+    Pauses every LLM call while the provider is failing.
+
+    Outcomes of the calls over the last `window` seconds are kept; once there
+    are at least `min_calls` of them and `failure_rate` or more failed with a
+    retryable error, the breaker opens and callers wait out `cooldown`. Then one
+    probe call goes through (half-open): only its outcome closes the breaker,
+    or opens it again. Every opening starts a new generation, and outcomes of
+    calls admitted in an earlier one are ignored, so stragglers that were
+    already in flight can neither reopen nor close it.
+
+    Attributes:
+        failure_rate (float): Share of failed calls in the window that opens the breaker.
+        min_calls (int): Calls the window needs before the rate is trusted.
+        window (float): Seconds of outcomes considered.
+        cooldown (float): Seconds the breaker stays open.
+        generation (int): Incremented every time the breaker opens.
+        opened (int): Times the breaker has opened.
+    """
+    def __init__(
+        self, failure_rate=DEFAULT_FAILURE_RATE, min_calls=DEFAULT_MIN_CALLS,
+        window=DEFAULT_FAILURE_WINDOW, cooldown=DEFAULT_COOLDOWN,
+    ):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.generation = 0
+        self.opened = 0
+        # (monotonic time, failed) per call outcome in the window
+        self._outcomes: deque = deque()
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        self._closed = asyncio.Event()
+        self._closed.set()
+
+    async def wait(self) -> tuple[int, bool]:
+        """
+        Return once a call may be sent, with the ticket to report its outcome:
+        (generation, whether this caller is the half-open probe).
+        """
+        while True:
+            await self._closed.wait()
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                continue
+            if not self._open_until:
+                return self.generation, False
+            if not self._probing:
+                # half-open: this caller probes, everyone else waits for its outcome
+                self._probing = True
+                self._closed.clear()
+                return self.generation, True
+
+    def _observe(self, failed):
+        now = time.monotonic()
+        self._outcomes.append((now, failed))
+        self._failures += failed
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, old = self._outcomes.popleft()
+            self._failures -= old
+
+    def _open(self, reason):
+        self.generation += 1
+        self.opened += 1
+        logger.warning(f"🔌 Circuit open for {self.cooldown}s: {reason}")
+        self._open_until = time.monotonic() + self.cooldown
+        self._probing = False
+        self._outcomes.clear()
+        self._failures = 0
+        # waiters sleep out the cooldown, then one of them probes
+        self._closed.set()
+
+    def success(self, ticket):
+        """The call got an answer from the provider (an error answer counts too)."""
+        generation, probe = ticket
+        if generation != self.generation:
+            return
+        if probe:
+            self._open_until = 0.0
+            self._probing = False
+            self._closed.set()
+        elif not self._open_until:
+            self._observe(False)
+
+    def failure(self, ticket):
+        """The call failed with a retryable error."""
+        generation, probe = ticket
+        if generation != self.generation:
+            return
+        if probe:
+            self._open("the probe call failed")
+        elif not self._open_until:
+            self._observe(True)
+            if len(self._outcomes) >= self.min_calls and self._failures >= self.failure_rate * len(self._outcomes):
+                self._open(f"{self._failures}/{len(self._outcomes)} calls failed in the last {self.window}s")
+
+    def release_probe(self, ticket):
+        """The probe was cancelled without an outcome; let another caller probe."""
+        generation, probe = ticket
+        if probe and generation == self.generation:
+            self._probing = False
+            self._closed.set()
+
+
+class CallPolicy:
+    """
+    Deadlines, jittered exponential retry, hedging and a circuit breaker around
+    each LLM call (see StructuredAgent.ainvoke).
+
+    Every attempt gets `attempt_timeout` seconds; the whole call, retries and
+    backoff included, gets `call_deadline`. Once an agent has `hedge_min_samples`
+    latencies, an attempt still running at their `hedge_quantile` gets a
+    duplicate request and the first answer wins; at most `hedge_max_fraction`
+    of calls are hedged.
+
+    Attributes:
+        attempt_timeout (float): Seconds per HTTP attempt.
+        call_deadline (float): Seconds per call including retries.
+        max_attempts (int): Attempts per call.
+        backoff_base (float): Exponential backoff multiplier, seconds.
+        backoff_max (float): Backoff cap, seconds.
+        hedge (bool): Whether slow attempts are hedged.
+        node_deadline (float | None): Seconds per graph node (see with_deadline).
+        drain_timeout (float): Seconds in-flight scenarios get to finish after the run deadline.
+        breaker (CircuitBreaker): Shared by every agent.
+    """
+    def __init__(
+        self, attempt_timeout=DEFAULT_ATTEMPT_TIMEOUT, call_deadline=DEFAULT_CALL_DEADLINE,
+        max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_base=DEFAULT_BACKOFF_BASE,
+        backoff_max=DEFAULT_BACKOFF_MAX, hedge=True, hedge_quantile=DEFAULT_HEDGE_QUANTILE,
+        hedge_min_samples=DEFAULT_HEDGE_MIN_SAMPLES, hedge_max_fraction=DEFAULT_HEDGE_MAX_FRACTION,
+        latency_window=DEFAULT_LATENCY_WINDOW, node_deadline=None,
+        drain_timeout=DEFAULT_DRAIN_TIMEOUT, breaker=None,
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.call_deadline = call_deadline
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_max_fraction = hedge_max_fraction
+        self.latency_window = latency_window
+        self.node_deadline = node_deadline
+        self.drain_timeout = drain_timeout
+        self.breaker = breaker or CircuitBreaker()
+        self._latencies: dict[str, deque] = {}
+        self.calls = 0
+        self.retries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    @classmethod
+    def from_config(cls, resilience_config: dict):
+        hedge = resilience_config.get("hedge") or {}
+        breaker = resilience_config.get("circuit_breaker") or {}
+        return cls(
+            attempt_timeout=resilience_config.get("attempt_timeout", DEFAULT_ATTEMPT_TIMEOUT),
+            call_deadline=resilience_config.get("call_deadline", DEFAULT_CALL_DEADLINE),
+            max_attempts=resilience_config.get("max_attempts", DEFAULT_MAX_ATTEMPTS),
+            backoff_base=resilience_config.get("backoff_base", DEFAULT_BACKOFF_BASE),
+            backoff_max=resilience_config.get("backoff_max", DEFAULT_BACKOFF_MAX),
+            hedge=hedge.get("enabled", True),
+            hedge_quantile=hedge.get("quantile", DEFAULT_HEDGE_QUANTILE),
+            hedge_min_samples=hedge.get("min_samples", DEFAULT_HEDGE_MIN_SAMPLES),
+            hedge_max_fraction=hedge.get("max_fraction", DEFAULT_HEDGE_MAX_FRACTION),
+            node_deadline=resilience_config.get("node_deadline"),
+            drain_timeout=resilience_config.get("drain_timeout", DEFAULT_DRAIN_TIMEOUT),
+            breaker=CircuitBreaker(
+                failure_rate=breaker.get("failure_rate", DEFAULT_FAILURE_RATE),
+                min_calls=breaker.get("min_calls", DEFAULT_MIN_CALLS),
+                window=breaker.get("window", DEFAULT_FAILURE_WINDOW),
+                cooldown=breaker.get("cooldown", DEFAULT_COOLDOWN),
+            ),
+        )
+
+    def hedge_delay(self, name) -> float | None:
+        """Seconds after which an attempt of `name` is hedged, None when it should not be."""
+        samples = self._latencies.get(name)
+        if not self.hedge or samples is None or len(samples) < self.hedge_min_samples:
+            return None
+        if self.hedged >= self.hedge_max_fraction * self.calls:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(self.hedge_quantile * len(ordered)))]
+
+    async def _attempt(self, send):
+        async with asyncio.timeout(self.attempt_timeout):
+            return await send()
+
+    async def _hedged(self, name, send):
+        started = time.monotonic()
+        delay = self.hedge_delay(name)
+        first = asyncio.create_task(self._attempt(send))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedged += 1
+                tasks.append(asyncio.create_task(self._attempt(send)))
+            error = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is not None:
+                        # the other request may still answer
+                        error = task.exception()
+                        continue
+                    if task is not first:
+                        self.hedge_wins += 1
+                    self._latencies.setdefault(name, deque(maxlen=self.latency_window)).append(
+                        time.monotonic() - started
+                    )
+                    return task.result()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, name, send):
+        """Run `send()` (one HTTP attempt) under the policy and return its result."""
+        self.calls += 1
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_random_exponential(multiplier=self.backoff_base, max=self.backoff_max),
+            retry=retry_if_exception(is_retryable),
+            reraise=True,
+        )
+        async with asyncio.timeout(self.call_deadline):
+            async for attempt in retrying:
+                with attempt:
+                    if attempt.retry_state.attempt_number > 1:
+                        self.retries += 1
+                    ticket = await self.breaker.wait()
+                    try:
+                        result = await self._hedged(name, send)
+                    except Exception as e:
+                        # any answer from the provider, even an error one, means it is up
+                        if is_retryable(e):
+                            self.breaker.failure(ticket)
+                        else:
+                            self.breaker.success(ticket)
+                        raise
+                    except BaseException:
+                        self.breaker.release_probe(ticket)
+                        raise
+                    self.breaker.success(ticket)
+                    return result
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "circuit_opened": self.breaker.opened,
+        }
+
+
+_policy: CallPolicy | None = None
+
+
+def configure_resilience(resilience_config: dict | None) -> CallPolicy | None:
+    """Install the process-wide call policy from the `resilience` section (off unless enabled)."""
+    global _policy
+    resilience_config = resilience_config or {}
+    _policy = CallPolicy.from_config(resilience_config) if resilience_config.get("enabled", False) else None
+    return _policy
+
+
+def get_policy() -> CallPolicy | None:
+    return _policy
+
+
+def with_deadline(name, node, seconds):
+    """Wrap a graph node (sync or async) so it raises TimeoutError after `seconds`."""
+    async def wrapper(state):
+        async with asyncio.timeout(seconds):
+            result = node(state)
+            return await result if inspect.isawaitable(result) else result
+    wrapper.__name__ = name
+    return wrapper
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import jsonlines
+
+# ordered: a hypothesis only ever moves forward through these
+MANIFEST_STATUSES = ("pending", "translated", "evaluated", "accepted")
+# graph node -> status reached once that node has finished
+NODE_STATUS = {
+    "DataTranslationAgent": "translated",
+    "CandidateAgent": "translated",
+    "SummarizeResult": "evaluated",
+}
+DEFAULT_RUN_STATE_PATH = "data_output/run_state.sqlite"
+
+
+def hypo_text(state) -> str:
+    hypothesis = state.get("hypothesis", "")
+    if isinstance(hypothesis, dict):
+        return hypothesis.get("hypo", "")
+    return str(hypothesis)
+
+
+def scenario_key(state) -> str:
+    """Stable id of one (hypothesis, languages, cs_ratio) job; also the LangGraph thread id."""
+    raw = json.dumps(
+        [
+            hypo_text(state),
+            state.get("first_language"),
+            state.get("second_language"),
+            str(state.get("cs_ratio")),
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def load_accepted_hypos(jsonl_file) -> set:
+    """Hypotheses already written to data_output/{lang}.jsonl by earlier runs."""
+    if not os.path.exists(jsonl_file):
+        return set()
+    accepted = set()
+    with jsonlines.open(jsonl_file, "r") as reader:
+        for obj in reader.iter(skip_invalid=True):
+            if text := hypo_text(obj):
+                accepted.add(text)
+    return accepted
+
+
+class RunManifest:
+    """
+    Per-hypothesis progress of a run (pending -> translated -> evaluated -> accepted).
+
+    Attributes:
+        path (str): SQLite database file, shared with the checkpointer.
+    """
+    def __init__(self, path=DEFAULT_RUN_STATE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS manifest (
+                key TEXT PRIMARY KEY,
+                hypo TEXT,
+                language TEXT,
+                status TEXT NOT NULL,
+                updated REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def register(self, states):
+        """Add unseen scenarios as pending; existing rows keep their status."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO manifest VALUES (?, ?, ?, 'pending', ?)",
+                [(scenario_key(s), hypo_text(s), s.get("second_language"), now) for s in states],
+            )
+            self._conn.commit()
+
+    def mark(self, states, status):
+        """Move scenarios forward to `status` (never backwards)."""
+        rank = MANIFEST_STATUSES.index(status)
+        lower = MANIFEST_STATUSES[:rank]
+        now = time.time()
+        placeholders = ",".join("?" * len(lower))
+        with self._lock:
+            for state in states:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO manifest VALUES (?, ?, ?, 'pending', ?)",
+                    (scenario_key(state), hypo_text(state), state.get("second_language"), now),
+                )
+                if lower:
+                    self._conn.execute(
+                        f"""UPDATE manifest SET status = ?, updated = ?
+                            WHERE key = ? AND status IN ({placeholders})""",
+                        (status, now, scenario_key(state), *lower),
+                    )
+            self._conn.commit()
+
+    async def amark(self, states, status):
+        # per-node progress from the graph: keep the SQLite commit off the event loop
+        await asyncio.to_thread(self.mark, states, status)
+
+    def status(self, state):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status FROM manifest WHERE key = ?", (scenario_key(state),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM manifest GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,206 @@
+import asyncio
+import heapq
+import itertools
+import time
+from loguru import logger
+
+# lower value = served first; work for scenarios already in flight goes ahead
+# of new scenarios so admitted graphs finish instead of piling up
+PRIORITY_REFINE = 0
+PRIORITY_IN_FLIGHT = 1
+PRIORITY_NEW = 2
+
+DEFAULT_MAX_IN_FLIGHT = 64
+DEFAULT_COMPLETION_TOKENS = 256
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget shared by every LLM call.
+
+    Both budgets are token buckets refilled continuously. Waiters are served in
+    priority order (then FIFO), so a refinement call never queues behind the
+    first translation of a freshly admitted scenario.
+
+    Attributes:
+        rpm (float | None): Requests per minute, None for unlimited.
+        tpm (float | None): Tokens per minute, None for unlimited.
+    """
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm) if rpm else 0.0
+        self._tokens = float(tpm) if tpm else 0.0
+        self._last_refill = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _wait_time(self, tokens):
+        """Seconds until a request of `tokens` fits in both buckets (0 if it fits now)."""
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+        return wait
+
+    async def acquire(self, tokens=1, priority=PRIORITY_IN_FLIGHT):
+        if not self.rpm and not self.tpm:
+            return
+        if self.tpm:
+            # a single oversized prompt must still get through eventually
+            tokens = min(tokens, self.tpm)
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), tokens, future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        while self._waiters:
+            priority, seq, tokens, future = self._waiters[0]
+            if future.cancelled():
+                heapq.heappop(self._waiters)
+                continue
+            self._refill()
+            wait = self._wait_time(tokens)
+            if wait <= 0:
+                heapq.heappop(self._waiters)
+                if self.rpm:
+                    self._requests -= 1
+                if self.tpm:
+                    self._tokens -= tokens
+                future.set_result(None)
+                continue
+            # sleep until the head fits, or until a higher-priority waiter arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+
+_rate_limiter: RateLimiter | None = None
+_completion_tokens_estimate = DEFAULT_COMPLETION_TOKENS
+
+
+def configure_rate_limiter(scheduler_config: dict | None) -> RateLimiter | None:
+    """Install the process-wide rate limiter from the `scheduler` config section."""
+    global _rate_limiter, _completion_tokens_estimate
+    scheduler_config = scheduler_config or {}
+    rpm = scheduler_config.get("requests_per_minute")
+    tpm = scheduler_config.get("tokens_per_minute")
+    _completion_tokens_estimate = scheduler_config.get(
+        "completion_tokens_estimate", DEFAULT_COMPLETION_TOKENS
+    )
+    _rate_limiter = RateLimiter(rpm=rpm, tpm=tpm) if (rpm or tpm) else None
+    return _rate_limiter
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    return _rate_limiter
+
+
+def completion_tokens_estimate() -> int:
+    return _completion_tokens_estimate
+
+
+class Scheduler:
+    """
+    Admits scenarios from a queue with at most `max_in_flight` running at once.
+
+    Attributes:
+        max_in_flight (int): Maximum number of scenarios running concurrently.
+    """
+    def __init__(self, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.max_in_flight = max_in_flight
+
+    @classmethod
+    def from_config(cls, config: dict):
+        scheduler_config = config.get("scheduler") or {}
+        configure_rate_limiter(scheduler_config)
+        return cls(max_in_flight=scheduler_config.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT))
+
+    async def run(self, items, worker, stop: asyncio.Event | None = None, max_buffered: int | None = None):
+        """
+        Run `worker(item)` for every item and yield results as they complete.
+        `items` is a list or an async iterable (e.g. leased jobs), which is only
+        pulled from when a slot frees up. Once `stop` is set no new item is
+        admitted and the run ends when the running ones finish. Failed items
+        are logged and skipped. With `max_buffered`, at most that many results
+        wait for the caller; a slot whose result finds no room holds on to it
+        and admits nothing new until the caller catches up.
+        """
+        if hasattr(items, "__aiter__"):
+            source = aiter(items)
+            lock = asyncio.Lock()
+            slots = self.max_in_flight
+
+            async def next_item():
+                # one puller at a time; None once the source is exhausted
+                async with lock:
+                    try:
+                        return await anext(source)
+                    except StopAsyncIteration:
+                        return None
+        else:
+            queue = asyncio.Queue()
+            for item in items:
+                queue.put_nowait(item)
+            slots = min(self.max_in_flight, queue.qsize())
+
+            async def next_item():
+                try:
+                    return queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return None
+        results = asyncio.Queue()
+        room = asyncio.Semaphore(max_buffered) if max_buffered else None
+
+        async def consume():
+            try:
+                while stop is None or not stop.is_set():
+                    item = await next_item()
+                    if item is None:
+                        break
+                    try:
+                        result = await worker(item)
+                    except Exception as e:
+                        logger.error(f"🚨 Scenario failed: {e}")
+                        results.put_nowait((False, None))
+                        continue
+                    if room is not None:
+                        await room.acquire()
+                    results.put_nowait((True, result))
+            finally:
+                # consumer exhausted, stopped or cancelled
+                results.put_nowait(None)
+
+        tasks = [asyncio.create_task(consume()) for _ in range(slots)]
+        try:
+            running = len(tasks)
+            while running:
+                outcome = await results.get()
+                if outcome is None:
+                    running -= 1
+                elif outcome[0]:
+                    yield outcome[1]
+                    if room is not None:
+                        room.release()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,161 @@
+"""
+Library entry point: stream hypotheses in, accepted records out.
+
+    from contextlib import aclosing
+    from streaming import stream_results
+
+    async with aclosing(stream_results(hypotheses, config)) as records:
+        async for record in records:
+            await publisher.send(record)
+
+    python streaming.py --config config/config_zh.yaml --input hypos.txt --out records.jsonl
+
+`hypotheses` is any async iterable of hypothesis strings, {"hypo": ...} dicts
+or full AgentRunningState dicts; each is pulled only when a scheduler slot is
+free, so the input is never read ahead. A record is yielded as soon as its
+graph finishes. A slow consumer applies backpressure: once `max_buffered`
+records are waiting, finished scenarios hold their slot and nothing new is
+admitted, so memory stays bounded however long the stream runs. There is no
+run deadline unless `streaming.run_timeout` sets one. The usual output files
+are still written by AcceptanceAgent.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import jsonlines
+import agents
+from evaluators import load_evaluators
+from node_models import AgentRunningState
+from run_manifest import scenario_key, hypo_text
+from utils import load_config
+
+DEFAULT_MAX_BUFFERED = 64
+
+
+def to_scenario(hypothesis, pre_execute) -> AgentRunningState:
+    """A scenario for one input item; languages and cs_ratio default to `pre_execute`."""
+    if isinstance(hypothesis, str):
+        hypothesis = {"hypo": hypothesis}
+    if "hypothesis" in hypothesis:
+        return AgentRunningState(**{
+            "first_language": pre_execute["first_language"],
+            "second_language": pre_execute["second_language"],
+            "cs_ratio": pre_execute["cs_ratio"],
+            **hypothesis,
+        })
+    return AgentRunningState(
+        hypothesis=hypothesis,
+        first_language=pre_execute["first_language"],
+        second_language=pre_execute["second_language"],
+        cs_ratio=pre_execute["cs_ratio"],
+    )
+
+
+async def scenario_stream(hypotheses, pre_execute):
+    async for hypothesis in hypotheses:
+        yield to_scenario(hypothesis, pre_execute)
+
+
+def result_record(state, seconds, evaluators) -> dict:
+    """The consumer-facing record of one accepted scenario."""
+    translation = state.get("data_translation_result")
+    if isinstance(translation, dict):
+        translation = translation.get("translated_sentence")
+    scores = {}
+    for evaluator in evaluators:
+        result = state.get(evaluator.result_key)
+        if isinstance(result, dict):
+            scores[evaluator.name] = result.get(evaluator.score_key)
+    return {
+        "scenario": scenario_key(state),
+        "hypothesis": hypo_text(state),
+        "first_language": state.get("first_language"),
+        "second_language": state.get("second_language"),
+        "cs_ratio": state.get("cs_ratio"),
+        "translation": translation,
+        "score": state.get("score"),
+        "scores": scores,
+        "refine_count": state.get("refine_count", 0) or 0,
+        "seconds": seconds,
+        "finished_at": time.time(),
+    }
+
+
+async def stream_results(hypotheses, config=None, max_buffered=None):
+    """
+    Run every hypothesis of the async iterable `hypotheses` through the graph
+    and yield a result_record for each accepted scenario as it finishes.
+    Failed and timed-out scenarios are logged and yield nothing. Closing the
+    generator early (`async with contextlib.aclosing(...)`) cancels the run and
+    flushes the output files.
+    """
+    config = config or load_config(agents.CONFIG_PATH)
+    streaming_config = config.get("streaming") or {}
+    max_buffered = max_buffered or streaming_config.get("max_buffered", DEFAULT_MAX_BUFFERED)
+    evaluators = load_evaluators(config)
+    records = asyncio.Queue()
+    # run_scenarios waits for room while the consumer is behind, which stops admission
+    room = asyncio.Semaphore(max_buffered)
+
+    async def on_result(result):
+        if result["state"]:
+            await room.acquire()
+            records.put_nowait(result_record(result["state"], result["seconds"], evaluators))
+
+    async def run():
+        try:
+            await agents.run_scenarios(
+                config, scenario_stream(hypotheses, config["pre_execute"]),
+                on_result=on_result, max_buffered=max_buffered,
+                # a long-lived stream has no natural end; agents.RUN_TIMEOUT is for batch runs
+                run_timeout=streaming_config.get("run_timeout"),
+            )
+        finally:
+            # the end-of-stream marker needs no room, so a cancelled run never blocks here
+            records.put_nowait(None)
+
+    runner = asyncio.create_task(run())
+    try:
+        while (record := await records.get()) is not None:
+            yield record
+            room.release()
+        # re-raise whatever ended the run
+        await runner
+    finally:
+        if not runner.done():
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+
+
+async def read_lines(path):
+    """Non-empty lines of `path` ("-" for stdin) as hypotheses."""
+    handle = sys.stdin if path == "-" else open(path, "r", encoding="utf-8")
+    try:
+        for line in handle:
+            if line.strip():
+                yield line.strip()
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+async def main(args):
+    config = load_config(args.config)
+    count = 0
+    with jsonlines.open(args.out, "w", flush=True, dumps=lambda r: json.dumps(r, ensure_ascii=False)) as writer:
+        async for record in stream_results(read_lines(args.input), config, args.max_buffered):
+            writer.write(record)
+            count += 1
+    print(f"Streamed {count} records to {args.out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=agents.CONFIG_PATH)
+    parser.add_argument("--input", default="-", help="one hypothesis per line (default: stdin)")
+    parser.add_argument("--out", required=True, help="JSONL file the records are written to as they finish")
+    parser.add_argument("--max-buffered", type=int,
+                        help="records held for a slow consumer (default from the `streaming` section)")
+    asyncio.run(main(parser.parse_args()))
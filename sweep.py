@@ -0,0 +1,135 @@
+"""
+Sweep runner: every language x cs_ratio x hypothesis range in one process.
+
+    python sweep.py --config config/config_zh.yaml          # matrix from the `sweep` section
+    python sweep.py --languages Mandarin Vietnamese --cs-ratios 70% 50% 30% --ranges 1200:1240 0:100
+    python sweep.py --plan                                   # requests, tokens, cost, wall time; no LLM calls
+
+All slices go through a single agents.run_scenarios call, so they share the
+scheduler (max_in_flight, RPM/TPM budget), the HTTP connection pool, the LLM
+cache, the XNLI loader and the output sink. Scenarios are interleaved
+round-robin across slices, so every slice advances at the same pace and the
+matrix finishes in about the time of its slowest slice. Outputs are written
+per language and ratio: data_output/{language}_{ratio}.jsonl and friends.
+"""
+import argparse
+import asyncio
+from itertools import chain, zip_longest
+from loguru import logger
+import agents
+from node_engine import output_sink
+from node_models import AgentRunningState
+from output_sink import ratio_slug
+from run_manifest import scenario_key
+from utils import load_config, generate_hypo_list
+
+
+def parse_range(text) -> tuple[int, int]:
+    """"1200:1240" or [1200, 1240] -> (1200, 1240), end exclusive."""
+    if isinstance(text, str):
+        start, _, end = text.partition(":")
+        return int(start or 0), int(end)
+    start, end = text
+    return int(start), int(end)
+
+
+def sweep_matrix(config, languages=None, cs_ratios=None, ranges=None) -> list[dict]:
+    """Slices of the sweep; arguments override the `sweep` config section."""
+    sweep_config = config.get("sweep") or {}
+    pre_execute = config["pre_execute"]
+    languages = languages or sweep_config.get("languages") or [pre_execute["second_language"]]
+    cs_ratios = cs_ratios or sweep_config.get("cs_ratios") or pre_execute["cs_ratio"]
+    if not isinstance(cs_ratios, list):
+        cs_ratios = [cs_ratios]
+    ranges = ranges or sweep_config.get("ranges") or [[agents.start, agents.end]]
+    first_language = sweep_config.get("first_language", pre_execute["first_language"])
+    return [
+        {
+            "first_language": first_language,
+            "second_language": language,
+            "cs_ratio": cs_ratio,
+            "start": start,
+            "end": end,
+        }
+        for language in languages
+        for cs_ratio in cs_ratios
+        for start, end in map(parse_range, ranges)
+    ]
+
+
+def slice_name(slice_) -> str:
+    return f"{slice_['second_language']} {ratio_slug(slice_['cs_ratio'])} [{slice_['start']}:{slice_['end']})"
+
+
+def build_sweep(slices, hypos) -> list[list[AgentRunningState]]:
+    return [
+        [
+            AgentRunningState(
+                hypothesis=hypo,
+                first_language=slice_["first_language"],
+                second_language=slice_["second_language"],
+                cs_ratio=slice_["cs_ratio"],
+            )
+            for hypo in hypos[slice_["start"]:slice_["end"]]
+        ]
+        for slice_ in slices
+    ]
+
+
+def interleave(groups) -> list:
+    """Round-robin over the groups, so the shared admission queue serves every slice evenly."""
+    return [item for item in chain.from_iterable(zip_longest(*groups)) if item is not None]
+
+
+def sweep_config(config) -> dict:
+    # several ratios of one language must not share output files or resume state
+    return {**config, "output": {**(config.get("output") or {}), "partition_by_ratio": True}}
+
+
+async def run_sweep(config, slices) -> dict:
+    """Run every slice in one run_scenarios call; returns {slice name: records written}."""
+    hypos = generate_hypo_list()
+    groups = build_sweep(slices, hypos)
+    owner = {scenario_key(state): slice_name(s) for s, group in zip(slices, groups) for state in group}
+    written = {slice_name(s): 0 for s in slices}
+
+    def on_written(batch):
+        for state in batch:
+            name = owner.get(scenario_key(state))
+            if name is not None:
+                written[name] += 1
+
+    for slice_, group in zip(slices, groups):
+        logger.info(f"🧭 Slice {slice_name(slice_)}: {len(group)} scenarios")
+    output_sink.on_written.append(on_written)
+    try:
+        await agents.run_scenarios(sweep_config(config), interleave(groups))
+    finally:
+        if on_written in output_sink.on_written:
+            output_sink.on_written.remove(on_written)
+    return written
+
+
+async def main(args):
+    config = load_config(args.config)
+    slices = sweep_matrix(config, args.languages, args.cs_ratios, args.ranges)
+    if args.plan:
+        from planner import report
+        report(sweep_config(config), interleave(build_sweep(slices, generate_hypo_list())))
+        return
+    logger.info(f"🧭 Sweeping {len(slices)} slices in one run")
+    written = await run_sweep(config, slices)
+    print(f"{'slice':<40}{'written':>10}")
+    for name, count in written.items():
+        print(f"{name:<40}{count:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--config", default=agents.CONFIG_PATH)
+    parser.add_argument("--languages", nargs="+", help="second languages (default from the `sweep` section)")
+    parser.add_argument("--cs-ratios", nargs="+", help='ratios, e.g. 70%% 50%% (default from the `sweep` section)')
+    parser.add_argument("--ranges", nargs="+", help="hypothesis ranges start:end (default from the `sweep` section)")
+    parser.add_argument("--plan", action="store_true",
+                        help="estimate requests, tokens, cost and wall time without calling the LLM")
+    asyncio.run(main(parser.parse_args()))
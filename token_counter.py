@@ -0,0 +1,76 @@
+from string import Formatter
+from functools import lru_cache
+from loguru import logger
+import tiktoken
+
+FALLBACK_ENCODING = "o200k_base"
+# rough chars-per-token used when no BPE file can be loaded (e.g. offline hosts)
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str | None = None):
+    """Return the tiktoken encoding for `model`, or None if it cannot be loaded."""
+    try:
+        if model:
+            try:
+                return tiktoken.encoding_for_model(model)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str | None = None) -> int:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return max(1, len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model: str | None = None) -> int:
+    """Count prompt tokens for a list of chat messages (or a rendered PromptValue)."""
+    if hasattr(messages, "to_messages"):
+        messages = messages.to_messages()
+    # ~4 tokens of chat framing per message, 3 to prime the reply
+    total = 3
+    for message in messages:
+        total += 4 + count_tokens(str(message.content), model)
+    return total
+
+
+_prefix_tokens: dict[tuple, int] = {}
+
+
+def static_prefix(template) -> str:
+    """
+    The leading text of a ChatPromptTemplate that is identical on every call:
+    all messages before the first one with a variable, plus that message's text
+    up to its first variable. This is the part a provider prompt cache can reuse.
+    """
+    parts = []
+    for message in template.messages:
+        prompt = getattr(message, "prompt", None)
+        text = getattr(prompt, "template", None)
+        if not isinstance(text, str):
+            break
+        literal, field = "", None
+        for literal_text, field_name, _, _ in Formatter().parse(text):
+            literal += literal_text
+            if field_name is not None:
+                field = field_name
+                break
+        parts.append(literal)
+        if field is not None:
+            break
+    return "".join(parts)
+
+
+def prompt_prefix_tokens(template, model: str | None = None) -> int:
+    """Tokens of static_prefix(template), counted once per template and model."""
+    key = (id(template), model)
+    if key not in _prefix_tokens:
+        _prefix_tokens[key] = count_tokens(static_prefix(template), model)
+    return _prefix_tokens[key]
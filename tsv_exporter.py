@@ -0,0 +1,157 @@
+import csv
+import os
+import pandas as pd
+from read_xnli_dataset import XNLIDataLoader
+from record_store import COLUMNS_SUFFIX, read_columns, read_records
+
+TSV_COLUMNS = ["sentence1", "sentence2", "gold_label"]
+
+
+def build_hypo_index(loader: XNLIDataLoader) -> dict:
+    """Map original hypo -> (premise, label); built once per loader, later rows win."""
+    data = loader.data[loader.data["hypo"] != ""]
+    return dict(zip(data["hypo"], zip(data["premise"], data["label"])))
+
+
+def extract_translation(record: dict):
+    """Return (original_hypo, translated_sentence) from an accepted record."""
+    hypothesis = record.get("hypothesis", {})
+    original_hypo = hypothesis.get("hypo", "") if isinstance(hypothesis, dict) else ""
+
+    # Robust extraction of translated sentence
+    code_switched = record.get("data_translation_result", "")
+    if isinstance(code_switched, dict):
+        translated_sentence = (
+            code_switched.get("translated_sentence")
+            or code_switched.get("translation")
+            or ""
+        )
+    else:
+        translated_sentence = str(code_switched)
+    return original_hypo, translated_sentence
+
+
+def accepted_translations(path) -> list[tuple[str, str]]:
+    """(original_hypo, translated_sentence) of every record in a JSONL, record store or columns file."""
+    if not os.path.exists(path):
+        return []
+    if path.endswith(COLUMNS_SUFFIX):
+        # only the two columns the TSV needs are read
+        columns = read_columns(path, ["hypothesis.hypo", "data_translation_result.translated_sentence"])
+        return [
+            (hypo or "", sentence or "")
+            for hypo, sentence in zip(columns["hypothesis.hypo"], columns["data_translation_result.translated_sentence"])
+        ]
+    return [extract_translation(record) for record in read_records(path)]
+
+
+def _write_rows(path, rows, mode="w", header=True):
+    with open(path, mode, encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t", lineterminator="\n")
+        if header:
+            writer.writerow(TSV_COLUMNS)
+        writer.writerows(rows)
+
+
+class TSVExporter:
+    """
+    Keeps the code-switched XNLI TSV in memory, keyed by (premise, label).
+
+    Matching uses (sentence1 == premise) AND (gold_label == label), the same
+    key save_jsonl_to_tsv always used, so hypos sharing a premise are not
+    overwritten. `upsert` is O(1); `flush` appends new rows and only rewrites
+    the file (atomically) when an existing row changed.
+
+    Attributes:
+        tsv_file (str): Output TSV path.
+        index (dict): original hypo -> (premise, label).
+        rows (list): [sentence1, sentence2, gold_label] rows in file order.
+    """
+    def __init__(self, tsv_file, loader: XNLIDataLoader = None, index: dict = None):
+        if index is None:
+            index = build_hypo_index(loader)
+        self.tsv_file = tsv_file
+        self.index = index
+        self.rows = []
+        self._positions = {}
+        self._flushed = 0
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.tsv_file):
+            return
+        try:
+            df = pd.read_csv(self.tsv_file, sep="\t", dtype=str).fillna("")
+        except Exception as e:
+            print(f"[WARN] Could not read existing TSV '{self.tsv_file}': {e}")
+            self._dirty = True
+            return
+        self.rows = df[TSV_COLUMNS].values.tolist()
+        for position, (premise, _, label) in enumerate(self.rows):
+            self._positions.setdefault((premise, label), position)
+        self._flushed = len(self.rows)
+
+    def upsert(self, record: dict) -> bool:
+        """Update or add the row for one accepted record; returns False if it was skipped."""
+        original_hypo, translated_sentence = extract_translation(record)
+        if not original_hypo or not translated_sentence:
+            return False
+        if original_hypo not in self.index:
+            print(f"[WARN] original hypo not in loader mapping: {original_hypo!r}")
+            return False
+        premise, label = self.index[original_hypo]
+        position = self._positions.get((premise, label))
+        if position is None:
+            self._positions[(premise, label)] = len(self.rows)
+            self.rows.append([premise, translated_sentence, label])
+        elif self.rows[position][1] != translated_sentence:
+            self.rows[position][1] = translated_sentence
+            if position < self._flushed:
+                self._dirty = True
+        return True
+
+    def flush(self):
+        """Persist pending changes: append-only when possible, else an atomic rewrite."""
+        if self._dirty or not os.path.exists(self.tsv_file):
+            tmp_file = f"{self.tsv_file}.tmp"
+            _write_rows(tmp_file, self.rows)
+            os.replace(tmp_file, self.tsv_file)
+        elif self._flushed < len(self.rows):
+            _write_rows(self.tsv_file, self.rows[self._flushed:], mode="a", header=False)
+        else:
+            return
+        self._flushed = len(self.rows)
+        self._dirty = False
+
+    def materialize(self, records_file):
+        """
+        One-shot export of a whole run (end-of-run mode) from its JSONL,
+        record store or columns file. Resolves every record at once and
+        writes the TSV a single time.
+        """
+        records = accepted_translations(records_file)
+        accepted = pd.DataFrame(records, columns=["hypo", "sentence2"])
+        accepted = accepted[(accepted["hypo"] != "") & (accepted["sentence2"] != "")]
+
+        known = accepted["hypo"].isin(self.index.keys())
+        for hypo in accepted.loc[~known, "hypo"]:
+            print(f"[WARN] original hypo not in loader mapping: {hypo!r}")
+        accepted = accepted[known]
+
+        keys = accepted["hypo"].map(self.index)
+        accepted = accepted.assign(
+            sentence1=keys.str[0], gold_label=keys.str[1]
+        ).drop_duplicates(subset=["sentence1", "gold_label"], keep="last")
+
+        for premise, translated_sentence, label in accepted[TSV_COLUMNS].itertuples(index=False):
+            position = self._positions.get((premise, label))
+            if position is None:
+                self._positions[(premise, label)] = len(self.rows)
+                self.rows.append([premise, translated_sentence, label])
+            else:
+                self.rows[position][1] = translated_sentence
+        self._dirty = True
+        self.flush()
+        print(f"Saved/updated {len(self.rows)} rows to {self.tsv_file}")
+        return len(self.rows)